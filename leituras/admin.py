@@ -6,15 +6,43 @@ from .models import (
     Temperatura, 
     Umidade, 
     GrandezaEletrica, 
-    DadosAgregados
+    DadosAgregados,
+    AgregadoMetrica,
+    ResumoDiario,
+    Equipamento,
+    ExecucaoAgregacao
 )
 
 @admin.register(DadosAgregados)
 class DadosAgregadosAdmin(admin.ModelAdmin):
-    list_display = ['id_cliente', 'id_equipamento', 'periodo_inicio', 'periodo_fim', 'registros_contagem']
-    list_filter = ['id_cliente', 'id_equipamento', 'periodo_inicio']
+    list_display = ['id_cliente', 'id_equipamento', 'granularidade', 'periodo_inicio', 'periodo_fim', 'registros_contagem']
+    list_filter = ['granularidade', 'id_cliente', 'id_equipamento', 'periodo_inicio']
     search_fields = ['id_cliente', 'id_equipamento']
 
+@admin.register(AgregadoMetrica)
+class AgregadoMetricaAdmin(admin.ModelAdmin):
+    list_display = ['id_cliente', 'id_equipamento', 'metrica', 'granularidade', 'periodo_inicio', 'contagem']
+    list_filter = ['granularidade', 'metrica', 'id_cliente']
+    search_fields = ['id_cliente', 'id_equipamento']
+
+@admin.register(ResumoDiario)
+class ResumoDiarioAdmin(admin.ModelAdmin):
+    list_display = ['id_cliente', 'id_equipamento', 'dia', 'periodos', 'ultimo_periodo_fim']
+    list_filter = ['id_cliente', 'dia']
+    search_fields = ['id_cliente', 'id_equipamento']
+
+@admin.register(Equipamento)
+class EquipamentoAdmin(admin.ModelAdmin):
+    list_display = ['id_cliente', 'id_equipamento', 'created_at']
+    list_filter = ['id_cliente']
+    search_fields = ['id_cliente', 'id_equipamento']
+
+@admin.register(ExecucaoAgregacao)
+class ExecucaoAgregacaoAdmin(admin.ModelAdmin):
+    list_display = ['id', 'status', 'origem', 'periodo', 'solicitacoes', 'solicitada_em', 'concluida_em']
+    list_filter = ['status', 'origem']
+    readonly_fields = ['solicitada_em', 'iniciada_em', 'concluida_em']
+
 admin.site.register(CorrenteBrunidores)
 admin.site.register(CorrenteDescascadores)
 admin.site.register(CorrentePolidores)
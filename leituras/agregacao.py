@@ -0,0 +1,684 @@
+"""
+Definição das tabelas brutas e implementações da agregação (SQL MySQL e ORM).
+
+As leituras brutas são agregadas por hora em agregados_metricas (uma linha por
+equipamento, métrica e período), cada lote mesclado ao acumulado já gravado
+da hora; dia e semana são consolidados a partir do
+nível imediatamente inferior (hora -> dia -> semana). dados_agregados, a visão
+larga lida pelas telas, é materializada a partir dos períodos alterados, e
+resumos_diarios (os cards do dashboard) é recalculado dos dias dessas horas.
+"""
+
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.db import OperationalError
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import (
+    CorrenteBrunidores, CorrenteDescascadores, CorrentePolidores,
+    Temperatura, Umidade, GrandezaEletrica, DadosAgregados, AgregadoMetrica, ResumoDiario,
+)
+
+
+# Granularidades, da mais fina para a mais grossa
+GRANULARIDADES = ['hora', 'dia', 'semana']
+
+INTERVALOS = {
+    'hora': timedelta(hours=1),
+    'dia': timedelta(days=1),
+    'semana': timedelta(weeks=1),
+}
+
+# Nível a partir do qual cada granularidade é consolidada
+ORIGEM = {
+    'dia': 'hora',
+    'semana': 'dia',
+}
+
+UNICOS = ['id_cliente', 'id_equipamento', 'granularidade', 'periodo_inicio', 'metrica']
+UNICOS_LARGOS = ['id_cliente', 'id_equipamento', 'granularidade', 'periodo_inicio']
+
+# Acumulado de cada métrica: combinável entre períodos menores
+CAMPOS_ACUMULADOS = ['contagem', 'soma', 'minimo', 'maximo', 'ultima', 'ultimo_timestamp']
+
+# updated_at é preenchido antes do commit: uma linha de uma transação ainda
+# aberta pode aparecer com updated_at anterior à marca já gravada. consolidar e
+# materializar relêem esse intervalo antes da marca (refazer é idempotente).
+JANELA_RELEITURA = timedelta(minutes=2)
+
+
+@dataclass(frozen=True)
+class Fonte:
+    """Tabela bruta e o mapeamento de suas colunas para o prefixo em dados_agregados"""
+    tabela: str
+    modelo: type
+    campos: tuple  # pares (coluna na tabela bruta, prefixo em dados_agregados)
+
+    @property
+    def colunas(self):
+        return [coluna for coluna, _ in self.campos]
+
+    @property
+    def prefixos(self):
+        return [prefixo for _, prefixo in self.campos]
+
+    @property
+    def colunas_destino(self):
+        """Colunas de dados_agregados preenchidas por esta fonte"""
+        return colunas_metricas(self.prefixos)
+
+
+GRANDEZAS_ELETRICAS = [
+    'tensao_r', 'tensao_s', 'tensao_t', 'corrente_r', 'corrente_s', 'corrente_t',
+    'potencia_ativa', 'potencia_reativa', 'fator_potencia',
+]
+
+FONTES = [
+    Fonte('corrente_brunidores', CorrenteBrunidores, (('corrente', 'corrente_brunidores'),)),
+    Fonte('corrente_descascadores', CorrenteDescascadores, (('corrente', 'corrente_descascadores'),)),
+    Fonte('corrente_polidores', CorrentePolidores, (('corrente', 'corrente_polidores'),)),
+    Fonte('temperaturas', Temperatura, (('temperatura', 'temperatura'),)),
+    Fonte('umidades', Umidade, (('umidade', 'umidade'),)),
+    Fonte('grandezas_eletricas', GrandezaEletrica, tuple((campo, campo) for campo in GRANDEZAS_ELETRICAS)),
+]
+
+METRICAS = [prefixo for fonte in FONTES for prefixo in fonte.prefixos]
+
+# Métricas dos cards do dashboard, resumidas por dia em resumos_diarios
+METRICAS_RESUMO = ['temperatura', 'corrente_brunidores']
+CAMPOS_RESUMO = [f'{prefixo}_{sufixo}' for prefixo in METRICAS_RESUMO for sufixo in ('soma', 'contagem', 'max')]
+# Colunas de dados_agregados lidas por Resumo.adicionar_hora
+COLUNAS_HORA_RESUMO = ['periodo_fim', 'registros_contagem'] + [
+    f'{prefixo}_{sufixo}' for prefixo in METRICAS_RESUMO for sufixo in ('media', 'soma', 'contagem', 'max')
+]
+
+
+def colunas_metricas(prefixos):
+    return [
+        f'{prefixo}_{sufixo}'
+        for prefixo in prefixos
+        for sufixo in ('media', 'max', 'min', 'ultima', 'soma', 'contagem')
+    ]
+
+
+def inicio_periodo(timestamp, granularidade):
+    """
+    Trunca o timestamp para o início do período.
+
+    Dia e semana (a partir de segunda-feira) seguem o fuso horário local.
+    """
+    if granularidade == 'hora':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+
+    local = timezone.localtime(timestamp)
+    if granularidade == 'semana':
+        local -= timedelta(days=local.weekday())
+    return local.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+# ========== Implementação MySQL (SQL otimizado) ==========
+
+def expressao_periodo(vendor, coluna='timestamp'):
+    """Expressão SQL que trunca o timestamp para o início da hora"""
+    if vendor == 'mysql':
+        return f"CAST(DATE_FORMAT({coluna}, '%%Y-%%m-%%d %%H:00:00') AS DATETIME)"
+    return f"strftime('%%Y-%%m-%%d %%H:00:00', {coluna})"
+
+
+def sql_selecao(fonte, vendor):
+    """
+    SELECT que agrega um intervalo de ids (id > %s AND id <= %s) em uma única passada.
+
+    A última leitura de cada período é marcada com ROW_NUMBER() na subconsulta,
+    evitando uma subconsulta correlacionada por coluna; seu instante é o
+    MAX(timestamp) do período.
+    """
+    periodo = expressao_periodo(vendor)
+    colunas = ', '.join(fonte.colunas)
+    metricas = ',\n            '.join(
+        f'AVG({c}) AS {p}_media, MAX({c}) AS {p}_max, MIN({c}) AS {p}_min, '
+        f'MAX(CASE WHEN ordem = 1 THEN {c} END) AS {p}_ultima, '
+        f'SUM({c}) AS {p}_soma, COUNT({c}) AS {p}_contagem'
+        for c, p in fonte.campos
+    )
+    return f"""
+        SELECT
+            id_cliente,
+            id_equipamento,
+            periodo_inicio,
+            {metricas},
+            COUNT(*) AS registros_contagem,
+            MAX(timestamp) AS ultimo_timestamp
+        FROM (
+            SELECT
+                id_cliente, id_equipamento, timestamp, {colunas},
+                {periodo} AS periodo_inicio,
+                ROW_NUMBER() OVER (
+                    PARTITION BY id_cliente, id_equipamento, {periodo}
+                    ORDER BY timestamp DESC, id DESC
+                ) AS ordem
+            FROM {fonte.tabela}
+            WHERE id > %s AND id <= %s
+        ) leituras
+        GROUP BY id_cliente, id_equipamento, periodo_inicio
+    """
+
+
+def sql_agregacao_mysql(fonte):
+    """
+    INSERT ... SELECT com upsert dos períodos de uma hora em agregados_metricas.
+
+    O SELECT de passada única gera uma linha larga por período; o CROSS JOIN
+    com as métricas da fonte a desdobra em uma linha por métrica. Períodos já
+    gravados são mesclados com as leituras do lote, como em ``_mesclar``.
+    """
+    metricas = ' UNION ALL '.join(f"SELECT '{p}' AS metrica" for p in fonte.prefixos)
+
+    def escolher(sufixo):
+        casos = ' '.join(f"WHEN '{p}' THEN a.{p}_{sufixo}" for p in fonte.prefixos)
+        return f'CASE m.metrica {casos} END'
+
+    # A última só é trocada por uma leitura mais recente. Dependência de ordem:
+    # o MySQL aplica as atribuições do ON DUPLICATE KEY UPDATE da esquerda para
+    # a direita, e as seguintes já leem o valor novo da coluna; ultima precisa
+    # vir antes de ultimo_timestamp para comparar com o instante ainda gravado.
+    # updated_at em UTC, como o Django grava (NOW() seguiria o fuso da sessão e
+    # moveria as linhas em relação às marcas de avancar_marca)
+    mais_recente = (
+        'agregados_metricas.ultimo_timestamp IS NULL '
+        'OR VALUES(ultimo_timestamp) >= agregados_metricas.ultimo_timestamp'
+    )
+    atualizacoes = ',\n            '.join([
+        'contagem = agregados_metricas.contagem + VALUES(contagem)',
+        'soma = agregados_metricas.soma + VALUES(soma)',
+        'minimo = LEAST(agregados_metricas.minimo, VALUES(minimo))',
+        'maximo = GREATEST(agregados_metricas.maximo, VALUES(maximo))',
+        # ultima antes de ultimo_timestamp (ver acima)
+        f'ultima = IF({mais_recente}, VALUES(ultima), agregados_metricas.ultima)',
+        f'ultimo_timestamp = IF({mais_recente}, VALUES(ultimo_timestamp), agregados_metricas.ultimo_timestamp)',
+    ])
+    return f"""
+        INSERT INTO agregados_metricas (
+            id_cliente, id_equipamento, metrica, granularidade, periodo_inicio,
+            {', '.join(CAMPOS_ACUMULADOS)}, updated_at
+        )
+        SELECT * FROM (
+            SELECT
+                a.id_cliente, a.id_equipamento, m.metrica, 'hora' AS granularidade, a.periodo_inicio,
+                {escolher('contagem')} AS contagem,
+                {escolher('soma')} AS soma,
+                {escolher('min')} AS minimo,
+                {escolher('max')} AS maximo,
+                {escolher('ultima')} AS ultima,
+                a.ultimo_timestamp,
+                UTC_TIMESTAMP(6) AS updated_at
+            FROM ({sql_selecao(fonte, 'mysql')}) a
+            CROSS JOIN ({metricas}) m
+        ) novos
+        WHERE contagem > 0
+        ON DUPLICATE KEY UPDATE
+            {atualizacoes},
+            updated_at = UTC_TIMESTAMP(6)
+    """
+
+
+# ========== Agregação em streaming via ORM ==========
+
+class Acumulador:
+    """Contagem, soma, mínimo, máximo e último valor (com seu instante) de uma métrica"""
+    __slots__ = ('contagem', 'soma', 'minimo', 'maximo', 'ultima', 'ultimo_timestamp')
+
+    def __init__(self):
+        self.contagem = 0
+        self.soma = 0
+        self.minimo = None
+        self.maximo = None
+        self.ultima = None
+        self.ultimo_timestamp = None
+
+    def adicionar(self, valor, timestamp=None):
+        # A última leitura vale mesmo quando nula, como nas demais implementações
+        self.ultima = valor
+        self.ultimo_timestamp = timestamp
+        if valor is None:
+            return
+        self.contagem += 1
+        self.soma += valor
+        if self.minimo is None or valor < self.minimo:
+            self.minimo = valor
+        if self.maximo is None or valor > self.maximo:
+            self.maximo = valor
+
+    def combinar(self, contagem, soma, minimo, maximo, ultima, ultimo_timestamp=None):
+        """
+        Incorpora outro acumulado: de um período menor ou de outro lote do mesmo período.
+
+        A última passa a ser a do acumulado incorporado, salvo se o instante dela
+        for anterior ao da atual; sem instante (períodos antigos), vale a ordem
+        das chamadas, do mais antigo para o mais recente.
+        """
+        if self.ultimo_timestamp is None or ultimo_timestamp is None or ultimo_timestamp >= self.ultimo_timestamp:
+            self.ultima = ultima
+            self.ultimo_timestamp = ultimo_timestamp
+        if not contagem:
+            return
+        self.contagem += contagem
+        self.soma += soma
+        if self.minimo is None or minimo < self.minimo:
+            self.minimo = minimo
+        if self.maximo is None or maximo > self.maximo:
+            self.maximo = maximo
+
+    @property
+    def media(self):
+        return self.soma / self.contagem if self.contagem else None
+
+
+class Resumo:
+    """Quantidade de horas, fim da última e soma/contagem/máximo das métricas dos cards"""
+
+    def __init__(self):
+        self.periodos = 0
+        self.ultimo_periodo_fim = None
+        self.somas = dict.fromkeys(METRICAS_RESUMO, 0)
+        self.contagens = dict.fromkeys(METRICAS_RESUMO, 0)
+        self.maximos = dict.fromkeys(METRICAS_RESUMO)
+
+    def combinar(self, periodos, ultimo_periodo_fim, *valores):
+        """Incorpora outro resumo: ``valores`` são soma, contagem e máximo de cada métrica (CAMPOS_RESUMO)"""
+        if not periodos:
+            return
+        self.periodos += periodos
+        if self.ultimo_periodo_fim is None or ultimo_periodo_fim > self.ultimo_periodo_fim:
+            self.ultimo_periodo_fim = ultimo_periodo_fim
+        for i, prefixo in enumerate(METRICAS_RESUMO):
+            soma, contagem, maximo = valores[i * 3:i * 3 + 3]
+            if not contagem:
+                continue
+            self.somas[prefixo] += soma
+            self.contagens[prefixo] += contagem
+            if self.maximos[prefixo] is None or maximo > self.maximos[prefixo]:
+                self.maximos[prefixo] = maximo
+
+    def adicionar_hora(self, periodo_fim, registros, *valores):
+        """
+        Incorpora uma hora de dados_agregados (colunas COLUNAS_HORA_RESUMO).
+
+        Horas gravadas antes das colunas soma/contagem pesam a média por registros_contagem.
+        """
+        parciais = []
+        for i in range(len(METRICAS_RESUMO)):
+            media, soma, contagem, maximo = valores[i * 4:i * 4 + 4]
+            if contagem is None and media is not None:
+                contagem = registros
+                soma = media * contagem
+            parciais += [soma, contagem, maximo]
+        self.combinar(1, periodo_fim, *parciais)
+
+    def media(self, prefixo):
+        """Média ponderada pela quantidade de leituras de cada hora"""
+        contagem = self.contagens[prefixo]
+        return self.somas[prefixo] / contagem if contagem else None
+
+    def campos(self):
+        """Valores das colunas de resumos_diarios"""
+        campos = {'periodos': self.periodos, 'ultimo_periodo_fim': self.ultimo_periodo_fim}
+        for prefixo in METRICAS_RESUMO:
+            contagem = self.contagens[prefixo]
+            campos[f'{prefixo}_soma'] = self.somas[prefixo] if contagem else None
+            campos[f'{prefixo}_contagem'] = contagem or None
+            campos[f'{prefixo}_max'] = self.maximos[prefixo]
+        return campos
+
+
+def agregar_orm(fonte, id_inicio, id_fim, chunk_size=2000, lote_escrita=500):
+    """Agrega um intervalo de ids em períodos de uma hora lendo tuplas em streaming"""
+    return agregar_leituras_orm(
+        fonte, fonte.modelo.objects.filter(id__gt=id_inicio, id__lte=id_fim), chunk_size, lote_escrita
+    )
+
+
+def agregar_leituras_orm(fonte, leituras, chunk_size=2000, lote_escrita=500):
+    """
+    Agrega as ``leituras`` (queryset da tabela de ``fonte``) em períodos de uma hora.
+
+    As leituras chegam ordenadas pelo índice (cliente, equipamento, timestamp),
+    então cada período termina assim que a chave muda; os acumulados de cada
+    métrica são mesclados em lotes aos já gravados (ver ``_mesclar``).
+    Retorna a quantidade de leituras lidas.
+    """
+    linhas = leituras.order_by(
+        'id_cliente', 'id_equipamento', 'timestamp', 'id'
+    ).values_list(
+        'id_cliente', 'id_equipamento', 'timestamp', *fonte.colunas
+    ).iterator(chunk_size=chunk_size)
+
+    pendentes = []
+    chave = None
+    acumuladores = {}
+    lidas = 0
+
+    for id_cliente, id_equipamento, timestamp, *valores in linhas:
+        lidas += 1
+        nova_chave = (id_cliente, id_equipamento, inicio_periodo(timestamp, 'hora'))
+        if nova_chave != chave:
+            if chave is not None:
+                pendentes.extend(_metricas(chave, 'hora', acumuladores))
+                if len(pendentes) >= lote_escrita:
+                    _mesclar(pendentes)
+                    pendentes = []
+            chave = nova_chave
+            acumuladores = {prefixo: Acumulador() for prefixo in fonte.prefixos}
+
+        for acumulador, valor in zip(acumuladores.values(), valores):
+            acumulador.adicionar(valor, timestamp)
+
+    if chave is not None:
+        pendentes.extend(_metricas(chave, 'hora', acumuladores))
+    if pendentes:
+        _mesclar(pendentes)
+    return lidas
+
+
+# ========== Consolidação hierárquica (hora -> dia -> semana) ==========
+
+def consolidar(granularidade, desde, ate, lote_escrita=500):
+    """
+    Recalcula os períodos de `granularidade` afetados por alterações no nível de origem.
+
+    Só são relidos os períodos de origem dos equipamentos com métricas alteradas
+    em (desde, ate]; médias vêm de soma/contagem, então permanecem exatas.
+    Retorna a quantidade de acumulados gravados.
+    """
+    origem = ORIGEM[granularidade]
+    afetados = defaultdict(set)
+    for id_cliente, id_equipamento, metrica, periodo_inicio in _alteradas(desde, ate).filter(
+        granularidade=origem
+    ).values_list(
+        'id_cliente', 'id_equipamento', 'metrica', 'periodo_inicio'
+    ).iterator(chunk_size=2000):
+        afetados[(id_cliente, id_equipamento)].add((metrica, inicio_periodo(periodo_inicio, granularidade)))
+
+    pendentes = []
+    gravados = 0
+    for (id_cliente, id_equipamento), chaves in afetados.items():
+        periodos = [periodo for _, periodo in chaves]
+        linhas = AgregadoMetrica.objects.filter(
+            id_cliente=id_cliente,
+            id_equipamento=id_equipamento,
+            granularidade=origem,
+            periodo_inicio__gte=min(periodos),
+            periodo_inicio__lt=max(periodos) + INTERVALOS[granularidade],
+        ).order_by('periodo_inicio').values_list('metrica', 'periodo_inicio', *CAMPOS_ACUMULADOS)
+
+        acumuladores = defaultdict(Acumulador)
+        for metrica, periodo_inicio, *parcial in linhas:
+            chave = (metrica, inicio_periodo(periodo_inicio, granularidade))
+            if chave in chaves:
+                acumuladores[chave].combinar(*parcial)
+
+        for (metrica, periodo), acumulador in acumuladores.items():
+            pendentes.append(_metrica(
+                (id_cliente, id_equipamento, periodo), granularidade, metrica, acumulador
+            ))
+        if len(pendentes) >= lote_escrita:
+            _gravar(pendentes)
+            gravados += len(pendentes)
+            pendentes = []
+
+    if pendentes:
+        _gravar(pendentes)
+        gravados += len(pendentes)
+    return gravados
+
+
+# ========== Visão larga (dados_agregados) ==========
+
+def materializar(desde, ate, lote_escrita=500):
+    """
+    Regrava em dados_agregados os períodos com métricas alteradas em (desde, ate].
+
+    Cada período é reescrito uma única vez, com todas as suas métricas, por
+    mais tabelas brutas que o tenham alterado, e os dias das horas regravadas
+    são resumidos de novo em resumos_diarios. Retorna os períodos gravados.
+    """
+    afetados = defaultdict(set)
+    for id_cliente, id_equipamento, granularidade, periodo_inicio in _alteradas(desde, ate).values_list(
+        'id_cliente', 'id_equipamento', 'granularidade', 'periodo_inicio'
+    ).iterator(chunk_size=2000):
+        afetados[(id_cliente, id_equipamento, granularidade)].add(periodo_inicio)
+
+    pendentes = []
+    gravados = 0
+    for (id_cliente, id_equipamento, granularidade), periodos in afetados.items():
+        linhas = AgregadoMetrica.objects.filter(
+            id_cliente=id_cliente,
+            id_equipamento=id_equipamento,
+            granularidade=granularidade,
+            periodo_inicio__gte=min(periodos),
+            periodo_inicio__lte=max(periodos),
+        ).values_list('periodo_inicio', 'metrica', *CAMPOS_ACUMULADOS)
+
+        for periodo_inicio, metricas in pivotar(linhas, periodos).items():
+            pendentes.append(_dados_agregados(
+                (id_cliente, id_equipamento, periodo_inicio), granularidade, metricas
+            ))
+        if len(pendentes) >= lote_escrita:
+            _gravar_largos(pendentes)
+            gravados += len(pendentes)
+            pendentes = []
+
+    if pendentes:
+        _gravar_largos(pendentes)
+        gravados += len(pendentes)
+
+    resumir(
+        (id_cliente, id_equipamento, inicio_periodo(periodo_inicio, 'dia'))
+        for (id_cliente, id_equipamento, granularidade), periodos in afetados.items()
+        if granularidade == 'hora'
+        for periodo_inicio in periodos
+    )
+    return gravados
+
+
+def resumir(dias, lote_escrita=500):
+    """
+    Recalcula em resumos_diarios os (id_cliente, id_equipamento, dia) dados, das horas em dados_agregados.
+
+    Cada equipamento é lido numa consulta só, do primeiro ao último dia pedido.
+    Retorna os resumos gravados.
+    """
+    por_equipamento = defaultdict(set)
+    for id_cliente, id_equipamento, dia in dias:
+        por_equipamento[(id_cliente, id_equipamento)].add(dia)
+
+    pendentes = []
+    gravados = 0
+    for (id_cliente, id_equipamento), dias_equipamento in por_equipamento.items():
+        linhas = DadosAgregados.objects.filter(
+            id_cliente=id_cliente,
+            id_equipamento=id_equipamento,
+            granularidade='hora',
+            periodo_inicio__gte=min(dias_equipamento),
+            periodo_inicio__lt=max(dias_equipamento) + INTERVALOS['dia'],
+        ).values_list('periodo_inicio', *COLUNAS_HORA_RESUMO)
+
+        resumos = defaultdict(Resumo)
+        for periodo_inicio, *valores in linhas:
+            dia = inicio_periodo(periodo_inicio, 'dia')
+            if dia in dias_equipamento:
+                resumos[dia].adicionar_hora(*valores)
+
+        for dia, resumo in resumos.items():
+            pendentes.append(ResumoDiario(
+                id_cliente=id_cliente, id_equipamento=id_equipamento, dia=dia, **resumo.campos()
+            ))
+        if len(pendentes) >= lote_escrita:
+            _gravar_resumos(pendentes)
+            gravados += len(pendentes)
+            pendentes = []
+
+    if pendentes:
+        _gravar_resumos(pendentes)
+        gravados += len(pendentes)
+    return gravados
+
+
+def pivotar(linhas, periodos=None):
+    """
+    Agrupa linhas (periodo_inicio, metrica, contagem, soma, minimo, maximo, ultima)
+    em {periodo_inicio: {metrica: Acumulador}}, opcionalmente só dos `periodos` dados.
+    """
+    resultado = defaultdict(dict)
+    for periodo_inicio, metrica, *acumulado in linhas:
+        if periodos is not None and periodo_inicio not in periodos:
+            continue
+        acumulador = Acumulador()
+        acumulador.combinar(*acumulado)
+        resultado[periodo_inicio][metrica] = acumulador
+    return resultado
+
+
+# ========== Gravação ==========
+
+def _alteradas(desde, ate):
+    alteradas = AgregadoMetrica.objects.filter(updated_at__lte=ate)
+    if desde is not None:
+        alteradas = alteradas.filter(updated_at__gt=desde)
+    return alteradas
+
+
+def _metrica(chave, granularidade, metrica, acumulador):
+    id_cliente, id_equipamento, periodo_inicio = chave
+    return AgregadoMetrica(
+        id_cliente=id_cliente,
+        id_equipamento=id_equipamento,
+        metrica=metrica,
+        granularidade=granularidade,
+        periodo_inicio=periodo_inicio,
+        contagem=acumulador.contagem,
+        soma=acumulador.soma,
+        minimo=acumulador.minimo,
+        maximo=acumulador.maximo,
+        ultima=acumulador.ultima,
+        ultimo_timestamp=acumulador.ultimo_timestamp,
+    )
+
+
+def _metricas(chave, granularidade, acumuladores):
+    """Uma linha por métrica com ao menos uma leitura no período"""
+    return [
+        _metrica(chave, granularidade, metrica, acumulador)
+        for metrica, acumulador in acumuladores.items()
+        if acumulador.contagem
+    ]
+
+
+def _gravar(metricas):
+    """Upsert em lote dos acumulados por métrica, substituindo os gravados"""
+    AgregadoMetrica.objects.bulk_create(
+        metricas,
+        update_conflicts=True,
+        unique_fields=UNICOS,
+        update_fields=CAMPOS_ACUMULADOS + ['updated_at'],
+    )
+
+
+def _mesclar(metricas):
+    """
+    Upsert em lote que soma os acumulados novos aos já gravados no mesmo período.
+
+    Um período pode ser dividido entre lotes (leituras atrasadas ou lotes que
+    cortam a hora): cada lote traz só as leituras novas, e o período gravado é
+    combinado com elas, sem reler as leituras anteriores. Cada leitura precisa
+    entrar uma única vez: a marca d'água garante isso na agregação incremental,
+    e reagregar apaga os períodos antes de refazê-los.
+    """
+    periodos = defaultdict(set)
+    for metrica in metricas:
+        periodos[(metrica.id_cliente, metrica.id_equipamento, metrica.granularidade)].add(metrica.periodo_inicio)
+    filtro = Q()
+    for (id_cliente, id_equipamento, granularidade), inicios in periodos.items():
+        filtro |= Q(
+            id_cliente=id_cliente, id_equipamento=id_equipamento,
+            granularidade=granularidade, periodo_inicio__in=inicios,
+        )
+    gravados = {
+        tuple(linha[:len(UNICOS)]): linha[len(UNICOS):]
+        for linha in AgregadoMetrica.objects.filter(
+            filtro, metrica__in={metrica.metrica for metrica in metricas}
+        ).values_list(*UNICOS, *CAMPOS_ACUMULADOS)
+    }
+
+    for metrica in metricas:
+        gravado = gravados.get(tuple(getattr(metrica, campo) for campo in UNICOS))
+        if gravado is None:
+            continue
+        acumulador = Acumulador()
+        acumulador.combinar(*gravado)
+        acumulador.combinar(*(getattr(metrica, campo) for campo in CAMPOS_ACUMULADOS))
+        for campo in CAMPOS_ACUMULADOS:
+            setattr(metrica, campo, getattr(acumulador, campo))
+    _gravar(metricas)
+
+
+def _dados_agregados(chave, granularidade, acumuladores):
+    """Linha larga com todas as métricas; as ausentes do período ficam nulas"""
+    id_cliente, id_equipamento, periodo_inicio = chave
+    agregado = DadosAgregados(
+        id_cliente=id_cliente,
+        id_equipamento=id_equipamento,
+        granularidade=granularidade,
+        periodo_inicio=periodo_inicio,
+        periodo_fim=periodo_inicio + INTERVALOS[granularidade],
+        registros_contagem=max(acumulador.contagem for acumulador in acumuladores.values()),
+    )
+    for prefixo, acumulador in acumuladores.items():
+        setattr(agregado, f'{prefixo}_media', acumulador.media)
+        setattr(agregado, f'{prefixo}_max', acumulador.maximo)
+        setattr(agregado, f'{prefixo}_min', acumulador.minimo)
+        setattr(agregado, f'{prefixo}_ultima', acumulador.ultima)
+        setattr(agregado, f'{prefixo}_soma', acumulador.soma)
+        setattr(agregado, f'{prefixo}_contagem', acumulador.contagem)
+    return agregado
+
+
+def _gravar_largos(agregados):
+    """Upsert em lote em dados_agregados, substituindo todas as métricas do período"""
+    DadosAgregados.objects.bulk_create(
+        agregados,
+        update_conflicts=True,
+        unique_fields=UNICOS_LARGOS,
+        update_fields=colunas_metricas(METRICAS) + ['periodo_fim', 'registros_contagem', 'updated_at'],
+    )
+
+
+def _gravar_resumos(resumos):
+    """Upsert em lote em resumos_diarios"""
+    ResumoDiario.objects.bulk_create(
+        resumos,
+        update_conflicts=True,
+        unique_fields=['id_cliente', 'id_equipamento', 'dia'],
+        update_fields=['periodos', 'ultimo_periodo_fim'] + CAMPOS_RESUMO + ['updated_at'],
+    )
+
+
+def com_repeticao(funcao, *args, tentativas=3):
+    """
+    Repete a transação em caso de deadlock (MySQL 1213).
+
+    Upserts concorrentes em agregados_metricas usam chaves distintas, mas os
+    gap locks do InnoDB em chaves vizinhas ainda podem gerar deadlocks; a
+    transação vítima é desfeita por inteiro e pode ser refeita com segurança.
+    """
+    for tentativa in range(tentativas):
+        try:
+            return funcao(*args)
+        except OperationalError as erro:
+            if tentativa == tentativas - 1 or not erro.args or erro.args[0] != 1213:
+                raise
+            time.sleep(0.1 * (tentativa + 1))
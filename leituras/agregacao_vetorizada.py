@@ -0,0 +1,154 @@
+"""
+Agregação vetorizada (NumPy) das leituras brutas em períodos de uma hora.
+
+Alternativa a agregar_orm (agregar_leituras --backend numpy). As leituras são
+lidas em blocos, com os decimais convertidos para float no próprio SELECT, e
+cada bloco vira colunas NumPy reduzidas por grupo (equipamento, hora) com
+ufunc.reduceat. Os valores são reescalados para inteiros nas casas decimais da
+coluna de origem, então soma, mínimo e máximo são exatos e iguais aos do
+Acumulador com Decimal. O numpy só é exigido por este backend.
+"""
+
+from datetime import datetime
+from decimal import Decimal
+from itertools import islice
+
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+from .agregacao import _mesclar
+from .models import AgregadoMetrica
+
+
+SEGUNDOS_HORA = 3600
+
+
+def _importar_numpy():
+    import numpy
+    return numpy
+
+
+def numpy_disponivel():
+    try:
+        _importar_numpy()
+    except ModuleNotFoundError:
+        return False
+    return True
+
+
+def agregar_numpy(fonte, id_inicio, id_fim, chunk_size=20000, lote_escrita=500):
+    """Agrega um intervalo de ids em períodos de uma hora, um bloco de ``chunk_size`` leituras por vez"""
+    return agregar_leituras_numpy(
+        fonte, fonte.modelo.objects.filter(id__gt=id_inicio, id__lte=id_fim), chunk_size, lote_escrita
+    )
+
+
+def agregar_leituras_numpy(fonte, leituras, chunk_size=20000, lote_escrita=500):
+    """
+    Agrega as ``leituras`` (queryset da tabela de ``fonte``) em períodos de uma hora.
+
+    As leituras chegam ordenadas por (cliente, equipamento, timestamp, id); o
+    último grupo de cada bloco pode continuar no seguinte, então suas leituras
+    passam para o próximo bloco em vez de serem gravadas. Retorna a quantidade
+    de leituras lidas.
+    """
+    np = _importar_numpy()
+    escalas = [10 ** fonte.modelo._meta.get_field(coluna).decimal_places for coluna in fonte.colunas]
+    linhas = leituras.order_by(
+        'id_cliente', 'id_equipamento', 'timestamp', 'id'
+    ).values_list(
+        'id_cliente', 'id_equipamento', 'timestamp', *[Cast(coluna, FloatField()) for coluna in fonte.colunas]
+    ).iterator(chunk_size=chunk_size)
+
+    pendentes = []
+    resto = []
+    lidas = 0
+    while True:
+        novas = list(islice(linhas, chunk_size))
+        lidas += len(novas)
+        bloco = resto + novas
+        if not bloco:
+            break
+        final = len(novas) < chunk_size
+        inicios, metricas = _reduzir(np, bloco, escalas)
+        if final:
+            grupos = len(inicios)
+        else:
+            grupos = len(inicios) - 1
+            resto = bloco[inicios[-1]:]
+
+        for grupo in range(grupos):
+            id_cliente, id_equipamento, timestamp = bloco[inicios[grupo]][:3]
+            ultimo_timestamp = bloco[inicios[grupo + 1] - 1 if grupo + 1 < len(inicios) else len(bloco) - 1][2]
+            periodo_inicio = datetime.fromtimestamp(
+                timestamp.timestamp() // SEGUNDOS_HORA * SEGUNDOS_HORA, tz=timestamp.tzinfo
+            )
+            for prefixo, escala, (contagem, soma, minimo, maximo, ultima) in zip(fonte.prefixos, escalas, metricas):
+                if not contagem[grupo]:
+                    continue
+                pendentes.append(AgregadoMetrica(
+                    id_cliente=id_cliente,
+                    id_equipamento=id_equipamento,
+                    metrica=prefixo,
+                    granularidade='hora',
+                    periodo_inicio=periodo_inicio,
+                    contagem=int(contagem[grupo]),
+                    soma=_decimal(soma[grupo], escala),
+                    minimo=_decimal(minimo[grupo], escala),
+                    maximo=_decimal(maximo[grupo], escala),
+                    ultima=_decimal(ultima[grupo], escala),
+                    ultimo_timestamp=ultimo_timestamp,
+                ))
+            if len(pendentes) >= lote_escrita:
+                _mesclar(pendentes)
+                pendentes = []
+        if final:
+            break
+
+    if pendentes:
+        _mesclar(pendentes)
+    return lidas
+
+
+def _reduzir(np, bloco, escalas):
+    """
+    Início de cada grupo (equipamento, hora) do bloco e, por métrica, os arrays
+    (contagem, soma, mínimo, máximo, última) por grupo, em inteiros escalados.
+
+    Nulos não entram em contagem/soma/mínimo/máximo; a última leitura do grupo
+    vale mesmo quando nula (None), como no Acumulador.
+    """
+    total = len(bloco)
+    clientes, equipamentos, instantes, *colunas = zip(*bloco)
+    horas = np.fromiter((instante.timestamp() // SEGUNDOS_HORA for instante in instantes), dtype=np.int64, count=total)
+    clientes = np.array(clientes, dtype=object)
+    equipamentos = np.array(equipamentos, dtype=object)
+
+    mudou = np.ones(total, dtype=bool)
+    mudou[1:] = (horas[1:] != horas[:-1]) | (clientes[1:] != clientes[:-1]) | (equipamentos[1:] != equipamentos[:-1])
+    inicios = np.flatnonzero(mudou)
+    ultimos = np.append(inicios[1:], total) - 1
+
+    limites = np.iinfo(np.int64)
+    metricas = []
+    for coluna, escala in zip(colunas, escalas):
+        valores = np.array(coluna, dtype=np.float64)  # None -> nan
+        validos = ~np.isnan(valores)
+        inteiros = np.rint(np.where(validos, valores, 0.0) * escala).astype(np.int64)
+        ultima = inteiros[ultimos].astype(object)
+        ultima[~validos[ultimos]] = None
+        metricas.append((
+            np.add.reduceat(validos.astype(np.int64), inicios),
+            np.add.reduceat(inteiros, inicios),
+            np.minimum.reduceat(np.where(validos, inteiros, limites.max), inicios),
+            np.maximum.reduceat(np.where(validos, inteiros, limites.min), inicios),
+            ultima,
+        ))
+    return inicios, metricas
+
+
+def _decimal(inteiro, escala):
+    """Inteiro escalado de volta para Decimal nas casas da coluna de origem"""
+    if inteiro is None:
+        return None
+    return Decimal(int(inteiro)) / escala
@@ -0,0 +1,97 @@
+"""
+Redução de séries temporais para os gráficos.
+
+LTTB (Largest-Triangle-Three-Buckets) preserva a forma da série: divide os
+pontos em faixas e fica, em cada uma, com o ponto que forma o maior triângulo
+com o escolhido na faixa anterior e a média da seguinte. Min/max fica com o
+menor e o maior ponto de cada faixa, então picos nunca desaparecem. As funções
+devolvem índices, para que séries que compartilham o eixo x sejam reduzidas juntas.
+"""
+
+
+def lttb(x, y, pontos):
+    """Índices dos ``pontos`` pontos escolhidos pelo LTTB (o primeiro e o último sempre incluídos)"""
+    total = len(x)
+    if pontos >= total:
+        return list(range(total))
+    if pontos < 3:
+        return [0, total - 1][:pontos]
+
+    largura = (total - 2) / (pontos - 2)
+    indices = [0]
+    anterior = 0
+    for faixa in range(pontos - 2):
+        inicio = int(faixa * largura) + 1
+        fim = int((faixa + 1) * largura) + 1
+
+        # Média da faixa seguinte (na última, o ponto final)
+        proxima_inicio = fim
+        proxima_fim = min(int((faixa + 2) * largura) + 1, total)
+        quantidade = proxima_fim - proxima_inicio
+        media_x = sum(x[proxima_inicio:proxima_fim]) / quantidade
+        media_y = sum(y[proxima_inicio:proxima_fim]) / quantidade
+
+        ax, ay = x[anterior], y[anterior]
+        escolhido, maior_area = inicio, -1.0
+        for i in range(inicio, fim):
+            area = abs((ax - media_x) * (y[i] - ay) - (ax - x[i]) * (media_y - ay))
+            if area > maior_area:
+                escolhido, maior_area = i, area
+        indices.append(escolhido)
+        anterior = escolhido
+
+    indices.append(total - 1)
+    return indices
+
+
+def min_max(x, y, pontos):
+    """Índices do mínimo e do máximo de cada uma das ``pontos // 2`` faixas, mais as extremidades"""
+    total = len(x)
+    if pontos >= total:
+        return list(range(total))
+    if pontos < 4:
+        return [0, total - 1][:pontos]
+
+    faixas = (pontos - 2) // 2
+    largura = (total - 2) / faixas
+    indices = {0, total - 1}
+    for faixa in range(faixas):
+        inicio = int(faixa * largura) + 1
+        fim = max(int((faixa + 1) * largura) + 1, inicio + 1)
+        trecho = range(inicio, min(fim, total - 1))
+        if trecho:
+            indices.add(min(trecho, key=y.__getitem__))
+            indices.add(max(trecho, key=y.__getitem__))
+    return sorted(indices)
+
+
+METODOS = {
+    'lttb': lttb,
+    'minmax': min_max,
+}
+
+
+def reduzir(x, series, pontos, metodo='lttb'):
+    """
+    Índices a manter para que as ``series`` (listas alinhadas a ``x``) somem até ``pontos`` pontos.
+
+    Cada série é reduzida só sobre seus valores não nulos, com uma parte do
+    orçamento: as mais curtas ficam inteiras e cedem o que sobra às demais. O
+    resultado é a união ordenada dos índices escolhidos, com até ``pontos``.
+    """
+    selecionar = METODOS[metodo]
+    validas = [
+        (y, [i for i, valor in enumerate(y) if valor is not None]) for y in series
+    ]
+    validas = sorted((item for item in validas if item[1]), key=lambda item: len(item[1]))
+    escolhidos = set()
+    restante = pontos
+    for posicao, (y, validos) in enumerate(validas):
+        cota = restante // (len(validas) - posicao)
+        if len(validos) <= cota:
+            indices = range(len(validos))
+        else:
+            indices = selecionar([x[i] for i in validos], [y[i] for i in validos], cota)
+        escolhidos.update(validos[i] for i in indices)
+        restante -= len(indices)
+    return sorted(escolhidos)
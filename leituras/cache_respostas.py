@@ -0,0 +1,66 @@
+"""
+Cache HTTP das respostas da API de gráficos.
+
+Os dados só mudam quando a agregação grava em dados_agregados, então a versão
+dos dados é o maior updated_at da tabela (uma leitura do índice de updated_at).
+Com ela as views respondem a requisições condicionais com 304 (ETag e
+Last-Modified) e guardam a resposta completa no cache 'api' por combinação de
+filtros. A versão faz parte da chave: quando uma agregação termina, as
+respostas anteriores deixam de ser encontradas e expiram pelo timeout, sem
+depender de o processo que agregou alcançar o cache dos servidores web.
+"""
+
+from functools import wraps
+from hashlib import sha1
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .agregacao import inicio_periodo
+from .models import DadosAgregados
+
+
+def versao_dados():
+    """Instante da última gravação em dados_agregados (None se vazia)"""
+    return DadosAgregados.objects.ultima_atualizacao()
+
+
+def em_cache(view):
+    """
+    Aplica ETag/Last-Modified e o cache de respostas a uma view JSON de GET.
+
+    Os intervalos da API são relativos ao momento da requisição, então a
+    validação também muda a cada hora, quando um novo período entra na janela.
+    Só respostas 200 são guardadas.
+    """
+    @wraps(view)
+    def envolvida(request, *args, **kwargs):
+        hora = inicio_periodo(timezone.now(), 'hora')
+        versao = versao_dados()
+        modificacao = max(versao, hora) if versao else hora
+        etag = f'"{int(modificacao.timestamp() * 1_000_000):x}"'
+
+        resposta = get_conditional_response(request, etag=etag, last_modified=int(modificacao.timestamp()))
+        if resposta is None:
+            cache = caches['api']
+            chave = 'leituras:api:' + sha1(f'{etag}{request.get_full_path()}'.encode()).hexdigest()
+            conteudo = cache.get(chave)
+            if conteudo is not None:
+                resposta = HttpResponse(conteudo, content_type='application/json')
+            else:
+                resposta = view(request, *args, **kwargs)
+                if resposta.status_code != 200:
+                    return resposta
+                cache.set(chave, resposta.content, settings.CACHE_API_TIMEOUT)
+
+        resposta['ETag'] = etag
+        resposta['Last-Modified'] = http_date(modificacao.timestamp())
+        # O navegador guarda a resposta mas revalida a cada uso (304 se nada mudou)
+        patch_cache_control(resposta, private=True, no_cache=True)
+        return resposta
+
+    return envolvida
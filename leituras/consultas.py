@@ -0,0 +1,66 @@
+"""
+Camada de leitura de dados_agregados.
+
+A tabela larga tem ~90 colunas, quase todas DecimalField, e cada tela usa
+poucas. ``DadosAgregados.objects`` projeta só as colunas pedidas e as anota
+com ``Cast(FloatField())``, de modo que o Django não quantiza um Decimal por
+coluna de cada linha. O tipo devolvido pelo driver varia: no SQLite já é float;
+no MySQL o Cast vira ``(coluna + 0.0)``, que continua DECIMAL, e é o conversor
+do FloatField que o transforma em float. Só as expressões do ORM passam por
+esse conversor; SQL cru (cursor.execute) recebe Decimal. As linhas chegam como
+tuplas nomeadas, utilizáveis nos templates como as instâncias.
+"""
+
+from collections import namedtuple
+from functools import lru_cache
+
+from django.db import models
+from django.db.models import FloatField, Max
+from django.db.models.functions import Cast
+from django.db.models.query import ValuesListIterable
+
+
+def como_float(expressao):
+    """Expressão (campo ou agregação) lida como float (no MySQL, pelo conversor do ORM)"""
+    return Cast(expressao, FloatField())
+
+
+@lru_cache(maxsize=None)
+def _iteravel(campos):
+    """Iterável de values_list que devolve tuplas nomeadas com os ``campos``"""
+    tipo = namedtuple('Linha', campos)
+
+    class Linhas(ValuesListIterable):
+        def __iter__(self):
+            return map(tipo._make, super().__iter__())
+
+    return Linhas
+
+
+class DadosAgregadosQuerySet(models.QuerySet):
+    """Consultas de dados_agregados projetadas nas colunas de cada tela"""
+
+    def _selecao(self, campos):
+        return [
+            como_float(campo) if self.model._meta.get_field(campo).get_internal_type() == 'DecimalField' else campo
+            for campo in campos
+        ]
+
+    def linhas(self, *campos):
+        """
+        Tuplas nomeadas só com ``campos``, decimais como float.
+
+        Continua sendo um queryset: aceita filter, order_by e fatias depois.
+        """
+        clone = self.values_list(*self._selecao(campos))
+        clone._iterable_class = _iteravel(campos)
+        return clone
+
+    def colunas(self, *campos):
+        """{campo: lista de valores} (decimais como float, None onde nulo), para séries e arrays"""
+        valores = list(self.values_list(*self._selecao(campos)))
+        return {campo: [linha[i] for linha in valores] for i, campo in enumerate(campos)}
+
+    def ultima_atualizacao(self):
+        """Instante da última gravação (None se vazia), lido do índice de updated_at"""
+        return self.aggregate(ultima=Max('updated_at'))['ultima']
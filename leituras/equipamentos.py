@@ -0,0 +1,49 @@
+"""
+Registro de equipamentos: os pares (cliente, equipamento) conhecidos.
+
+As listas dos filtros vêm desta tabela pequena (com o cache do Django na
+frente), em vez de DISTINCT sobre dados_agregados. A ingestão e a agregação
+chamam ``registrar`` com os pares de cada lote; só pares novos tocam o banco,
+e nesse caso o cache é invalidado.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Equipamento
+
+
+CHAVE_CACHE = 'leituras:equipamentos'
+
+
+def listar():
+    """Pares (id_cliente, id_equipamento) conhecidos, ordenados"""
+    pares = cache.get(CHAVE_CACHE)
+    if pares is None:
+        pares = list(
+            Equipamento.objects.order_by('id_cliente', 'id_equipamento')
+            .values_list('id_cliente', 'id_equipamento')
+        )
+        cache.set(CHAVE_CACHE, pares, settings.CACHE_EQUIPAMENTOS_TIMEOUT)
+    return pares
+
+
+def clientes():
+    return sorted({id_cliente for id_cliente, _ in listar()})
+
+
+def equipamentos():
+    return sorted({id_equipamento for _, id_equipamento in listar()})
+
+
+def registrar(pares):
+    """Inclui os pares ainda não registrados; retorna quantos eram novos"""
+    novos = set(pares) - set(listar())
+    if not novos:
+        return 0
+    Equipamento.objects.bulk_create(
+        [Equipamento(id_cliente=c, id_equipamento=e) for c, e in novos],
+        ignore_conflicts=True,
+    )
+    cache.delete(CHAVE_CACHE)
+    return len(novos)
@@ -0,0 +1,174 @@
+"""
+Envio ao vivo (Server-Sent Events) dos períodos gravados em dados_agregados.
+
+Cada processo ASGI tem um único ``Hub``: enquanto houver conexões abertas, ele
+lê do banco, a cada poucos segundos, as linhas alteradas desde a última leitura
+(pelo índice de updated_at) e entrega a cada inscrito as que passam pelos seus
+filtros. N dashboards abertos custam uma leitura por rodada, não N consultas.
+
+updated_at é atribuído antes do commit, então uma gravação longa pode aparecer
+com instantes já ultrapassados; por isso cada rodada relê uma janela recente e
+descarta as linhas já entregues. O que chegar fora da janela só aparece na
+próxima carga da página.
+"""
+
+import asyncio
+import json
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+from .agregacao import METRICAS
+from .models import DadosAgregados
+
+
+CAMPOS_EVENTO = [
+    'id', 'updated_at', 'id_cliente', 'id_equipamento', 'granularidade',
+    'periodo_inicio', 'registros_contagem',
+] + [f'{prefixo}_media' for prefixo in METRICAS]
+
+JANELA_RELEITURA = timedelta(seconds=30)
+LINHAS_POR_RODADA = 5000
+
+# Sem eventos, um comentário mantém a conexão (e proxies) ativos. A conexão é
+# encerrada após DURACAO_CONEXAO e o EventSource reconecta: no Django 4.2 o
+# servidor ASGI não cancela a resposta quando o navegador desconecta.
+INTERVALO_PING = 15
+DURACAO_CONEXAO = 300
+
+
+class Inscricao:
+    """Conexão SSE: filtros e a fila de eventos a enviar"""
+
+    def __init__(self, cliente=None, equipamento=None, granularidade='hora', tamanho_fila=100):
+        self.cliente = cliente
+        self.equipamento = equipamento
+        self.granularidade = granularidade
+        self.fila = asyncio.Queue(maxsize=tamanho_fila)
+        self.encerrada = False
+
+    def aceita(self, linha):
+        return (
+            linha['granularidade'] == self.granularidade
+            and self.cliente in (None, linha['id_cliente'])
+            and self.equipamento in (None, linha['id_equipamento'])
+        )
+
+    def entregar(self, evento, linhas):
+        """Enfileira o evento (só as linhas do filtro); False se a conexão não acompanha"""
+        if linhas is not None:
+            linhas = [linha for linha in linhas if self.aceita(linha)]
+            if not linhas:
+                return True
+        try:
+            self.fila.put_nowait((evento, linhas))
+        except asyncio.QueueFull:
+            return False
+        return True
+
+
+class Hub:
+    """Leitura única das alterações, repartida entre as inscrições do processo"""
+
+    def __init__(self, intervalo=2.0):
+        self.intervalo = intervalo
+        self.inscricoes = set()
+        self.tarefa = None
+        self.versao = None
+        self.entregues = {}  # id -> updated_at das linhas dentro da janela de releitura
+
+    def inscrever(self, inscricao):
+        self.inscricoes.add(inscricao)
+        if self.tarefa is None or self.tarefa.done():
+            self.tarefa = asyncio.get_running_loop().create_task(self._executar())
+        return inscricao
+
+    def cancelar(self, inscricao):
+        self.inscricoes.discard(inscricao)
+
+    async def _executar(self):
+        await sync_to_async(self._iniciar)()
+        while self.inscricoes:
+            await asyncio.sleep(self.intervalo)
+            evento = await sync_to_async(self._ler)()
+            if evento is None:
+                continue
+            for inscricao in list(self.inscricoes):
+                if not inscricao.entregar(*evento):
+                    # Conexão que não acompanha: é encerrada e o EventSource reconecta
+                    inscricao.encerrada = True
+                    self.cancelar(inscricao)
+
+    def _iniciar(self):
+        """Parte do estado atual: o histórico vem da API, os eventos só trazem o que mudar"""
+        self.versao = self._versao_atual()
+        self.entregues = {}
+        self._ler()
+
+    def _versao_atual(self):
+        close_old_connections()
+        return DadosAgregados.objects.ultima_atualizacao()
+
+    def _ler(self):
+        """
+        Evento com as linhas alteradas desde a última rodada, ou None se nada mudou.
+
+        Rodadas com mais de LINHAS_POR_RODADA linhas (uma agregação grande)
+        viram um evento 'recarregar': é mais barato cada página reler a API.
+        """
+        close_old_connections()
+        alteradas = DadosAgregados.objects.order_by('updated_at', 'id')
+        if self.versao is not None:
+            alteradas = alteradas.filter(updated_at__gt=self.versao - JANELA_RELEITURA)
+        valores = list(alteradas.linhas(*CAMPOS_EVENTO)[:LINHAS_POR_RODADA + 1])
+        if len(valores) > LINHAS_POR_RODADA:
+            self.versao = self._versao_atual()
+            self.entregues = {}
+            return 'recarregar', None
+
+        novas = []
+        for linha in (valor._asdict() for valor in valores):
+            if self.entregues.get(linha['id']) != linha['updated_at']:
+                self.entregues[linha['id']] = linha['updated_at']
+                novas.append(linha)
+        if not novas:
+            return None
+
+        self.versao = max(self.versao or novas[-1]['updated_at'], novas[-1]['updated_at'])
+        limite = self.versao - JANELA_RELEITURA
+        self.entregues = {id_linha: instante for id_linha, instante in self.entregues.items() if instante > limite}
+        return 'agregados', [_serializar(linha) for linha in novas]
+
+
+def _serializar(linha):
+    linha = dict(linha)
+    del linha['id'], linha['updated_at']
+    linha['periodo_inicio'] = int(linha['periodo_inicio'].timestamp() * 1000)
+    return linha
+
+
+def formatar(evento, dados):
+    """Mensagem SSE com ``dados`` em JSON"""
+    return f'event: {evento}\ndata: {json.dumps(dados, separators=(",", ":"))}\n\n'
+
+
+async def transmitir(inscricao):
+    """Corpo da resposta SSE de uma inscrição, até DURACAO_CONEXAO"""
+    relogio = asyncio.get_running_loop()
+    fim = relogio.time() + DURACAO_CONEXAO
+    hub.inscrever(inscricao)
+    try:
+        yield 'retry: 5000\n\n'
+        while not inscricao.encerrada and relogio.time() < fim:
+            try:
+                evento, dados = await asyncio.wait_for(inscricao.fila.get(), timeout=INTERVALO_PING)
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            yield formatar(evento, dados)
+    finally:
+        hub.cancelar(inscricao)
+
+
+hub = Hub()
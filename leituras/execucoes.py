@@ -0,0 +1,173 @@
+"""
+Fila de execuções da agregação.
+
+O botão "Atualizar Dados" apenas registra um pedido (ExecucaoAgregacao pendente)
+e responde na hora; quem agrega é o processo ``python manage.py agregador``,
+que consome a fila e, entre pedidos, agrega de forma incremental a cada
+intervalo. Um pedido feito enquanto já há uma execução pendente ou em andamento
+que cubra a granularidade pedida se junta a ela, então cliques simultâneos não
+disparam agregações sobrepostas.
+"""
+
+import os
+import tempfile
+import zlib
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .agregacao import GRANULARIDADES, com_repeticao
+from .models import ExecucaoAgregacao
+
+
+ATIVAS = ('pendente', 'executando')
+TRAVA_AGREGADOR = 'leituras.agregador'
+
+
+def _cobre(periodo, pedido):
+    """Uma execução até ``periodo`` também atualiza ``pedido`` (hora < dia < semana)"""
+    return GRANULARIDADES.index(periodo) >= GRANULARIDADES.index(pedido)
+
+
+def solicitar(periodo='hora', origem='manual'):
+    """
+    Enfileira uma agregação ou se junta a uma ativa; retorna (execucao, criada).
+
+    Sem execução ativa, o SELECT ... FOR UPDATE trava só o intervalo vazio do
+    índice (gap lock), e dois pedidos simultâneos se bloqueiam ao inserir
+    (deadlock 1213): a transação vítima é refeita e se junta à do outro.
+    """
+    return com_repeticao(_solicitar, periodo, origem)
+
+
+def _solicitar(periodo, origem):
+    with transaction.atomic():
+        ativas = ExecucaoAgregacao.objects.select_for_update().filter(status__in=ATIVAS).order_by('id')
+        for execucao in ativas:
+            if execucao.status == 'executando' and not _cobre(execucao.periodo, periodo):
+                continue
+            campos = ['solicitacoes']
+            if not _cobre(execucao.periodo, periodo):
+                # Ainda pendente: passa a atualizar até a granularidade mais grossa pedida
+                execucao.periodo = periodo
+                campos.append('periodo')
+            execucao.solicitacoes = F('solicitacoes') + 1
+            execucao.save(update_fields=campos)
+            execucao.refresh_from_db()
+            return execucao, False
+        return ExecucaoAgregacao.objects.create(periodo=periodo, origem=origem), True
+
+
+def reservar():
+    """
+    Marca todas as execuções pendentes como em andamento e as retorna.
+
+    Normalmente há no máximo uma, mas dois pedidos simultâneos sem execução
+    ativa podem criar duas; reservá-las juntas faz uma única agregação atendê-las.
+    """
+    return com_repeticao(_reservar)
+
+
+def _reservar():
+    with transaction.atomic():
+        pendentes = list(
+            ExecucaoAgregacao.objects.select_for_update().filter(status='pendente').order_by('id')
+        )
+        if pendentes:
+            ExecucaoAgregacao.objects.filter(id__in=[e.id for e in pendentes]).update(
+                status='executando', iniciada_em=timezone.now()
+            )
+    return pendentes
+
+
+class _Progresso:
+    """Saída do comando de agregação: cada linha vira o progresso das execuções"""
+
+    def __init__(self, execucoes):
+        self.execucoes = execucoes
+
+    def write(self, texto):
+        linhas = [linha.strip() for linha in texto.splitlines() if linha.strip()]
+        if linhas:
+            self.execucoes.update(progresso=linhas[-1][:255])
+
+    def flush(self):
+        pass
+
+
+def executar(execucoes, workers=1):
+    """Roda agregar_leituras uma vez para as execuções reservadas; retorna o erro, se houver"""
+    fila = ExecucaoAgregacao.objects.filter(id__in=[e.id for e in execucoes])
+    periodo = max((e.periodo for e in execucoes), key=GRANULARIDADES.index)
+    try:
+        call_command('agregar_leituras', periodo=periodo, workers=workers, stdout=_Progresso(fila))
+    except Exception as erro:
+        fila.update(status='falhou', erro=repr(erro), concluida_em=timezone.now())
+        return erro
+    fila.update(status='concluida', concluida_em=timezone.now())
+    return None
+
+
+def travar_instancia():
+    """
+    Reserva o agregador do banco; retorna a trava (liberada com ``close()``) ou None se outro a tem.
+
+    No MySQL é um GET_LOCK numa conexão própria, fora do close_old_connections
+    do laço, que o servidor libera se o processo morrer; nos demais bancos, um
+    flock num arquivo temporário com o nome do banco.
+    """
+    if connection.vendor == 'mysql':
+        conexao = connections.create_connection(DEFAULT_DB_ALIAS)
+        with conexao.cursor() as cursor:
+            cursor.execute('SELECT GET_LOCK(%s, 0)', [TRAVA_AGREGADOR])
+            obtida = cursor.fetchone()[0] == 1
+        if not obtida:
+            conexao.close()
+            return None
+        return conexao
+
+    import fcntl
+
+    nome = str(connection.settings_dict['NAME'])
+    arquivo = open(os.path.join(tempfile.gettempdir(), f'{TRAVA_AGREGADOR}-{zlib.crc32(nome.encode())}.lock'), 'w')
+    try:
+        fcntl.flock(arquivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        arquivo.close()
+        return None
+    return arquivo
+
+
+def recuperar_interrompidas():
+    """Execuções deixadas 'executando' por um agregador encerrado à força (chamar com a trava)"""
+    return ExecucaoAgregacao.objects.filter(status='executando').update(
+        status='falhou', erro='Interrompida (agregador encerrado)', concluida_em=timezone.now()
+    )
+
+
+def limpar(dias):
+    """Apaga o histórico de execuções terminadas há mais de ``dias`` dias"""
+    limite = timezone.now() - timedelta(days=dias)
+    return ExecucaoAgregacao.objects.filter(concluida_em__lt=limite).delete()[0]
+
+
+def situacao(execucao):
+    """Representação JSON de uma execução (endpoint de status)"""
+    def data(valor):
+        return valor.isoformat() if valor else None
+
+    return {
+        'id': execucao.id,
+        'status': execucao.status,
+        'origem': execucao.origem,
+        'periodo': execucao.periodo,
+        'solicitacoes': execucao.solicitacoes,
+        'progresso': execucao.progresso,
+        'erro': execucao.erro or None,
+        'solicitada_em': data(execucao.solicitada_em),
+        'iniciada_em': data(execucao.iniciada_em),
+        'concluida_em': data(execucao.concluida_em),
+    }
@@ -0,0 +1,189 @@
+"""
+Exportação de DadosAgregados em streaming.
+
+Os registros são lidos em blocos paginados por chave e cada formato converte
+um bloco por vez: CSV (opcionalmente gzip) ou colunar (Parquet/Arrow IPC),
+em que cada bloco vira um row group / record batch. O pyarrow só é exigido
+pelos formatos colunares.
+"""
+
+import csv
+import io
+import zlib
+
+from django.db.models import FloatField, Q
+from django.db.models.functions import Cast
+
+from .models import DadosAgregados
+
+
+# Campos exportados, na ordem do modelo (lidos uma única vez)
+CAMPOS_EXPORTACAO = [field.name for field in DadosAgregados._meta.fields]
+LINHAS_POR_BLOCO = 2000
+LINHAS_POR_GRUPO = 20000
+
+
+def iterar_por_chave(query, campos, tamanho=LINHAS_POR_BLOCO):
+    """
+    Percorre a consulta em ordem de (periodo_inicio, id), um bloco de tuplas por vez.
+
+    Cada bloco é uma consulta própria que continua da última chave lida, em vez de
+    um único cursor: o driver do MySQL carrega o resultado inteiro na memória
+    mesmo com iterator(), então só a paginação por chave mantém a memória constante.
+    ``campos`` aceita nomes e expressões, e precisa incluir periodo_inicio e id.
+    """
+    campos = list(campos)
+    inicio = campos.index('periodo_inicio')
+    pk = campos.index('id')
+    query = query.order_by('periodo_inicio', 'id').values_list(*campos)
+
+    bloco = list(query[:tamanho])
+    while bloco:
+        yield bloco
+        if len(bloco) < tamanho:
+            return
+        ultimo = bloco[-1]
+        bloco = list(query.filter(
+            Q(periodo_inicio__gt=ultimo[inicio]) | Q(periodo_inicio=ultimo[inicio], id__gt=ultimo[pk])
+        )[:tamanho])
+
+
+# ========== CSV ==========
+
+def gerar_csv(query):
+    """Gera o CSV bloco a bloco, com memória constante"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+
+    # BOM para UTF-8 e cabeçalho saem antes da primeira consulta
+    buffer.write('\ufeff')
+    writer.writerow(CAMPOS_EXPORTACAO)
+    yield buffer.getvalue()
+
+    for bloco in iterar_por_chave(query, CAMPOS_EXPORTACAO):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(bloco)
+        yield buffer.getvalue()
+
+
+def gerar_csv_gz(query):
+    """O mesmo CSV, comprimido em gzip à medida que é gerado"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for parte in gerar_csv(query):
+        comprimido = compressor.compress(parte.encode('utf-8'))
+        if comprimido:
+            yield comprimido
+    yield compressor.flush()
+
+
+# ========== Colunar (pyarrow) ==========
+
+def _importar_pyarrow():
+    import pyarrow
+    import pyarrow.parquet  # noqa: F401
+    return pyarrow
+
+
+def pyarrow_disponivel():
+    try:
+        _importar_pyarrow()
+    except ModuleNotFoundError:
+        return False
+    return True
+
+
+def _colunas_tipadas(pa):
+    """
+    Campos (ou expressões) a consultar e o schema Arrow correspondente.
+
+    Decimais são lidos com Cast(FloatField()), então as tuplas já trazem floats
+    (no MySQL o driver devolve DECIMAL e é o conversor do ORM que os converte)
+    e as colunas float64 saem direto delas.
+    """
+    campos, schema = [], []
+    for field in DadosAgregados._meta.fields:
+        tipo = field.get_internal_type()
+        if tipo == 'DecimalField':
+            campos.append(Cast(field.name, FloatField()))
+            schema.append(pa.field(field.name, pa.float64()))
+            continue
+        campos.append(field.name)
+        if tipo in ('AutoField', 'BigAutoField', 'IntegerField', 'BigIntegerField'):
+            schema.append(pa.field(field.name, pa.int64()))
+        elif tipo == 'DateTimeField':
+            schema.append(pa.field(field.name, pa.timestamp('us', tz='UTC')))
+        elif tipo == 'BooleanField':
+            schema.append(pa.field(field.name, pa.bool_()))
+        else:
+            schema.append(pa.field(field.name, pa.string()))
+    return campos, pa.schema(schema)
+
+
+class _Saida(io.RawIOBase):
+    """Destino de escrita que acumula os bytes até serem repassados à resposta"""
+
+    def __init__(self):
+        self.partes = []
+        self.posicao = 0
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self.partes.append(bytes(dados))
+        self.posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self.posicao
+
+    def esvaziar(self):
+        dados = b''.join(self.partes)
+        self.partes = []
+        return dados
+
+
+def _gerar_colunar(query, abrir_escritor):
+    pa = _importar_pyarrow()
+    campos, schema = _colunas_tipadas(pa)
+    saida = _Saida()
+    escritor = abrir_escritor(pa, saida, schema)
+
+    for bloco in iterar_por_chave(query, campos, LINHAS_POR_GRUPO):
+        colunas = [
+            pa.array(valores, type=campo.type)
+            for valores, campo in zip(zip(*bloco), schema)
+        ]
+        escritor.write_batch(pa.RecordBatch.from_arrays(colunas, schema=schema))
+        yield saida.esvaziar()
+
+    escritor.close()
+    yield saida.esvaziar()
+
+
+def gerar_parquet(query):
+    """Parquet com um row group por bloco lido"""
+    return _gerar_colunar(
+        query,
+        lambda pa, saida, schema: pa.parquet.ParquetWriter(saida, schema, compression='zstd'),
+    )
+
+
+def gerar_arrow(query):
+    """Arrow IPC (formato stream, zstd), um record batch por bloco lido"""
+    return _gerar_colunar(
+        query,
+        lambda pa, saida, schema: pa.ipc.new_stream(
+            saida, schema, options=pa.ipc.IpcWriteOptions(compression='zstd')
+        ),
+    )
+
+
+# formato -> (content type, extensão, gerador, requer pyarrow)
+FORMATOS = {
+    'csv': ('text/csv; charset=utf-8', 'csv', gerar_csv, False),
+    'csv.gz': ('application/gzip', 'csv.gz', gerar_csv_gz, False),
+    'parquet': ('application/vnd.apache.parquet', 'parquet', gerar_parquet, True),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows', gerar_arrow, True),
+}
@@ -0,0 +1,364 @@
+"""
+Ingestão de leituras MQTT nas tabelas brutas.
+
+Tópicos seguem o formato ``<prefixo>/<id_cliente>/<id_equipamento>/<tabela>``,
+onde ``<tabela>`` é uma das tabelas brutas (``temperaturas``, ``umidades``,
+``grandezas_eletricas``...). O payload é JSON: um número para tabelas de uma
+coluna, ou um objeto com as colunas (``{"tensao_r": 220.1, ...}``).
+"""
+
+import asyncio
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import equipamentos
+from .agregacao import FONTES
+
+
+FONTES_POR_TABELA = {fonte.tabela: fonte for fonte in FONTES}
+
+
+def _limites(fonte):
+    """Quantum e limite absoluto de cada coluna decimal, a partir do modelo"""
+    limites = []
+    for coluna in fonte.colunas:
+        campo = fonte.modelo._meta.get_field(coluna)
+        limites.append((
+            Decimal(1).scaleb(-campo.decimal_places),
+            Decimal(10) ** (campo.max_digits - campo.decimal_places),
+        ))
+    return limites
+
+
+LIMITES = {fonte: _limites(fonte) for fonte in FONTES}
+
+
+def decodificar(topico, payload, prefixo):
+    """
+    Converte uma mensagem em (fonte, linha), ou None se for inválida.
+
+    A linha segue a ordem de ``colunas_insercao(fonte)``; o timestamp é o
+    instante de chegada, como o auto_now_add do modelo.
+    """
+    partes = topico.split('/')
+    if len(partes) != 4 or partes[0] != prefixo:
+        return None
+    _, id_cliente, id_equipamento, tabela = partes
+    fonte = FONTES_POR_TABELA.get(tabela)
+    if fonte is None:
+        return None
+
+    try:
+        dados = json.loads(payload, parse_float=Decimal, parse_int=Decimal)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+    if isinstance(dados, dict):
+        valores = [dados.get(coluna) for coluna in fonte.colunas]
+        if len(valores) == 1 and valores[0] is None:
+            valores[0] = dados.get('valor')
+    elif len(fonte.colunas) == 1:
+        valores = [dados]
+    else:
+        return None
+
+    # Tabelas de uma coluna não aceitam leitura nula
+    if len(valores) == 1 and valores[0] is None:
+        return None
+
+    presentes = 0
+    for i, (valor, (quantum, limite)) in enumerate(zip(valores, LIMITES[fonte])):
+        if valor is None:
+            continue
+        if not isinstance(valor, Decimal) or not valor.is_finite() or abs(valor) >= limite:
+            return None
+        valores[i] = valor.quantize(quantum)
+        presentes += 1
+    if not presentes:
+        return None
+
+    return fonte, (id_cliente, id_equipamento, False, timezone.now(), *valores)
+
+
+def colunas_insercao(fonte):
+    return ['id_cliente', 'id_equipamento', 'agregado', 'timestamp'] + fonte.colunas
+
+
+def gravar_linhas(fonte, linhas, tamanho_lote):
+    """
+    INSERT de várias linhas por lote, a partir de tuplas já validadas.
+
+    Equivale a bulk_create, sem instanciar modelos nem preparar campo a campo,
+    que dominavam o custo da ingestão.
+    """
+    colunas = colunas_insercao(fonte)
+    sql = (
+        f'INSERT INTO {fonte.tabela} ({", ".join(colunas)}) '
+        f'VALUES ({", ".join(["%s"] * len(colunas))})'
+    )
+    adaptar = connection.ops.adapt_datetimefield_value
+    with connection.cursor() as cursor:
+        for inicio in range(0, len(linhas), tamanho_lote):
+            cursor.executemany(sql, [
+                (*linha[:3], adaptar(linha[3]), *linha[4:])
+                for linha in linhas[inicio:inicio + tamanho_lote]
+            ])
+    equipamentos.registrar({(linha[0], linha[1]) for linha in linhas})
+
+
+class Ingestor:
+    """
+    Acumula mensagens decodificadas e grava em lotes de INSERTs de várias linhas.
+
+    ``receber`` é chamado pela thread de rede do cliente MQTT e apenas enfileira;
+    quando a fila limitada enche (banco lento), a chamada bloqueia e o cliente
+    para de ler do socket, repassando a pressão ao broker. ``executar`` decodifica
+    e grava quando o lote atinge ``tamanho_lote`` ou após ``intervalo`` segundos.
+    """
+
+    def __init__(self, prefixo='leituras', tamanho_lote=5000, intervalo=1.0, max_pendentes=50000):
+        self.prefixo = prefixo
+        self.tamanho_lote = tamanho_lote
+        self.intervalo = intervalo
+        self.fila = queue.Queue(maxsize=max_pendentes)
+        self.buffers = defaultdict(list)
+        self.pendentes = 0
+        self.estatisticas = {'recebidas': 0, 'gravadas': 0, 'descartadas': 0, 'lotes': 0, 'tempo_gravacao': 0.0}
+
+    def receber(self, topico, payload):
+        self.fila.put((topico, payload))
+
+    def executar(self, parar):
+        """Consome a fila até o evento ``parar`` ser sinalizado e a fila esvaziar"""
+        prazo = time.monotonic() + self.intervalo
+        while not (parar.is_set() and self.fila.empty()):
+            espera = max(prazo - time.monotonic(), 0)
+            try:
+                topico, payload = self.fila.get(timeout=espera)
+            except queue.Empty:
+                pass
+            else:
+                self.estatisticas['recebidas'] += 1
+                decodificada = decodificar(topico, payload, self.prefixo)
+                if decodificada is None:
+                    self.estatisticas['descartadas'] += 1
+                else:
+                    fonte, linha = decodificada
+                    self.buffers[fonte].append(linha)
+                    self.pendentes += 1
+
+            if self.pendentes >= self.tamanho_lote or time.monotonic() >= prazo:
+                self.gravar()
+                prazo = time.monotonic() + self.intervalo
+
+        self.gravar()
+
+    def gravar(self):
+        """Grava todas as leituras acumuladas, em uma transação"""
+        if not self.pendentes:
+            return
+        inicio = time.perf_counter()
+        with transaction.atomic():
+            for fonte, linhas in self.buffers.items():
+                gravar_linhas(fonte, linhas, self.tamanho_lote)
+        self.estatisticas['tempo_gravacao'] += time.perf_counter() - inicio
+        self.estatisticas['gravadas'] += self.pendentes
+        self.estatisticas['lotes'] += 1
+        self.buffers = defaultdict(list)
+        self.pendentes = 0
+
+
+class BrokerLocal:
+    """Substituto em processo de um broker MQTT, para simulações e testes de carga"""
+
+    def __init__(self):
+        self.assinantes = []
+
+    def assinar(self, callback):
+        self.assinantes.append(callback)
+
+    def publicar(self, topico, payload):
+        for callback in self.assinantes:
+            callback(topico, payload)
+
+
+# ========== Pipeline assíncrono (uma fila e um escritor por tabela) ==========
+
+_FIM = object()
+
+
+class PipelineAsync:
+    """
+    Ingestão com asyncio: decodificação -> fila limitada por tabela -> escritor por tabela.
+
+    Cada tabela tem um orçamento de ``max_pendentes`` mensagens em trânsito
+    (semáforo adquirido em ``receber`` e liberado após a gravação). Uma tabela
+    lenta esgota apenas o próprio orçamento: bloqueia a thread do cliente MQTT
+    dessa tabela, enquanto as demais seguem sendo decodificadas e gravadas.
+    Os INSERTs rodam em um executor de threads, fora do loop de eventos.
+
+    Uma falha de gravação encerra o pipeline inteiro: as demais tarefas são
+    canceladas e as threads bloqueadas em ``receber`` retornam, descartando a
+    mensagem, para que os clientes MQTT possam ser parados.
+    """
+
+    def __init__(self, prefixo='leituras', tamanho_lote=5000, intervalo=1.0, max_pendentes=50000):
+        self.prefixo = prefixo
+        self.tamanho_lote = tamanho_lote
+        self.intervalo = intervalo
+        self.max_pendentes = max_pendentes
+        self.vagas = {
+            fonte.tabela: threading.BoundedSemaphore(max_pendentes) for fonte in FONTES
+        }
+        self.metricas = {
+            fonte.tabela: {
+                'recebidas': 0, 'gravadas': 0, 'descartadas': 0, 'lotes': 0,
+                'latencia_ultima': 0.0, 'latencia_max': 0.0, 'latencia_total': 0.0,
+            }
+            for fonte in FONTES
+        }
+        self.loop = None
+        self.parado = False
+
+    def receber(self, topico, payload):
+        """Chamado pelas threads dos clientes MQTT; bloqueia quando a tabela está sem vagas"""
+        tabela = topico.rsplit('/', 1)[-1]
+        vagas = self.vagas.get(tabela)
+        if vagas is None or self.parado:
+            return
+        while not vagas.acquire(timeout=0.5):
+            if self.parado:
+                return
+        if self.parado:
+            vagas.release()
+            return
+        try:
+            self.loop.call_soon_threadsafe(self.entrada.put_nowait, (tabela, topico, payload))
+        except RuntimeError:
+            # Loop de eventos fechado entre a verificação e o envio
+            vagas.release()
+
+    def encerrar(self):
+        """Pede o encerramento (thread-safe); as mensagens já recebidas são gravadas"""
+        if not self.parado:
+            self.loop.call_soon_threadsafe(self.entrada.put_nowait, _FIM)
+
+    def profundidades(self):
+        return {fonte.tabela: self.filas[fonte].qsize() for fonte in FONTES}
+
+    async def executar(self, ao_iniciar=None, relatorio=None, intervalo_relatorio=10.0):
+        """
+        Roda o pipeline até ``encerrar``.
+
+        ``ao_iniciar`` é chamado com o loop já ativo (para conectar os clientes);
+        ``relatorio``, se informado, recebe (profundidades, métricas) periodicamente.
+        """
+        self.loop = asyncio.get_running_loop()
+        self.entrada = asyncio.Queue()
+        # Cabe o orçamento inteiro da tabela mais o marcador de fim
+        self.filas = {fonte: asyncio.Queue(maxsize=self.max_pendentes + 1) for fonte in FONTES}
+        executor = ThreadPoolExecutor(max_workers=len(FONTES), thread_name_prefix='ingestao')
+
+        tarefas = [asyncio.create_task(self._decodificar())] + [
+            asyncio.create_task(self._escrever(fonte, executor)) for fonte in FONTES
+        ]
+        if relatorio is not None:
+            tarefas.append(asyncio.create_task(self._relatar(relatorio, intervalo_relatorio)))
+        try:
+            if ao_iniciar is not None:
+                ao_iniciar()
+            # Uma falha de gravação interrompe o pipeline em vez de parar só uma tabela
+            await asyncio.gather(*tarefas[:len(FONTES) + 1])
+        finally:
+            self.parado = True
+            for tarefa in tarefas:
+                tarefa.cancel()
+            await asyncio.gather(*tarefas, return_exceptions=True)
+            executor.shutdown(wait=True)
+
+    async def _relatar(self, relatorio, intervalo):
+        while True:
+            await asyncio.sleep(intervalo)
+            relatorio(self.profundidades(), self.metricas)
+
+    async def _decodificar(self):
+        while True:
+            item = await self.entrada.get()
+            if item is _FIM:
+                for fila in self.filas.values():
+                    fila.put_nowait(_FIM)
+                return
+
+            tabela, topico, payload = item
+            metricas = self.metricas[tabela]
+            metricas['recebidas'] += 1
+            decodificada = decodificar(topico, payload, self.prefixo)
+            if decodificada is None:
+                metricas['descartadas'] += 1
+                self.vagas[tabela].release()
+                continue
+            fonte, linha = decodificada
+            # Nunca bloqueia: o semáforo da tabela limita o que está em trânsito
+            self.filas[fonte].put_nowait(linha)
+
+    async def _escrever(self, fonte, executor):
+        fila = self.filas[fonte]
+        metricas = self.metricas[fonte.tabela]
+        vagas = self.vagas[fonte.tabela]
+
+        while True:
+            primeira = await fila.get()
+            if primeira is _FIM:
+                return
+
+            lote = [primeira]
+            prazo = self.loop.time() + self.intervalo
+            fim = False
+            while len(lote) < self.tamanho_lote:
+                if fila.empty():
+                    restante = prazo - self.loop.time()
+                    if restante <= 0:
+                        break
+                    try:
+                        linha = await asyncio.wait_for(fila.get(), restante)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    linha = fila.get_nowait()
+                if linha is _FIM:
+                    fim = True
+                    break
+                lote.append(linha)
+
+            inicio = time.perf_counter()
+            try:
+                await self.loop.run_in_executor(executor, self._gravar, fonte, lote)
+            finally:
+                # Gravado ou não, o lote deixa de estar em trânsito
+                for _ in lote:
+                    vagas.release()
+            latencia = time.perf_counter() - inicio
+
+            metricas['gravadas'] += len(lote)
+            metricas['lotes'] += 1
+            metricas['latencia_ultima'] = latencia
+            metricas['latencia_total'] += latencia
+            metricas['latencia_max'] = max(metricas['latencia_max'], latencia)
+            if fim:
+                return
+
+    def _gravar(self, fonte, linhas):
+        # Roda em uma thread do executor, com a própria conexão do Django
+        try:
+            with transaction.atomic():
+                gravar_linhas(fonte, linhas, self.tamanho_lote)
+        finally:
+            connection.close_if_unusable_or_obsolete()
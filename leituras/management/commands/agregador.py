@@ -0,0 +1,105 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils import timezone
+from leituras import execucoes
+from leituras.agregacao import GRANULARIDADES
+
+
+class Command(BaseCommand):
+    help = 'Processo contínuo de agregação: atende os pedidos da fila e agrega de forma incremental a cada intervalo'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=settings.AGREGACAO_INTERVALO,
+            help='Segundos entre agregações agendadas (0 desativa o agendamento; só atende a fila)'
+        )
+        parser.add_argument(
+            '--periodo',
+            type=str,
+            default=settings.AGREGACAO_PERIODO,
+            choices=GRANULARIDADES,
+            help='Granularidade mais grossa atualizada pelas agregações agendadas'
+        )
+        parser.add_argument(
+            '--espera',
+            type=float,
+            default=1.0,
+            help='Segundos entre consultas à fila de pedidos'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Repassado ao agregar_leituras (tabelas agregadas em paralelo, somente MySQL)'
+        )
+        parser.add_argument(
+            '--manter-dias',
+            type=int,
+            default=7,
+            help='Dias de histórico de execuções terminadas mantidos'
+        )
+        parser.add_argument(
+            '--uma-vez',
+            action='store_true',
+            help='Atende os pedidos pendentes (ou faz uma agregação agendada) e termina (ex.: cron)'
+        )
+
+    def handle(self, *args, **options):
+        # Um único agregador por banco: com a trava, execuções 'executando' foram interrompidas
+        trava = execucoes.travar_instancia()
+        if trava is None:
+            if options['uma_vez']:
+                # Ex.: cron com o agregador contínuo no ar, que já atende a fila
+                self.stdout.write(self.style.WARNING('Outro agregador já está ativo neste banco.'))
+                return
+            raise CommandError('Outro agregador já está ativo neste banco')
+        try:
+            self.rodar(options)
+        finally:
+            trava.close()
+
+    def rodar(self, options):
+        """Laço do agregador, com a trava da instância já obtida"""
+        interrompidas = execucoes.recuperar_interrompidas()
+        if interrompidas:
+            self.stdout.write(self.style.WARNING(f'{interrompidas} execução(ões) interrompida(s) marcadas como falha'))
+
+        intervalo = options['intervalo']
+        agendamento = f'a cada {intervalo:g}s até {options["periodo"]}' if intervalo else 'desativado'
+        self.stdout.write(self.style.SUCCESS(f'Agregador iniciado (agendamento: {agendamento})'))
+        proxima = time.monotonic()
+        try:
+            while True:
+                close_old_connections()
+                if not self.atender(options) and intervalo and time.monotonic() >= proxima:
+                    # A agregação agendada também passa pela fila: pedidos manuais
+                    # feitos enquanto ela roda se juntam a ela
+                    execucoes.solicitar(options['periodo'], origem='agendada')
+                    self.atender(options)
+                    execucoes.limpar(options['manter_dias'])
+                    proxima = time.monotonic() + intervalo
+                if options['uma_vez']:
+                    return
+                time.sleep(options['espera'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('\nAgregador encerrado.'))
+
+    def atender(self, options):
+        """Executa os pedidos pendentes, se houver; retorna se algo foi executado"""
+        reservadas = execucoes.reservar()
+        if not reservadas:
+            return False
+        inicio = time.perf_counter()
+        erro = execucoes.executar(reservadas, options['workers'])
+        ids = ', '.join(str(e.id) for e in reservadas)
+        duracao = time.perf_counter() - inicio
+        if erro is not None:
+            self.stderr.write(self.style.ERROR(f'[{timezone.localtime():%H:%M:%S}] execução {ids} falhou: {erro!r}'))
+        else:
+            self.stdout.write(f'[{timezone.localtime():%H:%M:%S}] execução {ids} concluída ({duracao:.2f}s)')
+        return True
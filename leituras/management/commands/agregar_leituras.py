@@ -1,13 +1,21 @@
-from django.core.management.base import BaseCommand
-from django.db import connection
-from django.db.models import Avg, Max, Min, Count
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max, Min, Q
 from django.utils import timezone
 from django.conf import settings
-from datetime import datetime, timedelta
-from leituras.models import (
-    CorrenteBrunidores, CorrenteDescascadores, CorrentePolidores,
-    Temperatura, Umidade, GrandezaEletrica, DadosAgregados
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+import time
+from leituras.agregacao import (
+    FONTES, GRANULARIDADES, JANELA_RELEITURA, agregar_leituras_orm, agregar_orm, com_repeticao, consolidar,
+    materializar, sql_agregacao_mysql,
 )
+from leituras import equipamentos
+from leituras.agregacao_vetorizada import agregar_leituras_numpy, agregar_numpy, numpy_disponivel
+from leituras.models import MarcaAgregacao
+
+
+BACKENDS = ['auto', 'sql', 'orm', 'numpy']
 
 
 class Command(BaseCommand):
@@ -18,568 +26,306 @@ class Command(BaseCommand):
             '--periodo',
             type=str,
             default='hora',
-            choices=['hora', 'dia', 'semana'],
-            help='Período de agregação (hora, dia, semana)'
+            choices=GRANULARIDADES,
+            help='Granularidade mais grossa a atualizar (hora, dia, semana); '
+                 'dia e semana são consolidados a partir do nível anterior'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=50000,
+            help='Quantidade máxima de leituras processadas por transação'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Tabelas brutas agregadas em paralelo, cada uma com sua conexão (somente MySQL)'
+        )
+        parser.add_argument(
+            '--backend',
+            type=str,
+            default=settings.AGREGACAO_BACKEND,
+            choices=BACKENDS,
+            help='Implementação da agregação das tabelas brutas: sql (somente MySQL), orm, '
+                 'numpy (requer o pacote numpy) ou auto (sql no MySQL, orm nos demais)'
+        )
+        parser.add_argument(
+            '--varredura',
+            type=int,
+            default=settings.AGREGACAO_VARREDURA_IDS,
+            help='Ids abaixo da marca d\'água relidos em busca de leituras gravadas fora de ordem (0 desativa)'
         )
 
     def handle(self, *args, **options):
         periodo = options['periodo']
+        lote = options['lote']
         
         self.stdout.write(self.style.SUCCESS(f'Iniciando agregação por {periodo}...'))
         
-        # Detecta o backend do banco de dados
+        # Detecta o backend do banco de dados e escolhe a implementação da agregação
         is_mysql = connection.vendor == 'mysql'
-        if is_mysql:
+        backend = options['backend']
+        if backend == 'auto':
+            backend = 'sql' if is_mysql else 'orm'
+        if backend == 'sql' and not is_mysql:
+            raise CommandError('--backend sql requer MySQL')
+        if backend == 'numpy' and not numpy_disponivel():
+            raise CommandError('--backend numpy requer o pacote numpy')
+        if backend == 'sql':
             self.stdout.write(self.style.WARNING('Usando SQL otimizado para MySQL'))
+        elif backend == 'numpy':
+            self.stdout.write(self.style.WARNING('Usando agregação vetorizada (NumPy)'))
         else:
             self.stdout.write(self.style.WARNING('Usando Django ORM (compatível com SQLite)'))
         
-        # Define o intervalo baseado no período
-        if periodo == 'hora':
-            intervalo = timedelta(hours=1)
-        elif periodo == 'dia':
-            intervalo = timedelta(days=1)
-        else:  # semana
-            intervalo = timedelta(weeks=1)
+        workers = options['workers']
+        if workers > 1 and not is_mysql:
+            # O SQLite aceita um único escritor por vez: threads só disputariam o lock
+            self.stdout.write(self.style.WARNING('--workers ignorado: paralelismo requer MySQL'))
+            workers = 1
         
-        # Executa agregação para cada tabela
-        if is_mysql:
-            self.agregar_corrente_brunidores_mysql(intervalo)
-            self.agregar_corrente_descascadores_mysql(intervalo)
-            self.agregar_corrente_polidores_mysql(intervalo)
-            self.agregar_temperaturas_mysql(intervalo)
-            self.agregar_umidades_mysql(intervalo)
-            self.agregar_grandezas_eletricas_mysql(intervalo)
-        else:
-            self.agregar_corrente_brunidores_orm(intervalo)
-            self.agregar_corrente_descascadores_orm(intervalo)
-            self.agregar_corrente_polidores_orm(intervalo)
-            self.agregar_temperaturas_orm(intervalo)
-            self.agregar_umidades_orm(intervalo)
-            self.agregar_grandezas_eletricas_orm(intervalo)
+        inicio = time.perf_counter()
         
-        self.stdout.write(self.style.SUCCESS('Agregação concluída com sucesso!'))
+        # Leituras brutas -> hora, a partir da marca d'água de cada tabela
+        self.agregar_fontes(backend, lote, workers, options['varredura'])
+        
+        # hora -> dia -> semana, até a granularidade pedida
+        for granularidade in GRANULARIDADES[1:GRANULARIDADES.index(periodo) + 1]:
+            gravados, duracao = self.cronometrar(com_repeticao, self.consolidar_periodos, granularidade)
+            self.stdout.write(f'{granularidade}: {gravados} métricas consolidadas ({duracao:.2f}s)')
+        
+        # Visão larga (dados_agregados) dos períodos alterados acima
+        gravados, duracao = self.cronometrar(
+            com_repeticao, self.avancar_marca, 'dados_agregados', 'materializacao', materializar
+        )
+        self.stdout.write(f'dados_agregados: {gravados} períodos atualizados ({duracao:.2f}s)')
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'Agregação concluída com sucesso! ({time.perf_counter() - inicio:.2f}s)'
+        ))
 
-    # ========== Implementação MySQL (SQL otimizado) ==========
-    
-    def agregar_corrente_brunidores_mysql(self, intervalo):
-        """Agrega dados de corrente dos brunidores usando SQL MySQL"""
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                INSERT INTO dados_agregados (
-                    id_cliente, id_equipamento, periodo_inicio, periodo_fim,
-                    corrente_brunidores_media, corrente_brunidores_max, 
-                    corrente_brunidores_min, corrente_brunidores_ultima,
-                    registros_contagem, created_at, updated_at
-                )
-                SELECT 
-                    id_cliente,
-                    id_equipamento,
-                    DATE_FORMAT(timestamp, '%%Y-%%m-%%d %%H:00:00') as periodo_inicio,
-                    DATE_FORMAT(timestamp + INTERVAL 1 HOUR, '%%Y-%%m-%%d %%H:00:00') as periodo_fim,
-                    AVG(corrente) as corrente_brunidores_media,
-                    MAX(corrente) as corrente_brunidores_max,
-                    MIN(corrente) as corrente_brunidores_min,
-                    (SELECT corrente FROM corrente_brunidores cb2 
-                     WHERE cb2.id_cliente = cb.id_cliente 
-                     AND cb2.id_equipamento = cb.id_equipamento
-                     AND DATE_FORMAT(cb2.timestamp, '%%Y-%%m-%%d %%H:00:00') = DATE_FORMAT(cb.timestamp, '%%Y-%%m-%%d %%H:00:00')
-                     ORDER BY cb2.timestamp DESC LIMIT 1) as corrente_brunidores_ultima,
-                    COUNT(*) as registros_contagem,
-                    NOW() as created_at,
-                    NOW() as updated_at
-                FROM corrente_brunidores cb
-                WHERE agregado = 0
-                GROUP BY id_cliente, id_equipamento, DATE_FORMAT(timestamp, '%%Y-%%m-%%d %%H:00:00')
-                ON DUPLICATE KEY UPDATE
-                    corrente_brunidores_media = VALUES(corrente_brunidores_media),
-                    corrente_brunidores_max = VALUES(corrente_brunidores_max),
-                    corrente_brunidores_min = VALUES(corrente_brunidores_min),
-                    corrente_brunidores_ultima = VALUES(corrente_brunidores_ultima),
-                    registros_contagem = VALUES(registros_contagem),
-                    updated_at = NOW()
-            """)
-            
-            cursor.execute("UPDATE corrente_brunidores SET agregado = 1 WHERE agregado = 0")
+    def agregar_fontes(self, backend, lote, workers, varredura):
+        """
+        Agrega as tabelas brutas, em sequência ou em ``workers`` threads.
 
-    def agregar_corrente_descascadores_mysql(self, intervalo):
-        """Agrega dados de corrente dos descascadores usando SQL MySQL"""
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                INSERT INTO dados_agregados (
-                    id_cliente, id_equipamento, periodo_inicio, periodo_fim,
-                    corrente_descascadores_media, corrente_descascadores_max, 
-                    corrente_descascadores_min, corrente_descascadores_ultima,
-                    registros_contagem, created_at, updated_at
-                )
-                SELECT 
-                    id_cliente,
-                    id_equipamento,
-                    DATE_FORMAT(timestamp, '%%Y-%%m-%%d %%H:00:00') as periodo_inicio,
-                    DATE_FORMAT(timestamp + INTERVAL 1 HOUR, '%%Y-%%m-%%d %%H:00:00') as periodo_fim,
-                    AVG(corrente) as corrente_descascadores_media,
-                    MAX(corrente) as corrente_descascadores_max,
-                    MIN(corrente) as corrente_descascadores_min,
-                    (SELECT corrente FROM corrente_descascadores cd2 
-                     WHERE cd2.id_cliente = cd.id_cliente 
-                     AND cd2.id_equipamento = cd.id_equipamento
-                     AND DATE_FORMAT(cd2.timestamp, '%%Y-%%m-%%d %%H:00:00') = DATE_FORMAT(cd.timestamp, '%%Y-%%m-%%d %%H:00:00')
-                     ORDER BY cd2.timestamp DESC LIMIT 1) as corrente_descascadores_ultima,
-                    COUNT(*) as registros_contagem,
-                    NOW() as created_at,
-                    NOW() as updated_at
-                FROM corrente_descascadores cd
-                WHERE agregado = 0
-                GROUP BY id_cliente, id_equipamento, DATE_FORMAT(timestamp, '%%Y-%%m-%%d %%H:00:00')
-                ON DUPLICATE KEY UPDATE
-                    corrente_descascadores_media = VALUES(corrente_descascadores_media),
-                    corrente_descascadores_max = VALUES(corrente_descascadores_max),
-                    corrente_descascadores_min = VALUES(corrente_descascadores_min),
-                    corrente_descascadores_ultima = VALUES(corrente_descascadores_ultima),
-                    updated_at = NOW()
-            """)
-            
-            cursor.execute("UPDATE corrente_descascadores SET agregado = 1 WHERE agregado = 0")
+        As tabelas são independentes: cada uma tem sua marca d'água e grava só as
+        próprias métricas em agregados_metricas, então não há período disputado
+        entre elas. A única escrita compartilhada, dados_agregados, é feita depois,
+        uma vez, pela materialização.
+        """
+        agregar = {'sql': self.agregar_mysql, 'orm': self.agregar_orm, 'numpy': self.agregar_numpy}[backend]
+        # Leituras atrasadas não formam um intervalo de ids: o SQL MySQL dá lugar ao ORM
+        agregar_leituras = agregar_leituras_numpy if backend == 'numpy' else agregar_leituras_orm
+        tarefas = [
+            (fonte, partial(self.agregar_tabela, fonte, partial(agregar, fonte), agregar_leituras, lote, varredura))
+            for fonte in FONTES
+        ]
+        if workers <= 1:
+            for fonte, tarefa in tarefas:
+                self.relatar(fonte, *self.cronometrar(tarefa))
+            return
+        
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='agregacao') as executor:
+            futuros = {
+                executor.submit(self._agregar_em_thread, tarefa): fonte
+                for fonte, tarefa in tarefas
+            }
+            for futuro in as_completed(futuros):
+                self.relatar(futuros[futuro], *futuro.result())
 
-    def agregar_corrente_polidores_mysql(self, intervalo):
-        """Agrega dados de corrente dos polidores usando SQL MySQL"""
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                INSERT INTO dados_agregados (
-                    id_cliente, id_equipamento, periodo_inicio, periodo_fim,
-                    corrente_polidores_media, corrente_polidores_max, 
-                    corrente_polidores_min, corrente_polidores_ultima,
-                    registros_contagem, created_at, updated_at
-                )
-                SELECT 
-                    id_cliente,
-                    id_equipamento,
-                    DATE_FORMAT(timestamp, '%%Y-%%m-%%d %%H:00:00') as periodo_inicio,
-                    DATE_FORMAT(timestamp + INTERVAL 1 HOUR, '%%Y-%%m-%%d %%H:00:00') as periodo_fim,
-                    AVG(corrente) as corrente_polidores_media,
-                    MAX(corrente) as corrente_polidores_max,
-                    MIN(corrente) as corrente_polidores_min,
-                    (SELECT corrente FROM corrente_polidores cp2 
-                     WHERE cp2.id_cliente = cp.id_cliente 
-                     AND cp2.id_equipamento = cp.id_equipamento
-                     AND DATE_FORMAT(cp2.timestamp, '%%Y-%%m-%%d %%H:00:00') = DATE_FORMAT(cp.timestamp, '%%Y-%%m-%%d %%H:00:00')
-                     ORDER BY cp2.timestamp DESC LIMIT 1) as corrente_polidores_ultima,
-                    COUNT(*) as registros_contagem,
-                    NOW() as created_at,
-                    NOW() as updated_at
-                FROM corrente_polidores cp
-                WHERE agregado = 0
-                GROUP BY id_cliente, id_equipamento, DATE_FORMAT(timestamp, '%%Y-%%m-%%d %%H:00:00')
-                ON DUPLICATE KEY UPDATE
-                    corrente_polidores_media = VALUES(corrente_polidores_media),
-                    corrente_polidores_max = VALUES(corrente_polidores_max),
-                    corrente_polidores_min = VALUES(corrente_polidores_min),
-                    corrente_polidores_ultima = VALUES(corrente_polidores_ultima),
-                    updated_at = NOW()
-            """)
-            
-            cursor.execute("UPDATE corrente_polidores SET agregado = 1 WHERE agregado = 0")
+    def _agregar_em_thread(self, tarefa):
+        # Cada thread usa a própria conexão do Django, fechada ao terminar
+        try:
+            return self.cronometrar(tarefa)
+        finally:
+            connection.close()
 
-    def agregar_temperaturas_mysql(self, intervalo):
-        """Agrega dados de temperatura usando SQL MySQL"""
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                INSERT INTO dados_agregados (
-                    id_cliente, id_equipamento, periodo_inicio, periodo_fim,
-                    temperatura_media, temperatura_max, 
-                    temperatura_min, temperatura_ultima,
-                    registros_contagem, created_at, updated_at
-                )
-                SELECT 
-                    id_cliente,
-                    id_equipamento,
-                    DATE_FORMAT(timestamp, '%%Y-%%m-%%d %%H:00:00') as periodo_inicio,
-                    DATE_FORMAT(timestamp + INTERVAL 1 HOUR, '%%Y-%%m-%%d %%H:00:00') as periodo_fim,
-                    AVG(temperatura) as temperatura_media,
-                    MAX(temperatura) as temperatura_max,
-                    MIN(temperatura) as temperatura_min,
-                    (SELECT temperatura FROM temperaturas t2 
-                     WHERE t2.id_cliente = t.id_cliente 
-                     AND t2.id_equipamento = t.id_equipamento
-                     AND DATE_FORMAT(t2.timestamp, '%%Y-%%m-%%d %%H:00:00') = DATE_FORMAT(t.timestamp, '%%Y-%%m-%%d %%H:00:00')
-                     ORDER BY t2.timestamp DESC LIMIT 1) as temperatura_ultima,
-                    COUNT(*) as registros_contagem,
-                    NOW() as created_at,
-                    NOW() as updated_at
-                FROM temperaturas t
-                WHERE agregado = 0
-                GROUP BY id_cliente, id_equipamento, DATE_FORMAT(timestamp, '%%Y-%%m-%%d %%H:00:00')
-                ON DUPLICATE KEY UPDATE
-                    temperatura_media = VALUES(temperatura_media),
-                    temperatura_max = VALUES(temperatura_max),
-                    temperatura_min = VALUES(temperatura_min),
-                    temperatura_ultima = VALUES(temperatura_ultima),
-                    updated_at = NOW()
-            """)
-            
-            cursor.execute("UPDATE temperaturas SET agregado = 1 WHERE agregado = 0")
+    def agregar_tabela(self, fonte, agregar, agregar_leituras, lote, varredura):
+        """Agrega as leituras atrasadas abaixo da marca e depois as posteriores a ela; retorna (atrasadas, processadas)"""
+        atrasadas = com_repeticao(self.varrer_atrasadas, fonte, agregar_leituras, varredura)
+        return atrasadas, self.processar_em_lotes(fonte.tabela, fonte.modelo, agregar, lote)
 
-    def agregar_umidades_mysql(self, intervalo):
-        """Agrega dados de umidade usando SQL MySQL"""
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                INSERT INTO dados_agregados (
-                    id_cliente, id_equipamento, periodo_inicio, periodo_fim,
-                    umidade_media, umidade_max, 
-                    umidade_min, umidade_ultima,
-                    registros_contagem, created_at, updated_at
-                )
-                SELECT 
-                    id_cliente,
-                    id_equipamento,
-                    DATE_FORMAT(timestamp, '%%Y-%%m-%%d %%H:00:00') as periodo_inicio,
-                    DATE_FORMAT(timestamp + INTERVAL 1 HOUR, '%%Y-%%m-%%d %%H:00:00') as periodo_fim,
-                    AVG(umidade) as umidade_media,
-                    MAX(umidade) as umidade_max,
-                    MIN(umidade) as umidade_min,
-                    (SELECT umidade FROM umidades u2 
-                     WHERE u2.id_cliente = u.id_cliente 
-                     AND u2.id_equipamento = u.id_equipamento
-                     AND DATE_FORMAT(u2.timestamp, '%%Y-%%m-%%d %%H:00:00') = DATE_FORMAT(u.timestamp, '%%Y-%%m-%%d %%H:00:00')
-                     ORDER BY u2.timestamp DESC LIMIT 1) as umidade_ultima,
-                    COUNT(*) as registros_contagem,
-                    NOW() as created_at,
-                    NOW() as updated_at
-                FROM umidades u
-                WHERE agregado = 0
-                GROUP BY id_cliente, id_equipamento, DATE_FORMAT(timestamp, '%%Y-%%m-%%d %%H:00:00')
-                ON DUPLICATE KEY UPDATE
-                    umidade_media = VALUES(umidade_media),
-                    umidade_max = VALUES(umidade_max),
-                    umidade_min = VALUES(umidade_min),
-                    umidade_ultima = VALUES(umidade_ultima),
-                    updated_at = NOW()
-            """)
-            
-            cursor.execute("UPDATE umidades SET agregado = 1 WHERE agregado = 0")
+    def relatar(self, fonte, contagens, duracao):
+        atrasadas, processados = contagens
+        detalhe = f', {atrasadas} atrasadas' if atrasadas else ''
+        self.stdout.write(f'{fonte.tabela}: {processados} leituras agregadas{detalhe} ({duracao:.2f}s)')
 
-    def agregar_grandezas_eletricas_mysql(self, intervalo):
-        """Agrega dados de grandezas elétricas usando SQL MySQL"""
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                INSERT INTO dados_agregados (
-                    id_cliente, id_equipamento, periodo_inicio, periodo_fim,
-                    tensao_r_media, tensao_r_max, tensao_r_min, tensao_r_ultima,
-                    tensao_s_media, tensao_s_max, tensao_s_min, tensao_s_ultima,
-                    tensao_t_media, tensao_t_max, tensao_t_min, tensao_t_ultima,
-                    corrente_r_media, corrente_r_max, corrente_r_min, corrente_r_ultima,
-                    corrente_s_media, corrente_s_max, corrente_s_min, corrente_s_ultima,
-                    corrente_t_media, corrente_t_max, corrente_t_min, corrente_t_ultima,
-                    potencia_ativa_media, potencia_ativa_max, potencia_ativa_min, potencia_ativa_ultima,
-                    potencia_reativa_media, potencia_reativa_max, potencia_reativa_min, potencia_reativa_ultima,
-                    fator_potencia_media, fator_potencia_max, fator_potencia_min, fator_potencia_ultima,
-                    registros_contagem, created_at, updated_at
-                )
-                SELECT 
-                    id_cliente,
-                    id_equipamento,
-                    DATE_FORMAT(timestamp, '%%Y-%%m-%%d %%H:00:00') as periodo_inicio,
-                    DATE_FORMAT(timestamp + INTERVAL 1 HOUR, '%%Y-%%m-%%d %%H:00:00') as periodo_fim,
-                    AVG(tensao_r), MAX(tensao_r), MIN(tensao_r),
-                    (SELECT tensao_r FROM grandezas_eletricas ge2 WHERE ge2.id_cliente = ge.id_cliente AND ge2.id_equipamento = ge.id_equipamento AND DATE_FORMAT(ge2.timestamp, '%%Y-%%m-%%d %%H:00:00') = DATE_FORMAT(ge.timestamp, '%%Y-%%m-%%d %%H:00:00') ORDER BY ge2.timestamp DESC LIMIT 1),
-                    AVG(tensao_s), MAX(tensao_s), MIN(tensao_s),
-                    (SELECT tensao_s FROM grandezas_eletricas ge2 WHERE ge2.id_cliente = ge.id_cliente AND ge2.id_equipamento = ge.id_equipamento AND DATE_FORMAT(ge2.timestamp, '%%Y-%%m-%%d %%H:00:00') = DATE_FORMAT(ge.timestamp, '%%Y-%%m-%%d %%H:00:00') ORDER BY ge2.timestamp DESC LIMIT 1),
-                    AVG(tensao_t), MAX(tensao_t), MIN(tensao_t),
-                    (SELECT tensao_t FROM grandezas_eletricas ge2 WHERE ge2.id_cliente = ge.id_cliente AND ge2.id_equipamento = ge.id_equipamento AND DATE_FORMAT(ge2.timestamp, '%%Y-%%m-%%d %%H:00:00') = DATE_FORMAT(ge.timestamp, '%%Y-%%m-%%d %%H:00:00') ORDER BY ge2.timestamp DESC LIMIT 1),
-                    AVG(corrente_r), MAX(corrente_r), MIN(corrente_r),
-                    (SELECT corrente_r FROM grandezas_eletricas ge2 WHERE ge2.id_cliente = ge.id_cliente AND ge2.id_equipamento = ge.id_equipamento AND DATE_FORMAT(ge2.timestamp, '%%Y-%%m-%%d %%H:00:00') = DATE_FORMAT(ge.timestamp, '%%Y-%%m-%%d %%H:00:00') ORDER BY ge2.timestamp DESC LIMIT 1),
-                    AVG(corrente_s), MAX(corrente_s), MIN(corrente_s),
-                    (SELECT corrente_s FROM grandezas_eletricas ge2 WHERE ge2.id_cliente = ge.id_cliente AND ge2.id_equipamento = ge.id_equipamento AND DATE_FORMAT(ge2.timestamp, '%%Y-%%m-%%d %%H:00:00') = DATE_FORMAT(ge.timestamp, '%%Y-%%m-%%d %%H:00:00') ORDER BY ge2.timestamp DESC LIMIT 1),
-                    AVG(corrente_t), MAX(corrente_t), MIN(corrente_t),
-                    (SELECT corrente_t FROM grandezas_eletricas ge2 WHERE ge2.id_cliente = ge.id_cliente AND ge2.id_equipamento = ge.id_equipamento AND DATE_FORMAT(ge2.timestamp, '%%Y-%%m-%%d %%H:00:00') = DATE_FORMAT(ge.timestamp, '%%Y-%%m-%%d %%H:00:00') ORDER BY ge2.timestamp DESC LIMIT 1),
-                    AVG(potencia_ativa), MAX(potencia_ativa), MIN(potencia_ativa),
-                    (SELECT potencia_ativa FROM grandezas_eletricas ge2 WHERE ge2.id_cliente = ge.id_cliente AND ge2.id_equipamento = ge.id_equipamento AND DATE_FORMAT(ge2.timestamp, '%%Y-%%m-%%d %%H:00:00') = DATE_FORMAT(ge.timestamp, '%%Y-%%m-%%d %%H:00:00') ORDER BY ge2.timestamp DESC LIMIT 1),
-                    AVG(potencia_reativa), MAX(potencia_reativa), MIN(potencia_reativa),
-                    (SELECT potencia_reativa FROM grandezas_eletricas ge2 WHERE ge2.id_cliente = ge.id_cliente AND ge2.id_equipamento = ge.id_equipamento AND DATE_FORMAT(ge2.timestamp, '%%Y-%%m-%%d %%H:00:00') = DATE_FORMAT(ge.timestamp, '%%Y-%%m-%%d %%H:00:00') ORDER BY ge2.timestamp DESC LIMIT 1),
-                    AVG(fator_potencia), MAX(fator_potencia), MIN(fator_potencia),
-                    (SELECT fator_potencia FROM grandezas_eletricas ge2 WHERE ge2.id_cliente = ge.id_cliente AND ge2.id_equipamento = ge.id_equipamento AND DATE_FORMAT(ge2.timestamp, '%%Y-%%m-%%d %%H:00:00') = DATE_FORMAT(ge.timestamp, '%%Y-%%m-%%d %%H:00:00') ORDER BY ge2.timestamp DESC LIMIT 1),
-                    COUNT(*) as registros_contagem,
-                    NOW() as created_at,
-                    NOW() as updated_at
-                FROM grandezas_eletricas ge
-                WHERE agregado = 0
-                GROUP BY id_cliente, id_equipamento, DATE_FORMAT(timestamp, '%%Y-%%m-%%d %%H:00:00')
-                ON DUPLICATE KEY UPDATE
-                    tensao_r_media = VALUES(tensao_r_media),
-                    tensao_r_max = VALUES(tensao_r_max),
-                    tensao_r_min = VALUES(tensao_r_min),
-                    tensao_r_ultima = VALUES(tensao_r_ultima),
-                    updated_at = NOW()
-            """)
-            
-            cursor.execute("UPDATE grandezas_eletricas SET agregado = 1 WHERE agregado = 0")
+    def cronometrar(self, funcao, *args):
+        inicio = time.perf_counter()
+        resultado = funcao(*args)
+        return resultado, time.perf_counter() - inicio
 
-    # ========== Implementação ORM (compatível com SQLite e MySQL) ==========
-    
-    def _format_periodo(self, timestamp, intervalo):
-        """Formata timestamp para início do período"""
-        if intervalo == timedelta(hours=1):
-            # Arredonda para a hora
-            return timestamp.replace(minute=0, second=0, microsecond=0)
-        elif intervalo == timedelta(days=1):
-            # Arredonda para o dia
-            return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
-        else:  # semana
-            # Arredonda para o início da semana (segunda-feira)
-            days_since_monday = timestamp.weekday()
-            return (timestamp - timedelta(days=days_since_monday)).replace(hour=0, minute=0, second=0, microsecond=0)
-    
-    def agregar_corrente_brunidores_orm(self, intervalo):
-        """Agrega dados de corrente dos brunidores usando Django ORM"""
-        registros = CorrenteBrunidores.objects.filter(agregado=False)
-        
-        # Agrupa por cliente, equipamento e período
-        grupos = {}
-        for registro in registros:
-            periodo_inicio = self._format_periodo(registro.timestamp, intervalo)
-            periodo_fim = periodo_inicio + intervalo
-            chave = (registro.id_cliente, registro.id_equipamento, periodo_inicio)
-            
-            if chave not in grupos:
-                grupos[chave] = []
-            grupos[chave].append(registro)
-        
-        # Processa cada grupo
-        for (id_cliente, id_equipamento, periodo_inicio), grupo_registros in grupos.items():
-            periodo_fim = periodo_inicio + intervalo
-            valores = [r.corrente for r in grupo_registros]
-            
-            # Busca ou cria registro agregado
-            agregado, created = DadosAgregados.objects.get_or_create(
-                id_cliente=id_cliente,
-                id_equipamento=id_equipamento,
-                periodo_inicio=periodo_inicio,
-                defaults={
-                    'periodo_fim': periodo_fim,
-                    'corrente_brunidores_media': sum(valores) / len(valores),
-                    'corrente_brunidores_max': max(valores),
-                    'corrente_brunidores_min': min(valores),
-                    'corrente_brunidores_ultima': grupo_registros[-1].corrente,
-                    'registros_contagem': len(grupo_registros),
-                }
-            )
-            
-            if not created:
-                # Atualiza registro existente
-                agregado.corrente_brunidores_media = sum(valores) / len(valores)
-                agregado.corrente_brunidores_max = max(valores)
-                agregado.corrente_brunidores_min = min(valores)
-                agregado.corrente_brunidores_ultima = grupo_registros[-1].corrente
-                agregado.registros_contagem = len(grupo_registros)
-                agregado.save()
-        
-        # Marca como agregado
-        CorrenteBrunidores.objects.filter(agregado=False).update(agregado=True)
+    # ========== Controle incremental (marca d'água) ==========
 
-    def agregar_corrente_descascadores_orm(self, intervalo):
-        """Agrega dados de corrente dos descascadores usando Django ORM"""
-        registros = CorrenteDescascadores.objects.filter(agregado=False)
-        
-        grupos = {}
-        for registro in registros:
-            periodo_inicio = self._format_periodo(registro.timestamp, intervalo)
-            periodo_fim = periodo_inicio + intervalo
-            chave = (registro.id_cliente, registro.id_equipamento, periodo_inicio)
-            
-            if chave not in grupos:
-                grupos[chave] = []
-            grupos[chave].append(registro)
-        
-        for (id_cliente, id_equipamento, periodo_inicio), grupo_registros in grupos.items():
-            periodo_fim = periodo_inicio + intervalo
-            valores = [r.corrente for r in grupo_registros]
-            
-            agregado, created = DadosAgregados.objects.get_or_create(
-                id_cliente=id_cliente,
-                id_equipamento=id_equipamento,
-                periodo_inicio=periodo_inicio,
-                defaults={
-                    'periodo_fim': periodo_fim,
-                    'corrente_descascadores_media': sum(valores) / len(valores),
-                    'corrente_descascadores_max': max(valores),
-                    'corrente_descascadores_min': min(valores),
-                    'corrente_descascadores_ultima': grupo_registros[-1].corrente,
-                    'registros_contagem': len(grupo_registros),
-                }
-            )
-            
-            if not created:
-                agregado.corrente_descascadores_media = sum(valores) / len(valores)
-                agregado.corrente_descascadores_max = max(valores)
-                agregado.corrente_descascadores_min = min(valores)
-                agregado.corrente_descascadores_ultima = grupo_registros[-1].corrente
-                agregado.save()
-        
-        CorrenteDescascadores.objects.filter(agregado=False).update(agregado=True)
+    def processar_em_lotes(self, tabela, modelo, agregar, lote):
+        """
+        Agrega as leituras posteriores à marca d'água em lotes de ids.
 
-    def agregar_corrente_polidores_orm(self, intervalo):
-        """Agrega dados de corrente dos polidores usando Django ORM"""
-        registros = CorrentePolidores.objects.filter(agregado=False)
-        
-        grupos = {}
-        for registro in registros:
-            periodo_inicio = self._format_periodo(registro.timestamp, intervalo)
-            periodo_fim = periodo_inicio + intervalo
-            chave = (registro.id_cliente, registro.id_equipamento, periodo_inicio)
-            
-            if chave not in grupos:
-                grupos[chave] = []
-            grupos[chave].append(registro)
-        
-        for (id_cliente, id_equipamento, periodo_inicio), grupo_registros in grupos.items():
-            periodo_fim = periodo_inicio + intervalo
-            valores = [r.corrente for r in grupo_registros]
-            
-            agregado, created = DadosAgregados.objects.get_or_create(
-                id_cliente=id_cliente,
-                id_equipamento=id_equipamento,
-                periodo_inicio=periodo_inicio,
-                defaults={
-                    'periodo_fim': periodo_fim,
-                    'corrente_polidores_media': sum(valores) / len(valores),
-                    'corrente_polidores_max': max(valores),
-                    'corrente_polidores_min': min(valores),
-                    'corrente_polidores_ultima': grupo_registros[-1].corrente,
-                    'registros_contagem': len(grupo_registros),
-                }
-            )
-            
-            if not created:
-                agregado.corrente_polidores_media = sum(valores) / len(valores)
-                agregado.corrente_polidores_max = max(valores)
-                agregado.corrente_polidores_min = min(valores)
-                agregado.corrente_polidores_ultima = grupo_registros[-1].corrente
-                agregado.save()
-        
-        CorrentePolidores.objects.filter(agregado=False).update(agregado=True)
+        Cada lote roda em uma transação: agrega o intervalo (id_inicio, id_fim],
+        marca as leituras como agregadas e avança a marca. Leituras inseridas
+        durante a execução ficam para o próximo lote ou execução.
+        """
+        com_repeticao(self._criar_marca, tabela, modelo)
+        processados = 0
+        while True:
+            agregados = com_repeticao(self._processar_lote, tabela, modelo, agregar, lote)
+            if agregados is None:
+                return processados
+            processados += agregados
 
-    def agregar_temperaturas_orm(self, intervalo):
-        """Agrega dados de temperatura usando Django ORM"""
-        registros = Temperatura.objects.filter(agregado=False)
-        
-        grupos = {}
-        for registro in registros:
-            periodo_inicio = self._format_periodo(registro.timestamp, intervalo)
-            periodo_fim = periodo_inicio + intervalo
-            chave = (registro.id_cliente, registro.id_equipamento, periodo_inicio)
+    def varrer_atrasadas(self, fonte, agregar_leituras, varredura):
+        """
+        Agrega as leituras ainda não agregadas entre os últimos ``varredura`` ids abaixo da marca.
+
+        As tabelas brutas são gravadas por processos externos, e ids de
+        auto-incremento podem ficar visíveis fora de ordem: um id menor cujo
+        commit chega depois que a marca já passou dele ficaria com agregado=False
+        para sempre. A janela é relida pela chave primária; as leituras achadas
+        são mescladas aos períodos e marcadas, com a marca travada. Leituras que
+        demorarem mais que a janela para aparecer exigem uma varredura maior
+        (--varredura).
+        """
+        if varredura <= 0:
+            return 0
+        with transaction.atomic():
+            marca = MarcaAgregacao.objects.select_for_update().filter(
+                tabela=fonte.tabela, granularidade='hora'
+            ).first()
+            if marca is None:
+                return 0
+            # Ids fixados antes de agregar: um commit tardio durante a varredura fica para a próxima
+            ids = list(fonte.modelo.objects.filter(
+                id__gt=marca.ultimo_id - varredura, id__lte=marca.ultimo_id, agregado=False
+            ).values_list('id', flat=True))
+            for inicio in range(0, len(ids), 500):
+                atrasadas = fonte.modelo.objects.filter(id__in=ids[inicio:inicio + 500])
+                agregar_leituras(fonte, atrasadas)
+                equipamentos.registrar(atrasadas.values_list('id_cliente', 'id_equipamento').distinct())
+                atrasadas.update(agregado=True)
+        return len(ids)
+
+    def _processar_lote(self, tabela, modelo, agregar, lote):
+        """
+        Agrega o próximo lote em uma transação; None quando não há leituras pendentes.
+
+        Os ids do lote são lidos primeiro, com lock (leitura corrente): no InnoDB
+        ela espera os INSERTs ainda abertos no intervalo e impede novos, e como
+        nenhuma leitura consistente a precede, a agregação enxerga exatamente
+        essas leituras. Só elas são marcadas como agregadas; uma leitura que
+        ainda assim apareça no intervalo depois (fora do InnoDB) fica com
+        agregado=False para varrer_atrasadas.
+        """
+        with transaction.atomic():
+            marca = MarcaAgregacao.objects.select_for_update().get(tabela=tabela, granularidade='hora')
+            id_inicio = marca.ultimo_id
+            ids = list(modelo.objects.select_for_update().filter(
+                id__gt=id_inicio
+            ).order_by('id').values_list('id', flat=True)[:lote])
+            if not ids:
+                return None
+            id_fim = ids[-1]
             
-            if chave not in grupos:
-                grupos[chave] = []
-            grupos[chave].append(registro)
-        
-        for (id_cliente, id_equipamento, periodo_inicio), grupo_registros in grupos.items():
-            periodo_fim = periodo_inicio + intervalo
-            valores = [r.temperatura for r in grupo_registros]
+            agregar(id_inicio, id_fim)
             
-            agregado, created = DadosAgregados.objects.get_or_create(
-                id_cliente=id_cliente,
-                id_equipamento=id_equipamento,
-                periodo_inicio=periodo_inicio,
-                defaults={
-                    'periodo_fim': periodo_fim,
-                    'temperatura_media': sum(valores) / len(valores),
-                    'temperatura_max': max(valores),
-                    'temperatura_min': min(valores),
-                    'temperatura_ultima': grupo_registros[-1].temperatura,
-                    'registros_contagem': len(grupo_registros),
-                }
+            # O intervalo de ids usa a chave primária, sem varrer a coluna agregado
+            lote_ids = modelo.objects.filter(id__gt=id_inicio, id__lte=id_fim)
+            equipamentos.registrar(
+                lote_ids.values_list('id_cliente', 'id_equipamento').distinct()
             )
+            agregados = 0
+            for trecho in _trechos(ids):
+                agregados += modelo.objects.filter(trecho).update(agregado=True)
             
-            if not created:
-                agregado.temperatura_media = sum(valores) / len(valores)
-                agregado.temperatura_max = max(valores)
-                agregado.temperatura_min = min(valores)
-                agregado.temperatura_ultima = grupo_registros[-1].temperatura
-                agregado.save()
-        
-        Temperatura.objects.filter(agregado=False).update(agregado=True)
+            marca.ultimo_id = id_fim
+            marca.save(update_fields=['ultimo_id', 'updated_at'])
+        return agregados
 
-    def agregar_umidades_orm(self, intervalo):
-        """Agrega dados de umidade usando Django ORM"""
-        registros = Umidade.objects.filter(agregado=False)
-        
-        grupos = {}
-        for registro in registros:
-            periodo_inicio = self._format_periodo(registro.timestamp, intervalo)
-            periodo_fim = periodo_inicio + intervalo
-            chave = (registro.id_cliente, registro.id_equipamento, periodo_inicio)
-            
-            if chave not in grupos:
-                grupos[chave] = []
-            grupos[chave].append(registro)
-        
-        for (id_cliente, id_equipamento, periodo_inicio), grupo_registros in grupos.items():
-            periodo_fim = periodo_inicio + intervalo
-            valores = [r.umidade for r in grupo_registros]
-            
-            agregado, created = DadosAgregados.objects.get_or_create(
-                id_cliente=id_cliente,
-                id_equipamento=id_equipamento,
-                periodo_inicio=periodo_inicio,
-                defaults={
-                    'periodo_fim': periodo_fim,
-                    'umidade_media': sum(valores) / len(valores),
-                    'umidade_max': max(valores),
-                    'umidade_min': min(valores),
-                    'umidade_ultima': grupo_registros[-1].umidade,
-                    'registros_contagem': len(grupo_registros),
-                }
+    def consolidar_periodos(self, granularidade):
+        """Consolida os períodos afetados desde a última consolidação e avança a marca"""
+        return self.avancar_marca('agregados_metricas', granularidade, partial(consolidar, granularidade))
+
+    def avancar_marca(self, tabela, etapa, processar):
+        """
+        Executa ``processar(desde, ate)`` sobre as alterações posteriores à marca e a avança.
+
+        ``desde`` recua JANELA_RELEITURA da marca: alterações commitadas depois
+        de a marca ser lida, com updated_at anterior a ela, entram na execução
+        seguinte.
+        """
+        with transaction.atomic():
+            marca, _ = MarcaAgregacao.objects.select_for_update().get_or_create(
+                tabela=tabela, granularidade=etapa
             )
-            
-            if not created:
-                agregado.umidade_media = sum(valores) / len(valores)
-                agregado.umidade_max = max(valores)
-                agregado.umidade_min = min(valores)
-                agregado.umidade_ultima = grupo_registros[-1].umidade
-                agregado.save()
-        
-        Umidade.objects.filter(agregado=False).update(agregado=True)
+            ate = timezone.now()
+            desde = marca.ultimo_timestamp
+            if desde is not None:
+                desde -= JANELA_RELEITURA
+            gravados = processar(desde, ate)
+            marca.ultimo_timestamp = ate
+            marca.save(update_fields=['ultimo_timestamp', 'updated_at'])
+        return gravados
 
-    def agregar_grandezas_eletricas_orm(self, intervalo):
-        """Agrega dados de grandezas elétricas usando Django ORM"""
-        registros = GrandezaEletrica.objects.filter(agregado=False)
-        
-        grupos = {}
-        for registro in registros:
-            periodo_inicio = self._format_periodo(registro.timestamp, intervalo)
-            periodo_fim = periodo_inicio + intervalo
-            chave = (registro.id_cliente, registro.id_equipamento, periodo_inicio)
-            
-            if chave not in grupos:
-                grupos[chave] = []
-            grupos[chave].append(registro)
-        
-        for (id_cliente, id_equipamento, periodo_inicio), grupo_registros in grupos.items():
-            periodo_fim = periodo_inicio + intervalo
+    def _criar_marca(self, tabela, modelo):
+        """
+        Cria a marca d'água da tabela na primeira execução, em transação própria.
+
+        Fora do lote: as leituras daqui fixariam o snapshot da transação antes
+        do lock dos ids do lote.
+        """
+        with transaction.atomic():
+            if MarcaAgregacao.objects.filter(tabela=tabela, granularidade='hora').exists():
+                return
             
-            # Calcula médias, máximos e mínimos
-            campos = ['tensao_r', 'tensao_s', 'tensao_t', 'corrente_r', 'corrente_s', 'corrente_t',
-                     'potencia_ativa', 'potencia_reativa', 'fator_potencia']
+            # Parte da primeira leitura ainda não agregada
+            ultimo_id = modelo.objects.filter(agregado=False).aggregate(primeiro=Min('id'))['primeiro']
+            if ultimo_id is not None:
+                ultimo_id -= 1
+            else:
+                ultimo_id = modelo.objects.aggregate(ultimo=Max('id'))['ultimo'] or 0
             
-            agregado, created = DadosAgregados.objects.get_or_create(
-                id_cliente=id_cliente,
-                id_equipamento=id_equipamento,
-                periodo_inicio=periodo_inicio,
-                defaults={
-                    'periodo_fim': periodo_fim,
-                    'registros_contagem': len(grupo_registros),
-                }
+            MarcaAgregacao.objects.get_or_create(
+                tabela=tabela, granularidade='hora', defaults={'ultimo_id': ultimo_id}
             )
-            
-            # Processa cada campo
-            for campo in campos:
-                valores = [getattr(r, campo) for r in grupo_registros if getattr(r, campo) is not None]
-                if valores:
-                    setattr(agregado, f'{campo}_media', sum(valores) / len(valores))
-                    setattr(agregado, f'{campo}_max', max(valores))
-                    setattr(agregado, f'{campo}_min', min(valores))
-                    setattr(agregado, f'{campo}_ultima', getattr(grupo_registros[-1], campo))
-            
-            agregado.save()
-        
-        GrandezaEletrica.objects.filter(agregado=False).update(agregado=True)
+
+    # ========== Implementação MySQL (SQL otimizado) ==========
+    
+    def agregar_mysql(self, fonte, id_inicio, id_fim):
+        """Agrega uma tabela bruta em uma única passada ordenada usando SQL MySQL"""
+        with connection.cursor() as cursor:
+            cursor.execute(sql_agregacao_mysql(fonte), [id_inicio, id_fim])
+
+    # ========== Implementação ORM (compatível com SQLite e MySQL) ==========
+    
+    def agregar_orm(self, fonte, id_inicio, id_fim):
+        """Agrega uma tabela bruta em streaming usando Django ORM"""
+        agregar_orm(fonte, id_inicio, id_fim)
+
+    # ========== Implementação vetorizada (NumPy, opcional) ==========
+    
+    def agregar_numpy(self, fonte, id_inicio, id_fim):
+        """Agrega uma tabela bruta em blocos de arrays NumPy, com resultado idêntico ao do ORM"""
+        agregar_numpy(fonte, id_inicio, id_fim)
+
+
+def _trechos(ids, por_consulta=500):
+    """
+    Filtros das sequências contíguas de ``ids`` (ordenados), até ``por_consulta`` por filtro.
+
+    Normalmente o lote é um único intervalo pela chave primária; lacunas (ids
+    de transações desfeitas ou ainda abertas) o dividem.
+    """
+    intervalos = []
+    inicio = anterior = ids[0]
+    for id_linha in ids[1:]:
+        if id_linha != anterior + 1:
+            intervalos.append((inicio, anterior))
+            inicio = id_linha
+        anterior = id_linha
+    intervalos.append((inicio, anterior))
+    
+    for i in range(0, len(intervalos), por_consulta):
+        filtro = Q()
+        for inicio, fim in intervalos[i:i + por_consulta]:
+            filtro |= Q(id__gte=inicio, id__lte=fim)
+        yield filtro
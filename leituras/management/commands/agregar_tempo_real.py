@@ -0,0 +1,53 @@
+import time
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Mantém as horas abertas atualizadas em dados_agregados a cada poucos segundos, a partir das leituras novas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=5.0,
+            help='Segundos entre ciclos de agregação'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=2000,
+            help='Quantidade máxima de leituras processadas por transação'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(
+            f'Agregação em tempo real (ciclo a cada {options["intervalo"]:g}s)'
+        ))
+        try:
+            while True:
+                inicio = time.monotonic()
+                close_old_connections()
+                saida = self.stdout if options['verbosity'] > 1 else StringIO()
+                self.ciclo(options['lote'], saida)
+                time.sleep(max(0.0, options['intervalo'] - (time.monotonic() - inicio)))
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('\nAgregação em tempo real encerrada.'))
+
+    def ciclo(self, lote, saida=None):
+        """
+        Agrega as leituras novas e regrava as horas alteradas em dados_agregados.
+
+        É a etapa horária de agregar_leituras: cada leitura é mesclada uma única
+        vez ao acumulado da hora, sob a marca d'água da tabela, e dados_agregados
+        só é gravado pela materialização. O agregador agendado e o reagregar
+        ficam serializados com este processo pelas mesmas marcas. A varredura de
+        leituras atrasadas fica com o agregador agendado.
+        """
+        call_command(
+            'agregar_leituras', periodo='hora', lote=lote, varredura=0, stdout=saida or StringIO()
+        )
@@ -0,0 +1,114 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from leituras.agregacao import FONTES, expressao_periodo, sql_selecao
+
+
+class Command(BaseCommand):
+    help = 'Compara a consulta de agregação antiga (subconsultas correlacionadas) com a de passada única'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tabela',
+            type=str,
+            default='grandezas_eletricas',
+            choices=[fonte.tabela for fonte in FONTES],
+            help='Tabela bruta usada no benchmark'
+        )
+        parser.add_argument(
+            '--tamanhos',
+            type=str,
+            default='1000,5000,20000',
+            help='Quantidades de leituras sintéticas, separadas por vírgula'
+        )
+        parser.add_argument(
+            '--equipamentos',
+            type=int,
+            default=10,
+            help='Quantidade de equipamentos distintos nos dados sintéticos'
+        )
+        parser.add_argument(
+            '--por-hora',
+            type=int,
+            default=60,
+            help='Leituras por equipamento em cada hora'
+        )
+
+    def handle(self, *args, **options):
+        fonte = next(f for f in FONTES if f.tabela == options['tabela'])
+        try:
+            tamanhos = [int(t) for t in options['tamanhos'].split(',')]
+        except ValueError:
+            raise CommandError('--tamanhos deve ser uma lista de inteiros separados por vírgula')
+
+        self.stdout.write(self.style.SUCCESS(f'\n=== Benchmark de agregação: {fonte.tabela} ({connection.vendor}) ===\n'))
+        self.stdout.write(f'{"Leituras":>10} {"Antiga (s)":>12} {"Passada única (s)":>18} {"Ganho":>8}')
+
+        for tamanho in tamanhos:
+            # Os dados sintéticos são descartados ao final de cada medição
+            with transaction.atomic():
+                id_inicio, id_fim = self._inserir_sinteticos(fonte, tamanho, options)
+                antiga = self._medir(self._sql_antiga(fonte), [id_inicio, id_fim])
+                nova = self._medir(sql_selecao(fonte, connection.vendor), [id_inicio, id_fim])
+                transaction.set_rollback(True)
+
+            ganho = antiga / nova if nova else float('inf')
+            self.stdout.write(f'{tamanho:>10,} {antiga:>12.3f} {nova:>18.3f} {ganho:>7.1f}x')
+
+        self.stdout.write(self.style.SUCCESS('\n=== Benchmark concluído! ===\n'))
+
+    def _inserir_sinteticos(self, fonte, tamanho, options):
+        """Insere leituras sintéticas e retorna o intervalo de ids (exclusivo, inclusivo)"""
+        equipamentos = options['equipamentos']
+        passo = timedelta(hours=1) / options['por_hora']
+        inicio = datetime(2024, 1, 1)
+        colunas = ['id_cliente', 'id_equipamento', 'agregado', 'timestamp'] + fonte.colunas
+
+        linhas = []
+        for i in range(tamanho):
+            equipamento = i % equipamentos
+            instante = inicio + passo * (i // equipamentos)
+            valores = [round(random.uniform(0, 500), 2) for _ in fonte.colunas]
+            linhas.append([f'cliente_{equipamento % 3}', f'equipamento_{equipamento}', False, instante] + valores)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT MAX(id) FROM {fonte.tabela}')
+            id_inicio = cursor.fetchone()[0] or 0
+            cursor.executemany(
+                f'INSERT INTO {fonte.tabela} ({", ".join(colunas)}) '
+                f'VALUES ({", ".join(["%s"] * len(colunas))})',
+                linhas
+            )
+            cursor.execute(f'SELECT MAX(id) FROM {fonte.tabela}')
+            id_fim = cursor.fetchone()[0]
+        return id_inicio, id_fim
+
+    def _medir(self, sql, params):
+        with connection.cursor() as cursor:
+            inicio = time.perf_counter()
+            cursor.execute(sql, params)
+            cursor.fetchall()
+            return time.perf_counter() - inicio
+
+    def _sql_antiga(self, fonte):
+        """SELECT equivalente ao usado antes, com uma subconsulta correlacionada por coluna"""
+        periodo = expressao_periodo(connection.vendor)
+        periodo_externo = expressao_periodo(connection.vendor, 't.timestamp')
+        periodo_interno = expressao_periodo(connection.vendor, 't2.timestamp')
+        metricas = ',\n'.join(
+            f'AVG({c}), MAX({c}), MIN({c}), '
+            f'(SELECT {c} FROM {fonte.tabela} t2 '
+            f'WHERE t2.id_cliente = t.id_cliente AND t2.id_equipamento = t.id_equipamento '
+            f'AND {periodo_interno} = {periodo_externo} '
+            f'ORDER BY t2.timestamp DESC LIMIT 1)'
+            for c in fonte.colunas
+        )
+        return f"""
+            SELECT id_cliente, id_equipamento, {periodo}, {metricas}, COUNT(*)
+            FROM {fonte.tabela} t
+            WHERE id > %s AND id <= %s
+            GROUP BY id_cliente, id_equipamento, {periodo}
+        """
@@ -0,0 +1,103 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from leituras.agregacao import METRICAS, colunas_metricas
+from leituras.models import DadosAgregados
+from leituras.views import CAMPOS_LISTAGEM
+from leituras_project.urls import CAMPOS_ULTIMAS
+
+
+class Command(BaseCommand):
+    help = 'Mede o custo por linha de ler dados_agregados: instâncias completas contra a projeção de cada tela'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--linhas',
+            type=int,
+            default=20000,
+            help='Períodos sintéticos semeados (descartados ao final)'
+        )
+        parser.add_argument(
+            '--repeticoes',
+            type=int,
+            default=5,
+            help='Leituras por medição; vale a mais rápida'
+        )
+        parser.add_argument(
+            '--dados-existentes',
+            action='store_true',
+            help='Mede sobre os dados já existentes, sem semear'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f'\n=== Benchmark de leitura de dados_agregados ({connection.vendor}) ===\n'))
+
+        with transaction.atomic():
+            if not options['dados_existentes']:
+                self._semear(options['linhas'])
+            query = DadosAgregados.objects.filter(granularidade='hora')
+            total = query.count()
+            self.stdout.write(f'{total:,} linhas lidas por medição\n')
+
+            telas = [
+                ('Listagem', CAMPOS_LISTAGEM),
+                ('Dashboard', CAMPOS_ULTIMAS),
+                ('Gráfico', ['periodo_fim', 'temperatura_media', 'corrente_brunidores_media']),
+            ]
+            base = self._medir(lambda: list(query.all()), options['repeticoes'])
+            self.stdout.write(f'{"Leitura":<46} {"µs/linha":>10} {"Ganho":>8}')
+            self._linha('Instâncias, todas as colunas (antes)', base, base, total)
+            self._linha('values_list, todas as colunas', self._medir(
+                lambda: list(query.values_list()), options['repeticoes']
+            ), base, total)
+            for tela, campos in telas:
+                self.stdout.write(f'\n{tela} ({len(campos)} colunas)')
+                self._linha('  values_list das colunas (Decimal)', self._medir(
+                    lambda: list(query.values_list(*campos)), options['repeticoes']
+                ), base, total)
+                self._linha('  linhas() (float no SELECT)', self._medir(
+                    lambda: list(query.linhas(*campos)), options['repeticoes']
+                ), base, total)
+                self._linha('  colunas() (float no SELECT)', self._medir(
+                    lambda: query.colunas(*campos), options['repeticoes']
+                ), base, total)
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('\n=== Benchmark concluído! ===\n'))
+
+    def _linha(self, nome, duracao, base, total):
+        por_linha = duracao / total * 1_000_000 if total else 0.0
+        ganho = base / duracao if duracao else float('inf')
+        self.stdout.write(f'{nome:<46} {por_linha:>10.2f} {ganho:>7.1f}x')
+
+    def _medir(self, ler, repeticoes):
+        melhor = float('inf')
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            ler()
+            melhor = min(melhor, time.perf_counter() - inicio)
+        return melhor
+
+    def _semear(self, linhas):
+        """Períodos horários sintéticos com todas as métricas preenchidas, de 10 equipamentos"""
+        agora = timezone.now().replace(minute=0, second=0, microsecond=0)
+        colunas = colunas_metricas(METRICAS)
+        lote = []
+        for i in range(linhas):
+            inicio = agora - timedelta(days=3650, hours=i // 10)
+            periodo = DadosAgregados(
+                id_cliente=f'benchmark_{i % 10 % 3}', id_equipamento=f'benchmark_{i % 10}', granularidade='hora',
+                periodo_inicio=inicio, periodo_fim=inicio + timedelta(hours=1), registros_contagem=60,
+            )
+            for coluna in colunas:
+                setattr(periodo, coluna, 60 if coluna.endswith('_contagem') else round(random.uniform(0, 1), 2))
+            lote.append(periodo)
+            if len(lote) == 2000:
+                DadosAgregados.objects.bulk_create(lote)
+                lote = []
+        if lote:
+            DadosAgregados.objects.bulk_create(lote)
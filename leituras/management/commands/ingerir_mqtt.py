@@ -0,0 +1,212 @@
+import asyncio
+import json
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from leituras.agregacao import FONTES
+from leituras.ingestao import BrokerLocal, Ingestor, PipelineAsync
+
+
+class Command(BaseCommand):
+    help = 'Assina os tópicos MQTT e grava as leituras nas tabelas brutas em lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', type=str, default=settings.MQTT_HOST, help='Endereço do broker MQTT')
+        parser.add_argument('--porta', type=int, default=settings.MQTT_PORT, help='Porta do broker MQTT')
+        parser.add_argument(
+            '--prefixo',
+            type=str,
+            default=settings.MQTT_PREFIXO,
+            help='Prefixo dos tópicos (<prefixo>/<cliente>/<equipamento>/<tabela>)'
+        )
+        parser.add_argument('--lote', type=int, default=5000, help='Leituras acumuladas antes de gravar')
+        parser.add_argument('--intervalo', type=float, default=1.0, help='Segundos máximos entre gravações')
+        parser.add_argument(
+            '--max-pendentes',
+            type=int,
+            default=50000,
+            help='Mensagens em trânsito (por tabela, no modo assíncrono) antes de bloquear a leitura do broker'
+        )
+        parser.add_argument(
+            '--assincrono',
+            action='store_true',
+            help='Pipeline asyncio com uma fila, um escritor e uma conexão MQTT por tabela'
+        )
+        parser.add_argument(
+            '--relatorio',
+            type=float,
+            default=10.0,
+            help='Segundos entre relatórios de filas e latência (modo assíncrono)'
+        )
+        parser.add_argument(
+            '--simular',
+            type=int,
+            default=0,
+            help='Publica N mensagens sintéticas em um broker local (em processo) e mede a vazão'
+        )
+
+    def handle(self, *args, **options):
+        parametros = dict(
+            prefixo=options['prefixo'],
+            tamanho_lote=options['lote'],
+            intervalo=options['intervalo'],
+            max_pendentes=options['max_pendentes'],
+        )
+        if options['assincrono']:
+            self.executar_assincrono(PipelineAsync(**parametros), options)
+            return
+
+        ingestor = Ingestor(**parametros)
+        parar = threading.Event()
+
+        if options['simular']:
+            self.simular(ingestor, parar, options['simular'])
+            return
+
+        cliente = self.conectar(ingestor.receber, options, f'{options["prefixo"]}/#', settings.MQTT_CLIENT_ID)
+        self.stdout.write(self.style.SUCCESS(
+            f'Assinando {options["prefixo"]}/# em {options["host"]}:{options["porta"]}...'
+        ))
+        try:
+            ingestor.executar(parar)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('\nInterrompido, gravando leituras pendentes...'))
+            cliente.loop_stop()
+            cliente.disconnect()
+            parar.set()
+            ingestor.executar(parar)
+        self.exibir_estatisticas(ingestor)
+
+    def conectar(self, receber, options, topico, client_id):
+        try:
+            import paho.mqtt.client as mqtt
+        except ModuleNotFoundError:
+            raise CommandError('paho-mqtt não está instalado (pip install -r requirements.txt)')
+
+        def on_connect(cliente, userdata, flags, rc):
+            if rc != 0:
+                self.stderr.write(self.style.ERROR(f'Falha ao conectar ao broker (código {rc})'))
+                return
+            cliente.subscribe(topico, qos=1)
+
+        def on_message(cliente, userdata, mensagem):
+            receber(mensagem.topic, mensagem.payload)
+
+        cliente = mqtt.Client(client_id=client_id, clean_session=False)
+        if settings.MQTT_USUARIO:
+            cliente.username_pw_set(settings.MQTT_USUARIO, settings.MQTT_SENHA)
+        cliente.on_connect = on_connect
+        cliente.on_message = on_message
+        cliente.connect(options['host'], options['porta'])
+        cliente.loop_start()
+        return cliente
+
+    # ========== Modo assíncrono ==========
+
+    def executar_assincrono(self, pipeline, options):
+        clientes = []
+        produtores = []
+        quantidade = options['simular']
+
+        def ao_iniciar():
+            if quantidade:
+                # Um produtor por tabela, como as conexões MQTT do modo real
+                broker = BrokerLocal()
+                broker.assinar(pipeline.receber)
+                for fonte in FONTES:
+                    produtor = threading.Thread(
+                        target=self._publicar_sinteticos,
+                        args=(broker, pipeline.prefixo, [fonte], quantidade // len(FONTES)),
+                        daemon=True,
+                    )
+                    produtor.start()
+                    produtores.append(produtor)
+                threading.Thread(target=self._encerrar_apos, args=(produtores, pipeline), daemon=True).start()
+                return
+
+            # Uma conexão por tabela: a pressão de uma tabela lenta fica restrita a ela
+            for fonte in FONTES:
+                clientes.append(self.conectar(
+                    pipeline.receber, options,
+                    f'{pipeline.prefixo}/+/+/{fonte.tabela}',
+                    f'{settings.MQTT_CLIENT_ID}-{fonte.tabela}',
+                ))
+            self.stdout.write(self.style.SUCCESS(
+                f'Assinando {pipeline.prefixo}/+/+/<tabela> em {options["host"]}:{options["porta"]} '
+                f'({len(clientes)} conexões)...'
+            ))
+
+        if quantidade:
+            self.stdout.write(self.style.SUCCESS(f'Simulando {quantidade:,} mensagens em broker local (assíncrono)...'))
+        inicio = time.perf_counter()
+        try:
+            asyncio.run(pipeline.executar(ao_iniciar, self.exibir_relatorio, options['relatorio']))
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('\nInterrompido.'))
+        finally:
+            for cliente in clientes:
+                cliente.loop_stop()
+                cliente.disconnect()
+        duracao = time.perf_counter() - inicio
+
+        self.exibir_relatorio(pipeline.profundidades(), pipeline.metricas)
+        if quantidade:
+            self.stdout.write(self.style.SUCCESS(f'Vazão: {quantidade / duracao:,.0f} mensagens/s ({duracao:.2f}s)'))
+
+    def _encerrar_apos(self, produtores, pipeline):
+        for produtor in produtores:
+            produtor.join()
+        pipeline.encerrar()
+
+    def exibir_relatorio(self, profundidades, metricas):
+        self.stdout.write(f'{"Tabela":<24} {"Fila":>8} {"Gravadas":>10} {"Descart.":>9} {"Lotes":>7} '
+                          f'{"Lat. última":>12} {"Lat. média":>11} {"Lat. máx":>9}')
+        for tabela, dados in metricas.items():
+            media = dados['latencia_total'] / dados['lotes'] if dados['lotes'] else 0
+            self.stdout.write(
+                f'{tabela:<24} {profundidades.get(tabela, 0):>8,} {dados["gravadas"]:>10,} '
+                f'{dados["descartadas"]:>9,} {dados["lotes"]:>7,} {dados["latencia_ultima"]:>11.3f}s '
+                f'{media:>10.3f}s {dados["latencia_max"]:>8.3f}s'
+            )
+
+    # ========== Simulação ==========
+
+    def _publicar_sinteticos(self, broker, prefixo, fontes, quantidade):
+        for i in range(quantidade):
+            fonte = fontes[i % len(fontes)]
+            topico = f'{prefixo}/cliente_{i % 3}/equipamento_{i % 20}/{fonte.tabela}'
+            if len(fonte.colunas) == 1:
+                payload = f'{random.uniform(0, 100):.2f}'
+            else:
+                payload = json.dumps({c: round(random.uniform(0, 400), 2) for c in fonte.colunas})
+            broker.publicar(topico, payload.encode())
+
+    def simular(self, ingestor, parar, quantidade):
+        """Mede a vazão da ingestão com mensagens sintéticas publicadas em processo"""
+        broker = BrokerLocal()
+        broker.assinar(ingestor.receber)
+
+        def publicar():
+            self._publicar_sinteticos(broker, ingestor.prefixo, FONTES, quantidade)
+            parar.set()
+
+        self.stdout.write(self.style.SUCCESS(f'Simulando {quantidade:,} mensagens em broker local...'))
+        produtor = threading.Thread(target=publicar, daemon=True)
+        inicio = time.perf_counter()
+        produtor.start()
+        ingestor.executar(parar)
+        duracao = time.perf_counter() - inicio
+
+        self.exibir_estatisticas(ingestor)
+        self.stdout.write(self.style.SUCCESS(f'Vazão: {quantidade / duracao:,.0f} mensagens/s ({duracao:.2f}s)'))
+
+    def exibir_estatisticas(self, ingestor):
+        estatisticas = ingestor.estatisticas
+        self.stdout.write(
+            f'Recebidas: {estatisticas["recebidas"]:,} | Gravadas: {estatisticas["gravadas"]:,} | '
+            f'Descartadas: {estatisticas["descartadas"]:,} | Lotes: {estatisticas["lotes"]:,} | '
+            f'Tempo gravando: {estatisticas["tempo_gravacao"]:.2f}s'
+        )
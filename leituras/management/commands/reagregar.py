@@ -0,0 +1,214 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from leituras import equipamentos
+from leituras.agregacao import FONTES, GRANULARIDADES, INTERVALOS, agregar_leituras_orm, com_repeticao, inicio_periodo
+from leituras.agregacao_vetorizada import agregar_leituras_numpy, numpy_disponivel
+from leituras.reagregacao import fatias, periodos, reagregar_horas, reconsolidar, rematerializar
+from leituras.retencao import inicio_mes
+
+
+class Command(BaseCommand):
+    help = 'Refaz os agregados de um intervalo a partir das leituras brutas (idempotente, em fatias e com pausas)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--desde',
+            type=str,
+            required=True,
+            help='Início do intervalo, horário local (AAAA-MM-DD ou AAAA-MM-DD HH:MM)'
+        )
+        parser.add_argument(
+            '--ate',
+            type=str,
+            required=True,
+            help='Fim do intervalo, horário local; uma data inclui o dia inteiro'
+        )
+        parser.add_argument(
+            '--cliente',
+            type=str,
+            help='Reagrega apenas os equipamentos deste cliente'
+        )
+        parser.add_argument(
+            '--equipamento',
+            type=str,
+            help='Reagrega apenas este equipamento'
+        )
+        parser.add_argument(
+            '--fatia',
+            type=int,
+            default=6,
+            help='Horas de leituras brutas relidas por transação'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Tabelas brutas (e depois equipamentos) processadas em paralelo, cada uma com sua conexão (somente MySQL)'
+        )
+        parser.add_argument(
+            '--pausa',
+            type=float,
+            default=0.5,
+            help='Pausa após cada transação, em múltiplos da duração dela (0 desativa), '
+                 'para dividir o banco com a ingestão'
+        )
+        parser.add_argument(
+            '--backend',
+            type=str,
+            default='orm',
+            choices=['orm', 'numpy'],
+            help='Implementação da releitura das tabelas brutas (numpy requer o pacote numpy)'
+        )
+
+    def handle(self, *args, **options):
+        desde = self.interpretar_data(options['desde'], fim=False)
+        ate = self.interpretar_data(options['ate'], fim=True)
+
+        # Horas inteiras (UTC), como os períodos horários
+        inicio = inicio_periodo(desde.astimezone(dt_timezone.utc), 'hora')
+        fim = inicio_periodo(ate.astimezone(dt_timezone.utc), 'hora')
+        if fim < ate:
+            fim += INTERVALOS['hora']
+
+        # Antes do corte da retenção as leituras brutas já foram apagadas: refazer apagaria os agregados
+        if settings.RETENCAO_LEITURAS_MESES > 0:
+            corte = inicio_mes(timezone.now(), -settings.RETENCAO_LEITURAS_MESES)
+            if fim <= corte:
+                raise CommandError(f'Intervalo anterior à retenção ({corte:%Y-%m-%d}): as leituras brutas já foram apagadas')
+            if inicio < corte:
+                self.stdout.write(self.style.WARNING(
+                    f'Início ajustado para {corte:%Y-%m-%d} (UTC): leituras anteriores já foram apagadas pela retenção'
+                ))
+                inicio = corte
+        if inicio >= fim:
+            raise CommandError('--desde deve ser anterior a --ate')
+
+        pares = [
+            (id_cliente, id_equipamento) for id_cliente, id_equipamento in equipamentos.listar()
+            if options['cliente'] in (None, id_cliente) and options['equipamento'] in (None, id_equipamento)
+        ]
+        if not pares:
+            raise CommandError('Nenhum equipamento registrado corresponde aos filtros')
+
+        if options['backend'] == 'numpy' and not numpy_disponivel():
+            raise CommandError('--backend numpy requer o pacote numpy')
+        agregar = agregar_leituras_numpy if options['backend'] == 'numpy' else agregar_leituras_orm
+
+        workers = options['workers']
+        if workers > 1 and connection.vendor != 'mysql':
+            # O SQLite aceita um único escritor por vez: threads só disputariam o lock
+            self.stdout.write(self.style.WARNING('--workers ignorado: paralelismo requer MySQL'))
+            workers = 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Reagregando {timezone.localtime(inicio):%Y-%m-%d %H:%M} a {timezone.localtime(fim):%Y-%m-%d %H:%M} '
+            f'({len(pares)} equipamento(s))...'
+        ))
+        pausa = options['pausa']
+        fatia = timedelta(hours=options['fatia'])
+        comeco = time.perf_counter()
+
+        # 1. Horas, das tabelas brutas: tabelas em paralelo, cada uma em fatias de tempo
+        for fonte, (lidas, duracao) in self.executar({
+            fonte: (self.reagregar_fonte, fonte, pares, inicio, fim, fatia, agregar, pausa) for fonte in FONTES
+        }, workers):
+            self.stdout.write(f'{fonte.tabela}: {lidas} leituras reagregadas ({duracao:.2f}s)')
+
+        # 2. Dias, semanas e a visão larga, das horas: equipamentos em paralelo
+        metricas = periodos_gravados = 0
+        for _, ((consolidadas, materializados), _) in self.executar({
+            par: (self.reconstruir_equipamento, *par, inicio, fim, pausa) for par in pares
+        }, workers):
+            metricas += consolidadas
+            periodos_gravados += materializados
+        self.stdout.write(f'{"/".join(GRANULARIDADES[1:])}: {metricas} métricas consolidadas')
+        self.stdout.write(f'dados_agregados: {periodos_gravados} períodos regravados')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Reagregação concluída! ({time.perf_counter() - comeco:.2f}s)'
+        ))
+
+    def interpretar_data(self, texto, fim):
+        """Data ou data/hora local; uma data como fim vale até o fim do dia"""
+        data = parse_date(texto)
+        if data is not None:
+            data_hora = datetime.combine(data + timedelta(days=1) if fim else data, dt_time())
+        else:
+            data_hora = parse_datetime(texto)
+            if data_hora is None:
+                raise CommandError(f'Data inválida: {texto} (use AAAA-MM-DD ou AAAA-MM-DD HH:MM)')
+        if timezone.is_naive(data_hora):
+            data_hora = timezone.make_aware(data_hora)
+        return data_hora
+
+    def executar(self, tarefas, workers):
+        """Executa {rótulo: (função, *args)} em sequência ou em ``workers`` threads; gera (rótulo, (resultado, duração))"""
+        if workers <= 1:
+            for rotulo, (funcao, *args) in tarefas.items():
+                yield rotulo, self.cronometrar(funcao, *args)
+            return
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='reagregacao') as executor:
+            futuros = {
+                executor.submit(self._executar_em_thread, funcao, *args): rotulo
+                for rotulo, (funcao, *args) in tarefas.items()
+            }
+            for futuro in as_completed(futuros):
+                yield futuros[futuro], futuro.result()
+
+    def _executar_em_thread(self, funcao, *args):
+        # Cada thread usa a própria conexão do Django, fechada ao terminar
+        try:
+            return self.cronometrar(funcao, *args)
+        finally:
+            connection.close()
+
+    def cronometrar(self, funcao, *args):
+        inicio = time.perf_counter()
+        resultado = funcao(*args)
+        return resultado, time.perf_counter() - inicio
+
+    def com_pausa(self, pausa, funcao, *args):
+        """Executa uma transação (repetida em deadlock) e espera ``pausa`` vezes o que ela durou"""
+        resultado, duracao = self.cronometrar(com_repeticao, funcao, *args)
+        if pausa:
+            time.sleep(duracao * pausa)
+        return resultado
+
+    def reagregar_fonte(self, fonte, pares, inicio, fim, fatia, agregar, pausa):
+        """Refaz as horas de uma tabela bruta, uma transação por fatia e equipamento; retorna as leituras lidas"""
+        lidas = 0
+        for inicio_fatia, fim_fatia in fatias(inicio, fim, fatia):
+            for id_cliente, id_equipamento in pares:
+                lidas += self.com_pausa(
+                    pausa, reagregar_horas, fonte, id_cliente, id_equipamento, inicio_fatia, fim_fatia, agregar
+                )
+        return lidas
+
+    def reconstruir_equipamento(self, id_cliente, id_equipamento, inicio, fim, pausa):
+        """
+        Refaz dias, semanas, dados_agregados e resumos_diarios de um equipamento, um período por transação.
+
+        Dias e semanas só parcialmente no intervalo são refeitos inteiros, das
+        horas de dentro e de fora dele. Retorna (métricas consolidadas, períodos materializados).
+        """
+        consolidadas = materializados = 0
+        for granularidade in GRANULARIDADES[1:]:
+            for periodo in periodos(inicio, fim, granularidade):
+                consolidadas += self.com_pausa(pausa, reconsolidar, granularidade, id_cliente, id_equipamento, periodo)
+
+        # Horas e dias da visão larga dia a dia (com o resumo do dia); semanas inteiras
+        for granularidade, janela in (('hora', 'dia'), ('dia', 'dia'), ('semana', 'semana')):
+            for periodo in periodos(inicio, fim, janela):
+                materializados += self.com_pausa(
+                    pausa, rematerializar, granularidade, id_cliente, id_equipamento,
+                    periodo, periodo + INTERVALOS[janela]
+                )
+        return consolidadas, materializados
@@ -0,0 +1,114 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from leituras.agregacao import FONTES
+from leituras.retencao import (
+    criar_particoes, descartar_particao, excluir_em_lotes, inicio_mes,
+    listar_particoes, particionar, particoes_expiradas, ultimo_id_agregado,
+)
+
+
+class Command(BaseCommand):
+    help = 'Aplica a retenção das tabelas brutas (partições mensais no MySQL, DELETE em lotes nos demais)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--meses',
+            type=int,
+            default=settings.RETENCAO_LEITURAS_MESES,
+            help='Meses completos de leituras brutas mantidos, além do mês corrente (0 desativa a retenção)'
+        )
+        parser.add_argument(
+            '--tabela',
+            type=str,
+            choices=[fonte.tabela for fonte in FONTES],
+            help='Aplica apenas a uma tabela bruta'
+        )
+        parser.add_argument(
+            '--meses-futuros',
+            type=int,
+            default=3,
+            help='MySQL: partições abertas à frente do mês corrente'
+        )
+        parser.add_argument(
+            '--particionar',
+            action='store_true',
+            help='MySQL: converte tabelas ainda não particionadas (reescreve a tabela; usar em manutenção)'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=10000,
+            help='Demais bancos: leituras apagadas por transação'
+        )
+        parser.add_argument(
+            '--simular',
+            action='store_true',
+            help='Apenas informa o que seria feito'
+        )
+
+    def handle(self, *args, **options):
+        fontes = [f for f in FONTES if options['tabela'] in (None, f.tabela)]
+        agora = timezone.now()
+        corte = inicio_mes(agora, -options['meses']) if options['meses'] > 0 else None
+
+        if corte is not None:
+            self.stdout.write(self.style.SUCCESS(f'Retendo leituras a partir de {corte:%Y-%m-%d} (UTC)'))
+        else:
+            self.stdout.write(self.style.WARNING('Retenção desativada (--meses 0)'))
+
+        for fonte in fontes:
+            if connection.vendor == 'mysql':
+                self.manter_particoes(fonte, agora, corte, options)
+            elif corte is not None:
+                self.excluir(fonte, corte, options)
+
+        self.stdout.write(self.style.SUCCESS('Retenção concluída!'))
+
+    # ========== MySQL ==========
+
+    def manter_particoes(self, fonte, agora, corte, options):
+        tabela = fonte.tabela
+        horizonte = inicio_mes(agora, options['meses_futuros'])
+
+        if not listar_particoes(tabela):
+            if not options['particionar']:
+                raise CommandError(
+                    f'{tabela} não é particionada; rode com --particionar em uma janela de manutenção'
+                )
+            if options['simular']:
+                self.stdout.write(f'{tabela}: seria particionada por mês')
+                return
+            quantidade = particionar(tabela, horizonte)
+            self.stdout.write(f'{tabela}: particionada em {quantidade} partições mensais')
+        elif not options['simular']:
+            novas = criar_particoes(tabela, horizonte)
+            if novas:
+                self.stdout.write(f'{tabela}: partições criadas: {", ".join(novas)}')
+
+        if corte is None:
+            return
+        ultimo_id = ultimo_id_agregado(tabela)
+        for particao in particoes_expiradas(tabela, corte):
+            if options['simular']:
+                self.stdout.write(f'{tabela}: {particao} seria descartada (se já agregada)')
+            elif descartar_particao(tabela, particao, ultimo_id):
+                self.stdout.write(f'{tabela}: {particao} descartada')
+            else:
+                self.stdout.write(self.style.WARNING(
+                    f'{tabela}: {particao} mantida, contém leituras ainda não agregadas'
+                ))
+
+    # ========== Demais bancos ==========
+
+    def excluir(self, fonte, corte, options):
+        ultimo_id = ultimo_id_agregado(fonte.tabela)
+        if options['simular']:
+            quantidade = fonte.modelo.objects.filter(
+                id__lte=ultimo_id, timestamp__lt=corte, agregado=True
+            ).count()
+            self.stdout.write(f'{fonte.tabela}: {quantidade} leituras seriam apagadas')
+            return
+        excluidas = excluir_em_lotes(fonte.modelo, corte, ultimo_id, options['lote'])
+        self.stdout.write(f'{fonte.tabela}: {excluidas} leituras apagadas')
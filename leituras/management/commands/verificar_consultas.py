@@ -0,0 +1,230 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from leituras.agregacao import GRANULARIDADES, INTERVALOS, METRICAS, colunas_metricas, inicio_periodo
+from leituras.paginacao import codificar_cursor
+
+
+# Rotas das views (leituras/views.py e leituras_project/urls.py) e as combinações de filtros exercitadas
+ROTAS = [
+    '/leituras/', '/leituras/exportar-leituras/', '/dashboard/',
+    '/api/chart-data/', '/api/chart-summary/', '/api/series/',
+]
+
+
+class Command(BaseCommand):
+    help = 'Executa as views sobre uma base semeada e falha se alguma consulta fizer varredura completa ou filesort'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--linhas',
+            type=int,
+            default=200000,
+            help='Registros sintéticos em dados_agregados (descartados ao final)'
+        )
+        parser.add_argument(
+            '--equipamentos',
+            type=int,
+            default=50,
+            help='Quantidade de equipamentos distintos nos dados sintéticos'
+        )
+        parser.add_argument(
+            '--dados-existentes',
+            action='store_true',
+            help='Não semeia: analisa as consultas sobre os dados atuais (ex.: cópia de produção)'
+        )
+        parser.add_argument(
+            '--exibir-planos',
+            action='store_true',
+            help='Exibe o plano de todas as consultas, não só das reprovadas'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('mysql', 'sqlite'):
+            raise CommandError(f'Backend {connection.vendor} não suportado (use MySQL ou SQLite)')
+
+        self.stdout.write(self.style.SUCCESS(f'\n=== Verificação de planos de consulta ({connection.vendor}) ===\n'))
+
+        # Tudo roda em uma transação desfeita ao final (dados semeados e usuário temporário)
+        with transaction.atomic():
+            if not options['dados_existentes']:
+                self._semear(options['linhas'], options['equipamentos'])
+            consultas = self._capturar_consultas()
+            reprovadas = self._analisar(consultas, options['exibir_planos'])
+            transaction.set_rollback(True)
+
+        if reprovadas:
+            raise CommandError(f'{reprovadas} consulta(s) com varredura completa ou filesort')
+        self.stdout.write(self.style.SUCCESS(f'\n{len(consultas)} consultas verificadas, todas usando índices'))
+
+    # ========== Dados e requisições ==========
+
+    def _semear(self, linhas, equipamentos):
+        """
+        Insere ``linhas`` períodos horários sintéticos para ``equipamentos`` equipamentos.
+
+        Os dias e semanas desse intervalo entram também, como a consolidação os
+        gravaria: com só uma granularidade, as estatísticas do ANALYZE fariam o
+        SQLite varrer a tabela em todo filtro por granularidade.
+        """
+        colunas_metrica = colunas_metricas(METRICAS)
+        colunas = [
+            'id_cliente', 'id_equipamento', 'granularidade', 'periodo_inicio', 'periodo_fim',
+            'registros_contagem', 'created_at', 'updated_at',
+        ] + colunas_metrica
+        sql = (
+            f'INSERT INTO dados_agregados ({", ".join(colunas)}) '
+            f'VALUES ({", ".join(["%s"] * len(colunas))})'
+        )
+        adaptar = connection.ops.adapt_datetimefield_value
+        agora = timezone.now().replace(minute=0, second=0, microsecond=0)
+        horas = -(-linhas // equipamentos)
+
+        # Os planos não dependem dos valores: poucas combinações aleatórias bastam
+        valores = [[round(random.uniform(0, 100), 2) for _ in colunas_metrica] for _ in range(97)]
+
+        semeados = 0
+        with connection.cursor() as cursor:
+            lote = []
+            for granularidade in GRANULARIDADES:
+                intervalo = INTERVALOS[granularidade]
+                periodos = -(-horas * INTERVALOS['hora'] // intervalo)
+                for i in range(periodos * equipamentos if granularidade != 'hora' else linhas):
+                    equipamento = i % equipamentos
+                    inicio = inicio_periodo(agora - intervalo * (periodos - i // equipamentos), granularidade)
+                    lote.append([
+                        f'cliente_{equipamento % 5}', f'equipamento_{equipamento}', granularidade,
+                        adaptar(inicio), adaptar(inicio + intervalo), 60, adaptar(agora), adaptar(agora),
+                    ] + valores[i % len(valores)])
+                    if len(lote) == 5000:
+                        cursor.executemany(sql, lote)
+                        semeados += len(lote)
+                        lote = []
+            if lote:
+                cursor.executemany(sql, lote)
+                semeados += len(lote)
+            if connection.vendor == 'sqlite':
+                cursor.execute('ANALYZE dados_agregados')
+        self.stdout.write(f'{semeados:,} registros semeados')
+
+    def _requisicoes(self):
+        hoje = timezone.localdate()
+        inicio = (hoje - timedelta(days=7)).isoformat()
+        fim = hoje.isoformat()
+        filtros = [
+            {},
+            {'id_cliente': 'cliente_1'},
+            {'id_equipamento': 'equipamento_3'},
+            {'id_cliente': 'cliente_3', 'id_equipamento': 'equipamento_3'},
+            {'data_inicio': inicio, 'data_fim': fim},
+            {'id_cliente': 'cliente_1', 'data_inicio': inicio, 'data_fim': fim},
+            {'granularidade': 'dia'},
+        ]
+        for rota in ROTAS:
+            if rota == '/api/series/':
+                metricas = {'metricas': 'temperatura,umidade_max'}
+                for params in ({}, {'cliente': 'cliente_1'}, {'equipamentos': 'equipamento_3,equipamento_8'},
+                               {'range': '90d', 'pontos': '50'}):
+                    yield rota, {**metricas, **params}
+            elif rota.startswith('/api/'):
+                # A API usa outros nomes de parâmetro
+                for params in ({}, {'cliente': 'cliente_1'}, {'equipamento': 'equipamento_3'}, {'range': '7d'}):
+                    yield rota, params
+            else:
+                for params in filtros:
+                    yield rota, params
+                if rota == '/leituras/':
+                    # Páginas seguintes e anteriores da paginação por chave
+                    cursor = codificar_cursor(timezone.now() - timedelta(days=3), 10 ** 9)
+                    for params in filtros:
+                        yield rota, {**params, 'antes': cursor}
+                        yield rota, {**params, 'depois': cursor}
+
+    def _capturar_consultas(self):
+        """Executa as views e coleta os SELECTs em dados_agregados (sem duplicatas)"""
+        fabrica = RequestFactory()
+        usuario = User.objects.create(username='verificar_consultas', is_staff=True)
+        consultas = {}
+        for rota, params in self._requisicoes():
+            request = fabrica.get(rota, params)
+            request.user = usuario
+            request.session = {}
+            with CaptureQueriesContext(connection) as capturadas:
+                response = resolve(rota).func(request)
+                if response.streaming:
+                    for _ in response.streaming_content:
+                        pass
+            for consulta in capturadas:
+                sql = consulta['sql']
+                if sql.lstrip().upper().startswith('SELECT') and 'dados_agregados' in sql:
+                    consultas.setdefault(sql, f'{rota}?{request.GET.urlencode()}')
+        return consultas
+
+    # ========== Planos ==========
+
+    def _analisar(self, consultas, exibir_planos):
+        reprovadas = 0
+        for sql, origem in consultas.items():
+            plano, problemas = self._explicar(sql)
+            if problemas:
+                reprovadas += 1
+                self.stdout.write(self.style.ERROR(f'\n[FALHA] {origem}: {", ".join(problemas)}'))
+            elif not exibir_planos:
+                continue
+            else:
+                self.stdout.write(self.style.SUCCESS(f'\n[OK] {origem}'))
+            self.stdout.write(f'  {self._resumir(sql)}')
+            for linha in plano:
+                self.stdout.write(f'    {linha}')
+        return reprovadas
+
+    def _resumir(self, sql):
+        """Omite a lista de colunas do SELECT, que não influencia o plano"""
+        inicio = sql.find(' FROM ')
+        if inicio == -1:
+            return sql
+        return f'SELECT ... {sql[inicio + 1:]}'
+
+    def _explicar(self, sql):
+        """
+        Plano da consulta e a lista de problemas encontrados nele.
+
+        Percorrer um índice inteiro só é aceito com ORDER BY ... LIMIT, em que a
+        leitura para nas primeiras entradas na ordem do índice.
+        """
+        problemas = []
+        limitada = ' ORDER BY ' in sql and ' LIMIT ' in sql
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plano = [linha[-1] for linha in cursor.fetchall()]
+                for detalhe in plano:
+                    # SEARCH restringe o índice (col=? ou intervalo); SCAN percorre a tabela ou o índice inteiro
+                    if detalhe.startswith('SCAN dados_agregados'):
+                        if 'INDEX' not in detalhe:
+                            problemas.append('varredura completa')
+                        elif not limitada:
+                            problemas.append('varredura completa do índice')
+                    if 'TEMP B-TREE' in detalhe:
+                        problemas.append('ordenação em memória (filesort)')
+            else:
+                cursor.execute(f'EXPLAIN {sql}')
+                nomes = [coluna[0] for coluna in cursor.description]
+                plano = [dict(zip(nomes, linha)) for linha in cursor.fetchall()]
+                for linha in plano:
+                    if linha.get('table') != 'dados_agregados':
+                        continue
+                    if linha.get('type') == 'ALL':
+                        problemas.append('varredura completa')
+                    elif linha.get('type') == 'index' and not limitada:
+                        problemas.append('varredura completa do índice')
+                    if 'filesort' in (linha.get('Extra') or ''):
+                        problemas.append('filesort')
+        return plano, problemas
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leituras', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarcaAgregacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tabela', models.CharField(max_length=64)),
+                ('granularidade', models.CharField(max_length=16)),
+                ('ultimo_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'marcas_agregacao',
+                'unique_together': {('tabela', 'granularidade')},
+            },
+        ),
+    ]
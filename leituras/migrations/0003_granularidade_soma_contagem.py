@@ -0,0 +1,171 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leituras', '0002_marcas_agregacao'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='dadosagregados',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='dadosagregados',
+            name='corrente_brunidores_contagem',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dadosagregados',
+            name='corrente_brunidores_soma',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='dadosagregados',
+            name='corrente_descascadores_contagem',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dadosagregados',
+            name='corrente_descascadores_soma',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='dadosagregados',
+            name='corrente_polidores_contagem',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dadosagregados',
+            name='corrente_polidores_soma',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='dadosagregados',
+            name='corrente_r_contagem',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dadosagregados',
+            name='corrente_r_soma',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='dadosagregados',
+            name='corrente_s_contagem',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dadosagregados',
+            name='corrente_s_soma',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='dadosagregados',
+            name='corrente_t_contagem',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dadosagregados',
+            name='corrente_t_soma',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='dadosagregados',
+            name='fator_potencia_contagem',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dadosagregados',
+            name='fator_potencia_soma',
+            field=models.DecimalField(blank=True, decimal_places=4, max_digits=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='dadosagregados',
+            name='granularidade',
+            field=models.CharField(choices=[('hora', 'Hora'), ('dia', 'Dia'), ('semana', 'Semana')], default='hora', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='dadosagregados',
+            name='potencia_ativa_contagem',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dadosagregados',
+            name='potencia_ativa_soma',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='dadosagregados',
+            name='potencia_reativa_contagem',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dadosagregados',
+            name='potencia_reativa_soma',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='dadosagregados',
+            name='temperatura_contagem',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dadosagregados',
+            name='temperatura_soma',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='dadosagregados',
+            name='tensao_r_contagem',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dadosagregados',
+            name='tensao_r_soma',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='dadosagregados',
+            name='tensao_s_contagem',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dadosagregados',
+            name='tensao_s_soma',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='dadosagregados',
+            name='tensao_t_contagem',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dadosagregados',
+            name='tensao_t_soma',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='dadosagregados',
+            name='umidade_contagem',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dadosagregados',
+            name='umidade_soma',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='marcaagregacao',
+            name='ultimo_timestamp',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dadosagregados',
+            unique_together={('id_cliente', 'id_equipamento', 'granularidade', 'periodo_inicio')},
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:12
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def preencher_equipamentos(apps, schema_editor):
+    """Carga inicial do registro a partir dos dados já agregados"""
+    DadosAgregados = apps.get_model('leituras', 'DadosAgregados')
+    Equipamento = apps.get_model('leituras', 'Equipamento')
+    agora = timezone.now()
+    pares = DadosAgregados.objects.values_list('id_cliente', 'id_equipamento').distinct()
+    Equipamento.objects.bulk_create(
+        [Equipamento(id_cliente=c, id_equipamento=e, created_at=agora) for c, e in pares.iterator()],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leituras', '0003_granularidade_soma_contagem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Equipamento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('id_cliente', models.CharField(max_length=255)),
+                ('id_equipamento', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'equipamentos',
+                'unique_together': {('id_cliente', 'id_equipamento')},
+            },
+        ),
+        migrations.RunPython(preencher_equipamentos, migrations.RunPython.noop),
+    ]
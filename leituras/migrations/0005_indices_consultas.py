@@ -0,0 +1,53 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leituras', '0004_equipamentos'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='dadosagregados',
+            name='dados_agreg_id_clie_f0bb4a_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='dadosagregados',
+            name='dados_agreg_id_equi_675f37_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='dadosagregados',
+            name='dados_agreg_periodo_8f2abc_idx',
+        ),
+        migrations.AddIndex(
+            model_name='dadosagregados',
+            index=models.Index(fields=['granularidade', 'periodo_inicio'], name='dados_agreg_granula_54ad80_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dadosagregados',
+            index=models.Index(fields=['granularidade', 'periodo_fim'], name='dados_agreg_granula_e4cac4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dadosagregados',
+            index=models.Index(fields=['id_cliente', 'granularidade', 'periodo_inicio'], name='dados_agreg_id_clie_db761b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dadosagregados',
+            index=models.Index(fields=['id_cliente', 'granularidade', 'periodo_fim'], name='dados_agreg_id_clie_fcf8cc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dadosagregados',
+            index=models.Index(fields=['id_equipamento', 'granularidade', 'periodo_inicio'], name='dados_agreg_id_equi_e1c1e0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dadosagregados',
+            index=models.Index(fields=['id_equipamento', 'granularidade', 'periodo_fim'], name='dados_agreg_id_equi_2b7b1e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dadosagregados',
+            index=models.Index(fields=['updated_at'], name='dados_agreg_updated_7e7c02_idx'),
+        ),
+    ]
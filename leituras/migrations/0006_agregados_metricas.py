@@ -0,0 +1,89 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:19
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+METRICAS = [
+    'corrente_brunidores', 'corrente_descascadores', 'corrente_polidores', 'temperatura', 'umidade',
+    'tensao_r', 'tensao_s', 'tensao_t', 'corrente_r', 'corrente_s', 'corrente_t',
+    'potencia_ativa', 'potencia_reativa', 'fator_potencia',
+]
+
+
+def preencher_metricas(apps, schema_editor):
+    """
+    Desdobra dados_agregados em agregados_metricas.
+
+    Períodos anteriores às colunas soma/contagem usam registros_contagem e a média.
+    A visão larga já está atualizada, então a marca da materialização parte de agora;
+    as consolidações passam a ler agregados_metricas e recomeçam do zero.
+    """
+    DadosAgregados = apps.get_model('leituras', 'DadosAgregados')
+    AgregadoMetrica = apps.get_model('leituras', 'AgregadoMetrica')
+    MarcaAgregacao = apps.get_model('leituras', 'MarcaAgregacao')
+
+    campos = ['id_cliente', 'id_equipamento', 'granularidade', 'periodo_inicio', 'registros_contagem']
+    for metrica in METRICAS:
+        campos += [f'{metrica}_{sufixo}' for sufixo in ('media', 'max', 'min', 'ultima', 'soma', 'contagem')]
+
+    pendentes = []
+    for linha in DadosAgregados.objects.values_list(*campos).iterator(chunk_size=2000):
+        id_cliente, id_equipamento, granularidade, periodo_inicio, registros = linha[:5]
+        for i, metrica in enumerate(METRICAS):
+            media, maximo, minimo, ultima, soma, contagem = linha[5 + i * 6:11 + i * 6]
+            if media is None:
+                continue
+            if contagem is None:
+                contagem = registros
+                soma = media * Decimal(contagem)
+            pendentes.append(AgregadoMetrica(
+                id_cliente=id_cliente, id_equipamento=id_equipamento, metrica=metrica,
+                granularidade=granularidade, periodo_inicio=periodo_inicio,
+                contagem=contagem, soma=soma, minimo=minimo, maximo=maximo, ultima=ultima,
+            ))
+        if len(pendentes) >= 2000:
+            AgregadoMetrica.objects.bulk_create(pendentes)
+            pendentes = []
+    if pendentes:
+        AgregadoMetrica.objects.bulk_create(pendentes)
+
+    MarcaAgregacao.objects.filter(tabela='dados_agregados').delete()
+    MarcaAgregacao.objects.create(
+        tabela='dados_agregados', granularidade='materializacao', ultimo_timestamp=timezone.now()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leituras', '0005_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgregadoMetrica',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('id_cliente', models.CharField(max_length=255)),
+                ('id_equipamento', models.CharField(max_length=255)),
+                ('metrica', models.CharField(max_length=32)),
+                ('granularidade', models.CharField(choices=[('hora', 'Hora'), ('dia', 'Dia'), ('semana', 'Semana')], max_length=10)),
+                ('periodo_inicio', models.DateTimeField()),
+                ('contagem', models.IntegerField()),
+                ('soma', models.DecimalField(decimal_places=4, max_digits=20)),
+                ('minimo', models.DecimalField(decimal_places=4, max_digits=10)),
+                ('maximo', models.DecimalField(decimal_places=4, max_digits=10)),
+                ('ultima', models.DecimalField(blank=True, decimal_places=4, max_digits=10, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'agregados_metricas',
+                'indexes': [models.Index(fields=['id_equipamento', 'metrica', 'granularidade', 'periodo_inicio'], name='agregados_m_id_equi_8ca49b_idx'), models.Index(fields=['updated_at'], name='agregados_m_updated_e60baa_idx')],
+                'unique_together': {('id_cliente', 'id_equipamento', 'granularidade', 'periodo_inicio', 'metrica')},
+            },
+        ),
+        migrations.RunPython(preencher_metricas, migrations.RunPython.noop),
+    ]
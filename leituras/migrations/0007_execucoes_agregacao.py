@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leituras', '0006_agregados_metricas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExecucaoAgregacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('executando', 'Executando'), ('concluida', 'Concluída'), ('falhou', 'Falhou')], default='pendente', max_length=16)),
+                ('origem', models.CharField(choices=[('manual', 'Manual'), ('agendada', 'Agendada')], default='manual', max_length=16)),
+                ('periodo', models.CharField(choices=[('hora', 'Hora'), ('dia', 'Dia'), ('semana', 'Semana')], default='hora', max_length=10)),
+                ('solicitacoes', models.IntegerField(default=1)),
+                ('progresso', models.CharField(blank=True, default='', max_length=255)),
+                ('erro', models.TextField(blank=True, default='')),
+                ('solicitada_em', models.DateTimeField(auto_now_add=True)),
+                ('iniciada_em', models.DateTimeField(blank=True, null=True)),
+                ('concluida_em', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'execucoes_agregacao',
+                'indexes': [models.Index(fields=['status', 'id'], name='execucoes_a_status_636c32_idx'), models.Index(fields=['concluida_em'], name='execucoes_a_conclui_28cda9_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:36
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+METRICAS = ['temperatura', 'corrente_brunidores']
+
+
+def preencher_resumos(apps, schema_editor):
+    """
+    Resume por equipamento e dia (fuso local) as horas já em dados_agregados.
+
+    Lê as horas na ordem do índice único, então cada dia termina quando a chave
+    muda. Horas anteriores às colunas soma/contagem usam registros_contagem e a média.
+    """
+    DadosAgregados = apps.get_model('leituras', 'DadosAgregados')
+    ResumoDiario = apps.get_model('leituras', 'ResumoDiario')
+
+    campos = ['id_cliente', 'id_equipamento', 'periodo_inicio', 'periodo_fim', 'registros_contagem']
+    for metrica in METRICAS:
+        campos += [f'{metrica}_{sufixo}' for sufixo in ('media', 'soma', 'contagem', 'max')]
+
+    pendentes = []
+    chave = None
+    resumo = None
+    linhas = DadosAgregados.objects.filter(granularidade='hora').order_by(
+        'id_cliente', 'id_equipamento', 'periodo_inicio'
+    ).values_list(*campos).iterator(chunk_size=2000)
+    for id_cliente, id_equipamento, periodo_inicio, periodo_fim, registros, *valores in linhas:
+        dia = timezone.localtime(periodo_inicio).replace(hour=0, minute=0, second=0, microsecond=0)
+        if (id_cliente, id_equipamento, dia) != chave:
+            if resumo is not None:
+                pendentes.append(ResumoDiario(**resumo))
+            chave = (id_cliente, id_equipamento, dia)
+            resumo = {'id_cliente': id_cliente, 'id_equipamento': id_equipamento, 'dia': dia, 'periodos': 0}
+        resumo['periodos'] += 1
+        resumo['ultimo_periodo_fim'] = periodo_fim
+        for i, metrica in enumerate(METRICAS):
+            media, soma, contagem, maximo = valores[i * 4:i * 4 + 4]
+            if media is None:
+                continue
+            if contagem is None:
+                contagem = registros
+                soma = media * contagem
+            resumo[f'{metrica}_soma'] = (resumo.get(f'{metrica}_soma') or 0) + soma
+            resumo[f'{metrica}_contagem'] = (resumo.get(f'{metrica}_contagem') or 0) + contagem
+            if resumo.get(f'{metrica}_max') is None or maximo > resumo[f'{metrica}_max']:
+                resumo[f'{metrica}_max'] = maximo
+        if len(pendentes) >= 2000:
+            ResumoDiario.objects.bulk_create(pendentes)
+            pendentes = []
+    if resumo is not None:
+        pendentes.append(ResumoDiario(**resumo))
+    if pendentes:
+        ResumoDiario.objects.bulk_create(pendentes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leituras', '0007_execucoes_agregacao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('id_cliente', models.CharField(max_length=255)),
+                ('id_equipamento', models.CharField(max_length=255)),
+                ('dia', models.DateTimeField()),
+                ('periodos', models.IntegerField()),
+                ('ultimo_periodo_fim', models.DateTimeField()),
+                ('temperatura_soma', models.DecimalField(blank=True, decimal_places=2, max_digits=20, null=True)),
+                ('temperatura_contagem', models.IntegerField(blank=True, null=True)),
+                ('temperatura_max', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('corrente_brunidores_soma', models.DecimalField(blank=True, decimal_places=2, max_digits=20, null=True)),
+                ('corrente_brunidores_contagem', models.IntegerField(blank=True, null=True)),
+                ('corrente_brunidores_max', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'resumos_diarios',
+                'indexes': [models.Index(fields=['dia'], name='resumos_dia_dia_7ae6b5_idx'), models.Index(fields=['id_cliente', 'dia'], name='resumos_dia_id_clie_11ae5e_idx'), models.Index(fields=['id_equipamento', 'dia'], name='resumos_dia_id_equi_c18e41_idx')],
+                'unique_together': {('id_cliente', 'id_equipamento', 'dia')},
+            },
+        ),
+        migrations.RunPython(preencher_resumos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leituras', '0008_resumos_diarios'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agregadometrica',
+            name='ultimo_timestamp',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
 
+from .consultas import DadosAgregadosQuerySet
+
 
 class CorrenteBrunidores(models.Model):
     id_cliente = models.CharField(max_length=255)
@@ -94,104 +96,276 @@ class GrandezaEletrica(models.Model):
 
 
 class DadosAgregados(models.Model):
+    """
+    Visão larga dos períodos agregados, uma linha por equipamento e período.
+
+    Não é gravada pela agregação: é materializada a partir de AgregadoMetrica
+    (uma vez por período alterado) para as telas, a API e a exportação.
+    """
+    GRANULARIDADES = [
+        ('hora', 'Hora'),
+        ('dia', 'Dia'),
+        ('semana', 'Semana'),
+    ]
+
     id_cliente = models.CharField(max_length=255)
     id_equipamento = models.CharField(max_length=255)
+    granularidade = models.CharField(max_length=10, choices=GRANULARIDADES, default='hora')
     periodo_inicio = models.DateTimeField()
     periodo_fim = models.DateTimeField()
 
+    # Além de média/máximo/mínimo/última, cada métrica guarda soma e contagem,
+    # para que dia e semana sejam consolidados das horas com médias exatas
+
     # Corrente Brunidores
     corrente_brunidores_media = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     corrente_brunidores_max = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     corrente_brunidores_min = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     corrente_brunidores_ultima = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    corrente_brunidores_soma = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True)
+    corrente_brunidores_contagem = models.IntegerField(null=True, blank=True)
 
     # Corrente Descascadores
     corrente_descascadores_media = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     corrente_descascadores_max = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     corrente_descascadores_min = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     corrente_descascadores_ultima = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    corrente_descascadores_soma = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True)
+    corrente_descascadores_contagem = models.IntegerField(null=True, blank=True)
 
     # Corrente Polidores
     corrente_polidores_media = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     corrente_polidores_max = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     corrente_polidores_min = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     corrente_polidores_ultima = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    corrente_polidores_soma = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True)
+    corrente_polidores_contagem = models.IntegerField(null=True, blank=True)
 
     # Temperaturas
     temperatura_media = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     temperatura_max = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     temperatura_min = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     temperatura_ultima = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    temperatura_soma = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True)
+    temperatura_contagem = models.IntegerField(null=True, blank=True)
 
     # Umidades
     umidade_media = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     umidade_max = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     umidade_min = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     umidade_ultima = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    umidade_soma = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True)
+    umidade_contagem = models.IntegerField(null=True, blank=True)
 
     # Grandezas elétricas - Tensão R
     tensao_r_media = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     tensao_r_max = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     tensao_r_min = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     tensao_r_ultima = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    tensao_r_soma = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True)
+    tensao_r_contagem = models.IntegerField(null=True, blank=True)
 
     # Grandezas elétricas - Tensão S
     tensao_s_media = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     tensao_s_max = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     tensao_s_min = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     tensao_s_ultima = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    tensao_s_soma = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True)
+    tensao_s_contagem = models.IntegerField(null=True, blank=True)
 
     # Grandezas elétricas - Tensão T
     tensao_t_media = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     tensao_t_max = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     tensao_t_min = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     tensao_t_ultima = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    tensao_t_soma = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True)
+    tensao_t_contagem = models.IntegerField(null=True, blank=True)
 
     # Grandezas elétricas - Corrente R
     corrente_r_media = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     corrente_r_max = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     corrente_r_min = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     corrente_r_ultima = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    corrente_r_soma = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True)
+    corrente_r_contagem = models.IntegerField(null=True, blank=True)
 
     # Grandezas elétricas - Corrente S
     corrente_s_media = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     corrente_s_max = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     corrente_s_min = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     corrente_s_ultima = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    corrente_s_soma = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True)
+    corrente_s_contagem = models.IntegerField(null=True, blank=True)
 
     # Grandezas elétricas - Corrente T
     corrente_t_media = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     corrente_t_max = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     corrente_t_min = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     corrente_t_ultima = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    corrente_t_soma = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True)
+    corrente_t_contagem = models.IntegerField(null=True, blank=True)
 
     # Grandezas elétricas - Potência Ativa
     potencia_ativa_media = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     potencia_ativa_max = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     potencia_ativa_min = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     potencia_ativa_ultima = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    potencia_ativa_soma = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True)
+    potencia_ativa_contagem = models.IntegerField(null=True, blank=True)
 
     # Grandezas elétricas - Potência Reativa
     potencia_reativa_media = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     potencia_reativa_max = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     potencia_reativa_min = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     potencia_reativa_ultima = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    potencia_reativa_soma = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True)
+    potencia_reativa_contagem = models.IntegerField(null=True, blank=True)
 
     # Grandezas elétricas - Fator de Potência
     fator_potencia_media = models.DecimalField(max_digits=10, decimal_places=4, null=True, blank=True)
     fator_potencia_max = models.DecimalField(max_digits=10, decimal_places=4, null=True, blank=True)
     fator_potencia_min = models.DecimalField(max_digits=10, decimal_places=4, null=True, blank=True)
     fator_potencia_ultima = models.DecimalField(max_digits=10, decimal_places=4, null=True, blank=True)
+    fator_potencia_soma = models.DecimalField(max_digits=20, decimal_places=4, null=True, blank=True)
+    fator_potencia_contagem = models.IntegerField(null=True, blank=True)
 
     registros_contagem = models.IntegerField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = DadosAgregadosQuerySet.as_manager()
+
     class Meta:
         db_table = 'dados_agregados'
-        unique_together = [['id_cliente', 'id_equipamento', 'periodo_inicio']]
+        unique_together = [['id_cliente', 'id_equipamento', 'granularidade', 'periodo_inicio']]
+        # Índices no formato das consultas das views: igualdade em cliente/equipamento
+        # e granularidade, seguida do campo de ordenação/intervalo (periodo_inicio na
+        # listagem e exportação, periodo_fim no dashboard e na API). Cliente +
+        # equipamento + periodo_inicio já é coberto pelo unique_together.
+        indexes = [
+            models.Index(fields=['granularidade', 'periodo_inicio']),
+            models.Index(fields=['granularidade', 'periodo_fim']),
+            models.Index(fields=['id_cliente', 'granularidade', 'periodo_inicio']),
+            models.Index(fields=['id_cliente', 'granularidade', 'periodo_fim']),
+            models.Index(fields=['id_equipamento', 'granularidade', 'periodo_inicio']),
+            models.Index(fields=['id_equipamento', 'granularidade', 'periodo_fim']),
+            models.Index(fields=['updated_at']),
+        ]
+
+
+class AgregadoMetrica(models.Model):
+    """Acumulado de uma métrica de um equipamento em um período (formato longo)"""
+    id_cliente = models.CharField(max_length=255)
+    id_equipamento = models.CharField(max_length=255)
+    metrica = models.CharField(max_length=32)
+    granularidade = models.CharField(max_length=10, choices=DadosAgregados.GRANULARIDADES)
+    periodo_inicio = models.DateTimeField()
+    contagem = models.IntegerField()
+    soma = models.DecimalField(max_digits=20, decimal_places=4)
+    minimo = models.DecimalField(max_digits=10, decimal_places=4)
+    maximo = models.DecimalField(max_digits=10, decimal_places=4)
+    ultima = models.DecimalField(max_digits=10, decimal_places=4, null=True, blank=True)
+    # Instante da leitura de ``ultima``: ao mesclar lotes, fica a mais recente (nulo em períodos antigos)
+    ultimo_timestamp = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'agregados_metricas'
+        # Equipamento + granularidade + intervalo de períodos lê todas as métricas
+        # juntas (consolidação e materialização); o segundo índice serve as
+        # leituras de poucas métricas (gráficos) e o de updated_at, as marcas d'água
+        unique_together = [['id_cliente', 'id_equipamento', 'granularidade', 'periodo_inicio', 'metrica']]
+        indexes = [
+            models.Index(fields=['id_equipamento', 'metrica', 'granularidade', 'periodo_inicio']),
+            models.Index(fields=['updated_at']),
+        ]
+
+
+class ResumoDiario(models.Model):
+    """
+    Resumo por equipamento e dia (fuso local) das horas em dados_agregados, para os cards do dashboard.
+
+    Guarda soma, contagem e máximo das métricas dos cards, não médias, para que
+    dias e horas avulsas sejam combinados com médias exatas.
+    """
+    id_cliente = models.CharField(max_length=255)
+    id_equipamento = models.CharField(max_length=255)
+    dia = models.DateTimeField()
+    periodos = models.IntegerField()
+    ultimo_periodo_fim = models.DateTimeField()
+
+    temperatura_soma = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True)
+    temperatura_contagem = models.IntegerField(null=True, blank=True)
+    temperatura_max = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+
+    corrente_brunidores_soma = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True)
+    corrente_brunidores_contagem = models.IntegerField(null=True, blank=True)
+    corrente_brunidores_max = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'resumos_diarios'
+        # Os cards filtram por cliente e/ou equipamento (ou nenhum) e intervalo de dias
+        unique_together = [['id_cliente', 'id_equipamento', 'dia']]
+        indexes = [
+            models.Index(fields=['dia']),
+            models.Index(fields=['id_cliente', 'dia']),
+            models.Index(fields=['id_equipamento', 'dia']),
+        ]
+
+
+class MarcaAgregacao(models.Model):
+    """Último id (tabelas brutas) ou updated_at (consolidações, materialização) já processado, por etapa"""
+    tabela = models.CharField(max_length=64)
+    granularidade = models.CharField(max_length=16)
+    ultimo_id = models.BigIntegerField(default=0)
+    ultimo_timestamp = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'marcas_agregacao'
+        unique_together = [['tabela', 'granularidade']]
+
+
+class Equipamento(models.Model):
+    """Registro dos pares (cliente, equipamento) conhecidos, mantido pela ingestão e pela agregação"""
+    id_cliente = models.CharField(max_length=255)
+    id_equipamento = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'equipamentos'
+        unique_together = [['id_cliente', 'id_equipamento']]
+
+
+class ExecucaoAgregacao(models.Model):
+    """Pedido de agregação na fila do agregador (python manage.py agregador)"""
+    STATUS = [
+        ('pendente', 'Pendente'),
+        ('executando', 'Executando'),
+        ('concluida', 'Concluída'),
+        ('falhou', 'Falhou'),
+    ]
+    ORIGENS = [
+        ('manual', 'Manual'),
+        ('agendada', 'Agendada'),
+    ]
+
+    status = models.CharField(max_length=16, choices=STATUS, default='pendente')
+    origem = models.CharField(max_length=16, choices=ORIGENS, default='manual')
+    periodo = models.CharField(max_length=10, choices=DadosAgregados.GRANULARIDADES, default='hora')
+    # Pedidos atendidos por esta execução (o primeiro e os que se juntaram a ela)
+    solicitacoes = models.IntegerField(default=1)
+    progresso = models.CharField(max_length=255, blank=True, default='')
+    erro = models.TextField(blank=True, default='')
+    solicitada_em = models.DateTimeField(auto_now_add=True)
+    iniciada_em = models.DateTimeField(null=True, blank=True)
+    concluida_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'execucoes_agregacao'
         indexes = [
-            models.Index(fields=['id_cliente']),
-            models.Index(fields=['id_equipamento']),
-            models.Index(fields=['periodo_fim']),
+            models.Index(fields=['status', 'id']),
+            models.Index(fields=['concluida_em']),
         ]
@@ -0,0 +1,63 @@
+"""
+Paginação por chave da listagem de dados agregados.
+
+A listagem segue a ordem decrescente de (periodo_inicio, id) e cada página
+continua da chave da última linha exibida (ou volta a partir da primeira), em
+vez de OFFSET: o custo de uma página é ler ``tamanho`` linhas pelo índice de
+periodo_inicio, qualquer que seja o intervalo filtrado ou a página.
+"""
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Q
+
+
+EPOCA = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def codificar_cursor(periodo_inicio, id_linha):
+    """Chave (periodo_inicio, id) de uma linha, como texto para a URL"""
+    return f'{(periodo_inicio - EPOCA) // timedelta(microseconds=1)}_{id_linha}'
+
+
+def decodificar_cursor(cursor):
+    """(periodo_inicio, id) de um cursor; ValueError se inválido"""
+    microssegundos, _, id_linha = cursor.partition('_')
+    return EPOCA + timedelta(microseconds=int(microssegundos)), int(id_linha)
+
+
+def paginar(query, tamanho, antes=None, depois=None):
+    """
+    Página de até ``tamanho`` linhas, da mais nova para a mais antiga.
+
+    As linhas de ``query`` (instâncias ou ``linhas()``) precisam ter periodo_inicio e id.
+
+    ``antes`` (chave decodificada) pede as linhas seguintes à chave, mais antigas;
+    ``depois``, as anteriores, mais novas. Retorna (linhas, cursor da página
+    anterior, cursor da próxima), com None onde não há página.
+    """
+    if depois is not None:
+        periodo_inicio, id_linha = depois
+        linhas = list(query.filter(
+            Q(periodo_inicio__gt=periodo_inicio) | Q(periodo_inicio=periodo_inicio, id__gt=id_linha)
+        ).order_by('periodo_inicio', 'id')[:tamanho + 1])
+        if len(linhas) <= tamanho:
+            # Voltou ao início: a primeira página é sempre a mesma, cheia
+            return paginar(query, tamanho)
+        linhas = linhas[:tamanho][::-1]
+        return linhas, _cursor(linhas[0]), _cursor(linhas[-1])
+
+    if antes is not None:
+        periodo_inicio, id_linha = antes
+        query = query.filter(
+            Q(periodo_inicio__lt=periodo_inicio) | Q(periodo_inicio=periodo_inicio, id__lt=id_linha)
+        )
+    linhas = list(query.order_by('-periodo_inicio', '-id')[:tamanho + 1])
+    proxima = _cursor(linhas[tamanho - 1]) if len(linhas) > tamanho else None
+    linhas = linhas[:tamanho]
+    anterior = _cursor(linhas[0]) if antes is not None and linhas else None
+    return linhas, anterior, proxima
+
+
+def _cursor(linha):
+    return codificar_cursor(linha.periodo_inicio, linha.id)
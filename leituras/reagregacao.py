@@ -0,0 +1,125 @@
+"""
+Reagregação de um intervalo a partir das leituras brutas (manage.py reagregar).
+
+Depois de corrigir um bug, mudar a definição de uma métrica ou receber
+leituras atrasadas já marcadas como agregadas, os períodos de um intervalo
+podem ser refeitos. Cada etapa apaga e regrava os períodos de um equipamento
+numa transação curta, então repetir a reagregação dá o mesmo resultado:
+
+1. horas, de cada tabela bruta, com as leituras até a marca d'água (as
+   posteriores ainda serão incorporadas pela agregação incremental);
+2. dias e semanas, das horas;
+3. dados_agregados e resumos_diarios, de agregados_metricas.
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+
+from .agregacao import (
+    CAMPOS_ACUMULADOS, INTERVALOS, ORIGEM, Acumulador, _dados_agregados, _gravar,
+    _gravar_largos, _metricas, agregar_leituras_orm, inicio_periodo, pivotar, resumir,
+)
+from .models import AgregadoMetrica, DadosAgregados, MarcaAgregacao, ResumoDiario
+
+
+def fatias(inicio, fim, tamanho):
+    """Intervalos [a, b) consecutivos de até ``tamanho`` cobrindo [inicio, fim)"""
+    while inicio < fim:
+        yield inicio, min(inicio + tamanho, fim)
+        inicio += tamanho
+
+
+def periodos(inicio, fim, granularidade):
+    """Inícios dos períodos de ``granularidade`` que intersectam [inicio, fim)"""
+    periodo = inicio_periodo(inicio, granularidade)
+    while periodo < fim:
+        yield periodo
+        periodo = inicio_periodo(periodo + INTERVALOS[granularidade], granularidade)
+
+
+def reagregar_horas(fonte, id_cliente, id_equipamento, inicio, fim, agregar=agregar_leituras_orm):
+    """
+    Refaz as horas [inicio, fim) das métricas de ``fonte`` de um equipamento; retorna as leituras lidas.
+
+    A marca d'água da tabela fica travada durante a transação, então um lote
+    da agregação incremental acontece inteiro antes ou depois da fatia. Só
+    entram leituras já agregadas: as acima da marca, e as abaixo dela ainda
+    não marcadas (gravadas fora de ordem), ficam para a agregação incremental,
+    que as mescla.
+    """
+    with transaction.atomic():
+        marca = MarcaAgregacao.objects.select_for_update().filter(
+            tabela=fonte.tabela, granularidade='hora'
+        ).first()
+        if marca is None:
+            return 0
+        AgregadoMetrica.objects.filter(
+            id_cliente=id_cliente,
+            id_equipamento=id_equipamento,
+            granularidade='hora',
+            metrica__in=fonte.prefixos,
+            periodo_inicio__gte=inicio,
+            periodo_inicio__lt=fim,
+        ).delete()
+        return agregar(fonte, fonte.modelo.objects.filter(
+            id_cliente=id_cliente,
+            id_equipamento=id_equipamento,
+            timestamp__gte=inicio,
+            timestamp__lt=fim,
+            id__lte=marca.ultimo_id,
+            agregado=True,
+        ))
+
+
+def reconsolidar(granularidade, id_cliente, id_equipamento, periodo):
+    """Refaz um período de ``granularidade`` (dia ou semana) de um equipamento, do nível de origem; retorna as métricas gravadas"""
+    metricas = AgregadoMetrica.objects.filter(id_cliente=id_cliente, id_equipamento=id_equipamento)
+    with transaction.atomic():
+        metricas.filter(granularidade=granularidade, periodo_inicio=periodo).delete()
+        acumuladores = defaultdict(Acumulador)
+        for metrica, *parcial in metricas.filter(
+            granularidade=ORIGEM[granularidade],
+            periodo_inicio__gte=periodo,
+            periodo_inicio__lt=periodo + INTERVALOS[granularidade],
+        ).order_by('periodo_inicio').values_list('metrica', *CAMPOS_ACUMULADOS):
+            acumuladores[metrica].combinar(*parcial)
+        novas = _metricas((id_cliente, id_equipamento, periodo), granularidade, acumuladores)
+        if novas:
+            _gravar(novas)
+    return len(novas)
+
+
+def rematerializar(granularidade, id_cliente, id_equipamento, inicio, fim):
+    """
+    Regrava em dados_agregados os períodos [inicio, fim) de um equipamento; retorna os períodos gravados.
+
+    Com ``granularidade`` hora, [inicio, fim) deve ser um dia: o resumo dele em
+    resumos_diarios é refeito junto.
+    """
+    with transaction.atomic():
+        DadosAgregados.objects.filter(
+            id_cliente=id_cliente,
+            id_equipamento=id_equipamento,
+            granularidade=granularidade,
+            periodo_inicio__gte=inicio,
+            periodo_inicio__lt=fim,
+        ).delete()
+        linhas = AgregadoMetrica.objects.filter(
+            id_cliente=id_cliente,
+            id_equipamento=id_equipamento,
+            granularidade=granularidade,
+            periodo_inicio__gte=inicio,
+            periodo_inicio__lt=fim,
+        ).values_list('periodo_inicio', 'metrica', *CAMPOS_ACUMULADOS)
+        agregados = [
+            _dados_agregados((id_cliente, id_equipamento, periodo_inicio), granularidade, metricas)
+            for periodo_inicio, metricas in pivotar(linhas).items()
+        ]
+        if agregados:
+            _gravar_largos(agregados)
+
+        if granularidade == 'hora':
+            ResumoDiario.objects.filter(id_cliente=id_cliente, id_equipamento=id_equipamento, dia=inicio).delete()
+            resumir([(id_cliente, id_equipamento, inicio)])
+    return len(agregados)
@@ -0,0 +1,70 @@
+"""
+Cards do dashboard a partir de resumos_diarios.
+
+Um intervalo de horas é dividido em dias inteiros, lidos de resumos_diarios
+(uma linha por equipamento e dia, numa única agregação), e nas horas das
+pontas que não completam um dia, lidas de dados_agregados. As duas partes são
+combinadas pelas somas e contagens, então as médias são as mesmas do
+intervalo inteiro lido hora a hora, ponderadas pelas leituras de cada hora.
+"""
+
+from functools import reduce
+from operator import or_
+
+from django.db.models import Max, Q, Sum
+
+from .agregacao import CAMPOS_RESUMO, COLUNAS_HORA_RESUMO, INTERVALOS, Resumo, inicio_periodo
+from .models import DadosAgregados, ResumoDiario
+
+
+def resumir_intervalo(inicio=None, fim=None, id_cliente=None, id_equipamento=None):
+    """
+    Resumo das horas com periodo_inicio em [``inicio``, ``fim``) (limites opcionais).
+
+    Usa no máximo duas consultas: os dias inteiros em resumos_diarios e as
+    horas avulsas das pontas em dados_agregados.
+    """
+    filtros = {}
+    if id_cliente:
+        filtros['id_cliente'] = id_cliente
+    if id_equipamento:
+        filtros['id_equipamento'] = id_equipamento
+
+    primeiro_dia = _proximo_dia(inicio) if inicio is not None else None
+    ultimo_dia = inicio_periodo(fim, 'dia') if fim is not None else None
+
+    resumo = Resumo()
+    if primeiro_dia is not None and ultimo_dia is not None and primeiro_dia >= ultimo_dia:
+        # Menos de um dia inteiro: só horas
+        pontas = [Q(periodo_inicio__gte=inicio, periodo_inicio__lt=fim)]
+    else:
+        pontas = []
+        dias = ResumoDiario.objects.filter(**filtros)
+        if primeiro_dia is not None:
+            dias = dias.filter(dia__gte=primeiro_dia)
+            if inicio < primeiro_dia:
+                pontas.append(Q(periodo_inicio__gte=inicio, periodo_inicio__lt=primeiro_dia))
+        if ultimo_dia is not None:
+            dias = dias.filter(dia__lt=ultimo_dia)
+            if ultimo_dia < fim:
+                pontas.append(Q(periodo_inicio__gte=ultimo_dia, periodo_inicio__lt=fim))
+        totais = dias.aggregate(
+            periodos=Sum('periodos'),
+            ultimo_periodo_fim=Max('ultimo_periodo_fim'),
+            **{campo: (Max if campo.endswith('_max') else Sum)(campo) for campo in CAMPOS_RESUMO},
+        )
+        resumo.combinar(
+            totais['periodos'], totais['ultimo_periodo_fim'], *(totais[campo] for campo in CAMPOS_RESUMO)
+        )
+
+    if pontas:
+        horas = DadosAgregados.objects.filter(reduce(or_, pontas), granularidade='hora', **filtros)
+        for valores in horas.values_list(*COLUNAS_HORA_RESUMO).iterator(chunk_size=2000):
+            resumo.adicionar_hora(*valores)
+    return resumo
+
+
+def _proximo_dia(instante):
+    """Início do primeiro dia (fuso local) que começa em ``instante`` ou depois"""
+    dia = inicio_periodo(instante, 'dia')
+    return dia if dia == instante else inicio_periodo(dia + INTERVALOS['dia'], 'dia')
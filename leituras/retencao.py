@@ -0,0 +1,153 @@
+"""
+Retenção das tabelas brutas.
+
+No MySQL as tabelas brutas são particionadas por mês em ``timestamp``
+(RANGE COLUMNS, limites em UTC) e a retenção descarta partições inteiras.
+Nos demais bancos a retenção apaga em lotes de ids. Em ambos os casos só são
+removidas leituras já agregadas, isto é, com id até a marca d'água da tabela
+(MarcaAgregacao, granularidade 'hora'): os períodos em dados_agregados
+(hora/dia/semana) são a versão reduzida que permanece.
+"""
+
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.db.models import Max
+
+from .models import MarcaAgregacao
+
+
+PARTICAO_FUTURA = 'pfuturo'
+
+
+def inicio_mes(data, deslocamento=0):
+    """Primeiro instante (UTC) do mês de ``data`` somado de ``deslocamento`` meses"""
+    indice = data.year * 12 + data.month - 1 + deslocamento
+    return datetime(indice // 12, indice % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def nome_particao(mes):
+    return f'p{mes:%Y%m}'
+
+
+def ultimo_id_agregado(tabela):
+    """Maior id já incorporado a dados_agregados (0 se a tabela nunca foi agregada)"""
+    marca = MarcaAgregacao.objects.filter(tabela=tabela, granularidade='hora').first()
+    return marca.ultimo_id if marca else 0
+
+
+# ========== MySQL: partições mensais ==========
+
+def listar_particoes(tabela):
+    """Partições da tabela em ordem, como (nome, limite superior); vazio se não particionada"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT PARTITION_NAME, PARTITION_DESCRIPTION
+            FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+            ORDER BY PARTITION_ORDINAL_POSITION
+            """,
+            [tabela],
+        )
+        return cursor.fetchall()
+
+
+def _definicoes(meses):
+    definicoes = [
+        f"PARTITION {nome_particao(mes)} VALUES LESS THAN ('{inicio_mes(mes, 1):%Y-%m-%d}')"
+        for mes in meses
+    ]
+    definicoes.append(f'PARTITION {PARTICAO_FUTURA} VALUES LESS THAN (MAXVALUE)')
+    return ', '.join(definicoes)
+
+
+def particionar(tabela, ate):
+    """
+    Converte a tabela para partições mensais, do mês da leitura mais antiga até ``ate``.
+
+    A coluna de particionamento precisa fazer parte de toda chave única, então a
+    chave primária passa a ser (id, timestamp); o id continua auto-incremento.
+    Reescreve a tabela inteira: rodar em janela de manutenção.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT MIN(timestamp) FROM {tabela}')
+        primeira = cursor.fetchone()[0] or ate
+        meses = []
+        mes = inicio_mes(primeira)
+        while mes <= ate:
+            meses.append(mes)
+            mes = inicio_mes(mes, 1)
+        cursor.execute(f'ALTER TABLE {tabela} DROP PRIMARY KEY, ADD PRIMARY KEY (id, timestamp)')
+        cursor.execute(f'ALTER TABLE {tabela} PARTITION BY RANGE COLUMNS(timestamp) ({_definicoes(meses)})')
+    return len(meses)
+
+
+def criar_particoes(tabela, ate):
+    """Abre partições mensais até o mês de ``ate``, dividindo a partição futura (vazia)"""
+    particoes = listar_particoes(tabela)
+    mensais = [nome for nome, _ in particoes if nome != PARTICAO_FUTURA]
+    if not mensais:
+        return []
+    ultimo = datetime.strptime(mensais[-1], 'p%Y%m').replace(tzinfo=dt_timezone.utc)
+    novos = []
+    mes = inicio_mes(ultimo, 1)
+    while mes <= ate:
+        novos.append(mes)
+        mes = inicio_mes(mes, 1)
+    if novos:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'ALTER TABLE {tabela} REORGANIZE PARTITION {PARTICAO_FUTURA} INTO ({_definicoes(novos)})'
+            )
+    return [nome_particao(mes) for mes in novos]
+
+
+def particoes_expiradas(tabela, corte):
+    """Partições mensais cujo limite superior não passa de ``corte``"""
+    expiradas = []
+    for nome, _ in listar_particoes(tabela):
+        if nome == PARTICAO_FUTURA:
+            continue
+        mes = datetime.strptime(nome, 'p%Y%m').replace(tzinfo=dt_timezone.utc)
+        if inicio_mes(mes, 1) <= corte:
+            expiradas.append(nome)
+    return expiradas
+
+
+def descartar_particao(tabela, particao, ultimo_id):
+    """
+    Descarta a partição se todas as suas leituras já foram agregadas.
+
+    Retorna False (sem alterar nada) se houver id acima da marca d'água ou
+    leitura abaixo dela ainda não agregada (gravada fora de ordem).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT MAX(id) FROM {tabela} PARTITION ({particao})')
+        maior = cursor.fetchone()[0]
+        if maior is not None and maior > ultimo_id:
+            return False
+        cursor.execute(f'SELECT 1 FROM {tabela} PARTITION ({particao}) WHERE agregado = 0 LIMIT 1')
+        if cursor.fetchone() is not None:
+            return False
+        cursor.execute(f'ALTER TABLE {tabela} DROP PARTITION {particao}')
+    return True
+
+
+# ========== Demais bancos: DELETE em lotes ==========
+
+def excluir_em_lotes(modelo, corte, ultimo_id, lote):
+    """Apaga leituras anteriores a ``corte`` já agregadas, um lote de ids por transação"""
+    excluidas = 0
+    id_inicio = 0
+    while True:
+        with transaction.atomic():
+            elegiveis = modelo.objects.filter(
+                id__gt=id_inicio, id__lte=ultimo_id, timestamp__lt=corte, agregado=True
+            )
+            fim = list(elegiveis.order_by('id').values_list('id', flat=True)[lote - 1:lote])
+            id_fim = fim[0] if fim else elegiveis.aggregate(ultimo=Max('id'))['ultimo']
+            if id_fim is None:
+                return excluidas
+            excluidas += elegiveis.filter(id__lte=id_fim).delete()[0]
+            id_inicio = id_fim
@@ -0,0 +1,876 @@
+import asyncio
+import csv
+import gzip
+import io
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection
+from django.db.models import Count, Max, Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import equipamentos, execucoes, exportacao, paginacao, resumos
+from .management.commands.agregar_leituras import Command
+from .management.commands.agregar_tempo_real import Command as TempoReal
+from .management.commands.verificar_consultas import Command as VerificarConsultas
+from .agregacao import CAMPOS_ACUMULADOS, CAMPOS_RESUMO, UNICOS, UNICOS_LARGOS, Acumulador, Resumo
+from .agregacao_vetorizada import numpy_disponivel
+from .ingestao import BrokerLocal, Ingestor, PipelineAsync
+from .paginacao import codificar_cursor, decodificar_cursor
+from .models import (
+    AgregadoMetrica, CorrenteBrunidores, DadosAgregados, Equipamento, ExecucaoAgregacao, GrandezaEletrica,
+    MarcaAgregacao, ResumoDiario, Temperatura,
+)
+
+
+INICIO = datetime(2026, 3, 2, 10, 0, tzinfo=dt_timezone.utc)
+
+
+def inserir_temperaturas(leituras, id_cliente='cliente_1', id_equipamento='equipamento_1', inicio=INICIO):
+    """Insere (minutos após ``inicio``, valor) em ordem de id; retorna as instâncias"""
+    criadas = []
+    for minutos, valor in leituras:
+        leitura = Temperatura.objects.create(
+            id_cliente=id_cliente, id_equipamento=id_equipamento, temperatura=Decimal(valor)
+        )
+        # timestamp é auto_now_add: o instante da leitura é definido depois
+        Temperatura.objects.filter(id=leitura.id).update(timestamp=inicio + timedelta(minutes=minutos))
+        criadas.append(leitura)
+    return criadas
+
+
+def agregar(**opcoes):
+    call_command('agregar_leituras', stdout=StringIO(), **opcoes)
+
+
+def horas_temperatura():
+    return list(AgregadoMetrica.objects.filter(
+        metrica='temperatura', granularidade='hora'
+    ).order_by('id_equipamento', 'periodo_inicio').values_list(
+        'id_equipamento', 'periodo_inicio', 'contagem', 'soma', 'minimo', 'maximo', 'ultima'
+    ))
+
+
+class AgregacaoEmLotesTests(TestCase):
+    """Uma hora dividida entre lotes (ou execuções) tem o mesmo resultado que agregada de uma vez"""
+
+    LEITURAS = [(5, '20.00'), (50, '30.00'), (10, '10.00'), (70, '40.00'), (20, '25.00'), (80, '5.00')]
+
+    def esperado(self):
+        hora = INICIO
+        return [
+            ('equipamento_1', hora, 4, Decimal('85'), Decimal('10'), Decimal('30'), Decimal('30')),
+            ('equipamento_1', hora + timedelta(hours=1), 2, Decimal('45'), Decimal('5'), Decimal('40'), Decimal('5')),
+        ]
+
+    def test_lote_unitario_igual_ao_lote_unico(self):
+        inserir_temperaturas(self.LEITURAS)
+        agregar(lote=1, backend='orm')
+        self.assertEqual(horas_temperatura(), self.esperado())
+
+        media = DadosAgregados.objects.get(granularidade='hora', periodo_inicio=INICIO).temperatura_media
+        self.assertEqual(media, Decimal('21.25'))
+
+    def test_execucoes_sucessivas_mesclam_a_hora(self):
+        inserir_temperaturas(self.LEITURAS[:3])
+        agregar()
+        inserir_temperaturas(self.LEITURAS[3:])
+        agregar()
+        self.assertEqual(horas_temperatura(), self.esperado())
+
+
+class LeiturasAtrasadasTests(TestCase):
+    """Leituras com id abaixo da marca d'água que aparecem depois (commit fora de ordem)"""
+
+    def test_varredura_mescla_leitura_atrasada(self):
+        _, atrasada, _ = inserir_temperaturas([(5, '20.00'), (10, '10.00'), (20, '30.00')])
+        # O id da segunda já foi reservado, mas o commit dela só chega depois da agregação
+        Temperatura.objects.filter(id=atrasada.id).delete()
+        agregar()
+        self.assertEqual(horas_temperatura()[0][2:4], (2, Decimal('50')))
+
+        Temperatura.objects.create(
+            id=atrasada.id, id_cliente='cliente_1', id_equipamento='equipamento_1', temperatura=Decimal('10.00')
+        )
+        Temperatura.objects.filter(id=atrasada.id).update(timestamp=INICIO + timedelta(minutes=10))
+        agregar()
+        self.assertEqual(
+            horas_temperatura(),
+            [('equipamento_1', INICIO, 3, Decimal('60'), Decimal('10'), Decimal('30'), Decimal('30'))],
+        )
+        self.assertFalse(Temperatura.objects.filter(agregado=False).exists())
+
+    def test_varredura_desativada_mantem_leitura_pendente(self):
+        _, atrasada = inserir_temperaturas([(5, '20.00'), (10, '10.00')])
+        inserir_temperaturas([(20, '30.00')])
+        Temperatura.objects.filter(id=atrasada.id).delete()
+        agregar()
+        Temperatura.objects.create(
+            id=atrasada.id, id_cliente='cliente_1', id_equipamento='equipamento_1', temperatura=Decimal('10.00')
+        )
+        agregar(varredura=0)
+        self.assertEqual(horas_temperatura()[0][2], 2)
+        self.assertTrue(Temperatura.objects.filter(id=atrasada.id, agregado=False).exists())
+
+    def test_leitura_commitada_durante_o_lote_nao_e_marcada(self):
+        _, atrasada, _ = inserir_temperaturas([(5, '20.00'), (10, '10.00'), (20, '30.00')])
+        Temperatura.objects.filter(id=atrasada.id).delete()
+        agregar_orm = Command.agregar_orm
+
+        def agregar_e_inserir(comando, fonte, id_inicio, id_fim):
+            # Entre a leitura da agregação e a marcação, outro escritor conclui um id do intervalo
+            agregar_orm(comando, fonte, id_inicio, id_fim)
+            if fonte.modelo is Temperatura:
+                Temperatura.objects.create(
+                    id=atrasada.id, id_cliente='cliente_1', id_equipamento='equipamento_1',
+                    temperatura=Decimal('10.00'),
+                )
+                Temperatura.objects.filter(id=atrasada.id).update(timestamp=INICIO + timedelta(minutes=10))
+
+        with mock.patch.object(Command, 'agregar_orm', agregar_e_inserir):
+            agregar(backend='orm')
+        self.assertFalse(Temperatura.objects.get(id=atrasada.id).agregado)
+        self.assertEqual(horas_temperatura()[0][2], 2)
+
+        # A varredura da execução seguinte a conta uma única vez
+        agregar()
+        self.assertEqual(horas_temperatura()[0][2:4], (3, Decimal('60')))
+
+
+class TempoRealTests(TestCase):
+    """O ciclo em tempo real usa o caminho mesclável: cada leitura entra uma única vez em dados_agregados"""
+
+    LEITURAS = AgregacaoEmLotesTests.LEITURAS
+
+    def largas(self):
+        return list(DadosAgregados.objects.order_by('granularidade', 'periodo_inicio').values_list(
+            'granularidade', 'periodo_inicio', 'temperatura_contagem', 'temperatura_soma',
+            'temperatura_media', 'temperatura_min', 'temperatura_max', 'temperatura_ultima',
+        ))
+
+    def test_hora_fechada_igual_a_agregacao_em_lote(self):
+        inserir_temperaturas(self.LEITURAS[:3])
+        TempoReal().ciclo(lote=2)
+        inserir_temperaturas(self.LEITURAS[3:])
+        TempoReal().ciclo(lote=2)
+        ao_vivo = self.largas()
+
+        # A mesma agregação refeita do zero, de uma vez
+        AgregadoMetrica.objects.all().delete()
+        DadosAgregados.objects.all().delete()
+        MarcaAgregacao.objects.all().delete()
+        Temperatura.objects.update(agregado=False)
+        agregar()
+        self.assertEqual(ao_vivo, self.largas())
+        self.assertEqual(ao_vivo[0][2:5], (4, Decimal('85'), Decimal('21.25')))
+
+    def test_agregador_agendado_nao_regrava_leituras_do_ciclo(self):
+        inserir_temperaturas(self.LEITURAS)
+        TempoReal().ciclo(lote=2000)
+        horas, largas = horas_temperatura(), self.largas()
+
+        agregar()
+        TempoReal().ciclo(lote=2000)
+        self.assertEqual(horas_temperatura(), horas)
+        self.assertEqual(self.largas(), largas)
+        self.assertEqual(DadosAgregados.objects.filter(granularidade='hora').count(), 2)
+
+
+class JanelaReleituraTests(TestCase):
+    """Alterações commitadas depois da marca, com updated_at anterior a ela, ainda são consolidadas"""
+
+    def test_hora_alterada_antes_da_marca_entra_na_execucao_seguinte(self):
+        inserir_temperaturas([(5, '20.00')])
+        agregar(periodo='dia')
+        marca = MarcaAgregacao.objects.get(tabela='agregados_metricas', granularidade='dia')
+
+        # Lote de outra transação: gravado antes da marca, visível só depois dela
+        AgregadoMetrica.objects.filter(metrica='temperatura', granularidade='hora').update(
+            contagem=2, soma=Decimal('50'), updated_at=marca.ultimo_timestamp - timedelta(seconds=30)
+        )
+        agregar(periodo='dia')
+        dia = AgregadoMetrica.objects.get(metrica='temperatura', granularidade='dia')
+        self.assertEqual((dia.contagem, dia.soma), (2, Decimal('50')))
+
+
+class SolicitarExecucaoTests(TestCase):
+
+    def test_pedido_simultaneo_se_junta_ao_ativo(self):
+        execucao, criada = execucoes.solicitar('hora')
+        juntada, criada_de_novo = execucoes.solicitar('dia')
+        self.assertTrue(criada)
+        self.assertFalse(criada_de_novo)
+        self.assertEqual((juntada.id, juntada.periodo, juntada.solicitacoes), (execucao.id, 'dia', 2))
+
+    def test_deadlock_repete_o_pedido(self):
+        original = execucoes._solicitar
+        tentativas = []
+
+        def com_deadlock(*args):
+            tentativas.append(args)
+            if len(tentativas) == 1:
+                raise OperationalError(1213, 'Deadlock found when trying to get lock')
+            return original(*args)
+
+        with mock.patch.object(execucoes, '_solicitar', com_deadlock):
+            _, criada = execucoes.solicitar('hora')
+        self.assertTrue(criada)
+        self.assertEqual(len(tentativas), 2)
+
+    def test_pagina_acompanha_a_execucao_pedida(self):
+        self.client.force_login(User.objects.create(username='operador'))
+        agendada, _ = execucoes.solicitar('hora', origem='agendada')
+        execucoes.reservar()
+        # Sem pedido nesta sessão, a página não acompanha a agregação agendada
+        self.assertIsNone(self.client.get(reverse('leituras:index')).context['execucao_agregacao'])
+
+        # O pedido se junta à agendada em andamento: é ela que a página acompanha
+        self.client.post(reverse('leituras:agregar'))
+        self.assertEqual(self.client.session['execucao_agregacao'], agendada.id)
+        resposta = self.client.get(reverse('leituras:status_agregacao'), {'id': agendada.id})
+        self.assertEqual(resposta.json()['execucao']['status'], 'executando')
+        self.assertEqual(self.client.session['execucao_agregacao'], agendada.id)
+
+        ExecucaoAgregacao.objects.filter(id=agendada.id).update(status='concluida')
+        self.client.get(reverse('leituras:status_agregacao'), {'id': agendada.id})
+        self.assertNotIn('execucao_agregacao', self.client.session)
+
+    def test_um_agregador_por_banco(self):
+        trava = execucoes.travar_instancia()
+        self.assertIsNotNone(trava)
+        try:
+            self.assertIsNone(execucoes.travar_instancia())
+            with self.assertRaises(CommandError):
+                call_command('agregador', uma_vez=False, stdout=StringIO())
+        finally:
+            trava.close()
+        segunda = execucoes.travar_instancia()
+        self.assertIsNotNone(segunda)
+        segunda.close()
+
+
+class IngestorTests(TestCase):
+    """Ingestão MQTT em lotes (Ingestor) alimentada pelo BrokerLocal"""
+
+    TOPICO = 'leituras/cliente_1/equipamento_1/temperaturas'
+
+    def test_grava_em_lotes_e_descarta_invalidas(self):
+        ingestor = Ingestor(tamanho_lote=3, intervalo=60)
+        broker = BrokerLocal()
+        broker.assinar(ingestor.receber)
+        for valor in range(7):
+            broker.publicar(self.TOPICO, f'{20 + valor}.5'.encode())
+        broker.publicar(self.TOPICO, b'nao-e-numero')
+        broker.publicar('leituras/cliente_1/equipamento_1/grandezas_eletricas', b'{"tensao_r": 220.1}')
+
+        parar = threading.Event()
+        parar.set()
+        ingestor.executar(parar)
+
+        # Lotes de 3 pelo tamanho e o restante ao encerrar
+        estatisticas = ingestor.estatisticas
+        self.assertEqual((estatisticas['recebidas'], estatisticas['gravadas'], estatisticas['descartadas']), (9, 8, 1))
+        self.assertEqual(estatisticas['lotes'], 3)
+        self.assertEqual(
+            list(Temperatura.objects.order_by('id').values_list('temperatura', flat=True)),
+            [Decimal(f'{20 + valor}.50') for valor in range(7)],
+        )
+        self.assertEqual(GrandezaEletrica.objects.get().tensao_r, Decimal('220.10'))
+        self.assertFalse(Temperatura.objects.filter(agregado=True).exists())
+
+    def test_fila_cheia_bloqueia_o_cliente(self):
+        ingestor = Ingestor(max_pendentes=2, intervalo=0.01)
+        ingestor.receber(self.TOPICO, b'20')
+        ingestor.receber(self.TOPICO, b'21')
+        produtor = threading.Thread(target=ingestor.receber, args=(self.TOPICO, b'22'), daemon=True)
+        produtor.start()
+        produtor.join(timeout=0.2)
+        self.assertTrue(produtor.is_alive())
+
+        parar = threading.Event()
+        parar.set()
+        ingestor.executar(parar)
+        produtor.join(timeout=5)
+        self.assertFalse(produtor.is_alive())
+        ingestor.executar(parar)
+        self.assertEqual(Temperatura.objects.count(), 3)
+
+
+class ExportacaoTests(TestCase):
+    """Exportação em streaming: blocos paginados por chave e o conteúdo de cada formato"""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('operador'))
+        # Três equipamentos por período: os blocos de 4 linhas cortam empates de periodo_inicio
+        DadosAgregados.objects.bulk_create([
+            DadosAgregados(
+                id_cliente='cliente_1', id_equipamento=f'equipamento_{equipamento}', granularidade='hora',
+                periodo_inicio=INICIO + timedelta(hours=hora), periodo_fim=INICIO + timedelta(hours=hora + 1),
+                registros_contagem=1, temperatura_media=Decimal(f'{20 + hora}.{equipamento}5'),
+            )
+            for hora in range(5)
+            for equipamento in (3, 1, 2)
+        ])
+
+    def exportar(self, formato):
+        resposta = self.client.get(reverse('leituras:exportar'), {'formato': formato})
+        self.assertEqual(resposta.status_code, 200)
+        return b''.join(resposta.streaming_content)
+
+    def test_blocos_continuam_da_ultima_chave(self):
+        blocos = list(exportacao.iterar_por_chave(DadosAgregados.objects.all(), ['periodo_inicio', 'id'], tamanho=4))
+        self.assertEqual([len(bloco) for bloco in blocos], [4, 4, 4, 3])
+        chaves = [linha for bloco in blocos for linha in bloco]
+        self.assertEqual(chaves, list(
+            DadosAgregados.objects.order_by('periodo_inicio', 'id').values_list('periodo_inicio', 'id')
+        ))
+
+    def test_csv(self):
+        conteudo = self.exportar('csv').decode('utf-8')
+        self.assertTrue(conteudo.startswith('\ufeff'))
+        linhas = list(csv.reader(io.StringIO(conteudo.lstrip('\ufeff')), delimiter=';'))
+        self.assertEqual(linhas[0], exportacao.CAMPOS_EXPORTACAO)
+        self.assertEqual(len(linhas), 16)
+        coluna = linhas[0].index('temperatura_media')
+        self.assertEqual([linha[coluna] for linha in linhas[1:4]], ['20.35', '20.15', '20.25'])
+
+    def test_csv_gz_igual_ao_csv(self):
+        self.assertEqual(gzip.decompress(self.exportar('csv.gz')), self.exportar('csv'))
+
+    @skipUnless(exportacao.pyarrow_disponivel(), 'requer pyarrow')
+    def test_parquet(self):
+        import pyarrow.parquet
+
+        tabela = pyarrow.parquet.read_table(io.BytesIO(self.exportar('parquet')))
+        self.assertEqual(tabela.column_names, exportacao.CAMPOS_EXPORTACAO)
+        self.assertEqual(tabela.num_rows, 15)
+        self.assertEqual(tabela.column('temperatura_media').to_pylist()[:3], [20.35, 20.15, 20.25])
+        self.assertEqual(tabela.column('id').to_pylist(), list(
+            DadosAgregados.objects.order_by('periodo_inicio', 'id').values_list('id', flat=True)
+        ))
+
+
+class RegistroEquipamentosTests(TestCase):
+    """Listas dos filtros servidas do cache, invalidado só quando um par novo é registrado"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_par_novo_invalida_o_cache(self):
+        self.assertEqual(equipamentos.registrar([('cliente_1', 'equipamento_1')]), 1)
+        self.assertEqual(equipamentos.listar(), [('cliente_1', 'equipamento_1')])
+
+        # Pares já conhecidos não tocam o banco nem o cache
+        with self.assertNumQueries(0):
+            self.assertEqual(equipamentos.registrar([('cliente_1', 'equipamento_1')]), 0)
+            equipamentos.listar()
+
+        # Gravado por fora, só aparece quando o cache é invalidado
+        Equipamento.objects.create(id_cliente='cliente_9', id_equipamento='equipamento_9')
+        self.assertNotIn('cliente_9', equipamentos.clientes())
+        self.assertEqual(equipamentos.registrar([('cliente_2', 'equipamento_1'), ('cliente_1', 'equipamento_1')]), 1)
+        self.assertEqual(equipamentos.clientes(), ['cliente_1', 'cliente_2', 'cliente_9'])
+        self.assertEqual(equipamentos.equipamentos(), ['equipamento_1', 'equipamento_9'])
+
+    def test_agregacao_registra_os_equipamentos(self):
+        inserir_temperaturas([(5, '20.00')], id_equipamento='equipamento_7')
+        equipamentos.listar()
+        agregar()
+        self.assertIn(('cliente_1', 'equipamento_7'), equipamentos.listar())
+
+
+class RetencaoTests(TestCase):
+    """Retenção por DELETE em lotes (SQLite): só leituras antigas e já agregadas saem"""
+
+    def test_apaga_so_leituras_agregadas_antes_do_corte(self):
+        antigas = inserir_temperaturas([(minutos, '20.00') for minutos in range(0, 50, 10)])
+        atrasada = antigas[2]
+        Temperatura.objects.filter(id=atrasada.id).delete()
+        agregar(varredura=0)
+        # Abaixo da marca, mas commitada depois da agregação (agregado=False)
+        Temperatura.objects.create(
+            id=atrasada.id, id_cliente='cliente_1', id_equipamento='equipamento_1', temperatura=Decimal('20.00')
+        )
+        Temperatura.objects.filter(id=atrasada.id).update(timestamp=INICIO)
+        # Acima da marca, ainda não agregada
+        acima, = inserir_temperaturas([(55, '20.00')])
+        recente, = inserir_temperaturas([(0, '20.00')], inicio=timezone.now() - timedelta(hours=1))
+
+        saida = StringIO()
+        call_command('retencao_leituras', meses=1, tabela='temperaturas', simular=True, stdout=saida)
+        self.assertIn('temperaturas: 4 leituras seriam apagadas', saida.getvalue())
+        self.assertEqual(Temperatura.objects.count(), 7)
+
+        saida = StringIO()
+        call_command('retencao_leituras', meses=1, tabela='temperaturas', lote=3, stdout=saida)
+        self.assertIn('temperaturas: 4 leituras apagadas', saida.getvalue())
+        self.assertEqual(
+            sorted(Temperatura.objects.values_list('id', flat=True)), [atrasada.id, acima.id, recente.id]
+        )
+        # A versão reduzida permanece
+        self.assertEqual(DadosAgregados.objects.get(granularidade='hora').temperatura_contagem, 4)
+
+
+class MaterializacaoTests(TestCase):
+    """Métricas de tabelas brutas diferentes, agregadas em execuções separadas, formam uma linha larga"""
+
+    def test_fontes_separadas_compoem_a_mesma_linha(self):
+        inserir_temperaturas([(5, '20.00'), (10, '30.00')])
+        agregar()
+
+        corrente = CorrenteBrunidores.objects.create(
+            id_cliente='cliente_1', id_equipamento='equipamento_1', corrente=Decimal('12.50')
+        )
+        grandeza = GrandezaEletrica.objects.create(
+            id_cliente='cliente_1', id_equipamento='equipamento_1', tensao_r=Decimal('220.00')
+        )
+        CorrenteBrunidores.objects.filter(id=corrente.id).update(timestamp=INICIO + timedelta(minutes=15))
+        GrandezaEletrica.objects.filter(id=grandeza.id).update(timestamp=INICIO + timedelta(minutes=20))
+        agregar()
+
+        self.assertEqual(
+            set(AgregadoMetrica.objects.filter(granularidade='hora').values_list('metrica', flat=True)),
+            {'temperatura', 'corrente_brunidores', 'tensao_r'},
+        )
+        linha = DadosAgregados.objects.get(granularidade='hora')
+        self.assertEqual((linha.temperatura_contagem, linha.temperatura_media), (2, Decimal('25')))
+        self.assertEqual((linha.corrente_brunidores_contagem, linha.corrente_brunidores_ultima), (1, Decimal('12.5')))
+        self.assertEqual(linha.tensao_r_max, Decimal('220'))
+        self.assertIsNone(linha.tensao_s_media)
+
+
+class AgregacaoParalelaTests(TransactionTestCase):
+    """--workers: cada tabela bruta agregada numa thread, com o mesmo resultado da execução em sequência"""
+
+    def inserir(self):
+        for equipamento in ('equipamento_1', 'equipamento_2'):
+            inserir_temperaturas([(5, '20.00'), (65, '22.00'), (70, '21.00')], id_equipamento=equipamento)
+            for minutos, valor in ((10, '12.50'), (80, '13.00')):
+                leitura = CorrenteBrunidores.objects.create(
+                    id_cliente='cliente_1', id_equipamento=equipamento, corrente=Decimal(valor)
+                )
+                CorrenteBrunidores.objects.filter(id=leitura.id).update(timestamp=INICIO + timedelta(minutes=minutos))
+            leitura = GrandezaEletrica.objects.create(
+                id_cliente='cliente_1', id_equipamento=equipamento,
+                tensao_r=Decimal('220.00'), corrente_r=Decimal('5.00'),
+            )
+            GrandezaEletrica.objects.filter(id=leitura.id).update(timestamp=INICIO + timedelta(minutes=30))
+
+    def horas(self):
+        return list(AgregadoMetrica.objects.filter(granularidade='hora').order_by(*UNICOS).values_list(
+            *UNICOS, *CAMPOS_ACUMULADOS
+        ))
+
+    def test_workers_igual_a_serial(self):
+        self.inserir()
+        Command(stdout=StringIO()).agregar_fontes('orm', 2, 1, 0)
+        serial = self.horas()
+
+        AgregadoMetrica.objects.all().delete()
+        MarcaAgregacao.objects.all().delete()
+        for modelo in (Temperatura, CorrenteBrunidores, GrandezaEletrica):
+            modelo.objects.update(agregado=False)
+
+        # O SQLite não aceita escritores simultâneos: as threads se revezam, mas o
+        # caminho é o do --workers (pool, conexão por thread, relato por tabela)
+        revezamento = threading.Lock()
+        threads = []
+        agregar_em_thread = Command._agregar_em_thread
+
+        def em_revezamento(comando, tarefa):
+            with revezamento:
+                threads.append(threading.current_thread().name)
+                return agregar_em_thread(comando, tarefa)
+
+        saida = StringIO()
+        with mock.patch.object(Command, '_agregar_em_thread', em_revezamento):
+            Command(stdout=saida).agregar_fontes('orm', 2, 3, 0)
+        self.assertEqual(len(threads), 6)
+        self.assertTrue(all(nome.startswith('agregacao') for nome in threads))
+        self.assertIn('temperaturas: 6 leituras agregadas', saida.getvalue())
+        self.assertEqual(self.horas(), serial)
+        self.assertEqual(len(serial), 12)
+
+
+class ResumoIntervaloTests(TestCase):
+    """Cards do dashboard: dias inteiros de resumos_diarios mais as horas das pontas"""
+
+    def test_igual_ao_intervalo_lido_hora_a_hora(self):
+        # Três dias de leituras, duas a cada três horas
+        inserir_temperaturas([
+            (hora * 60 + minutos, f'{20 + (hora * 7) % 11}.{minutos}0')
+            for hora in range(0, 72, 3)
+            for minutos in (5, 35)
+        ])
+        agregar()
+        self.assertTrue(ResumoDiario.objects.exists())
+
+        inicio, fim = INICIO + timedelta(hours=5), INICIO + timedelta(hours=61)
+        with self.assertNumQueries(2):
+            resumo = resumos.resumir_intervalo(inicio=inicio, fim=fim, id_equipamento='equipamento_1')
+
+        horas = DadosAgregados.objects.filter(
+            granularidade='hora', periodo_inicio__gte=inicio, periodo_inicio__lt=fim
+        )
+        esperado = horas.aggregate(
+            periodos=Count('id'), soma=Sum('temperatura_soma'), contagem=Sum('temperatura_contagem'),
+            maximo=Max('temperatura_max'), ultimo=Max('periodo_fim'),
+        )
+        self.assertEqual(resumo.periodos, esperado['periodos'])
+        self.assertEqual(resumo.media('temperatura'), esperado['soma'] / esperado['contagem'])
+        self.assertEqual(resumo.maximos['temperatura'], esperado['maximo'])
+        self.assertEqual(resumo.ultimo_periodo_fim, esperado['ultimo'])
+        self.assertIsNone(resumo.media('corrente_brunidores'))
+
+        # Outro equipamento: nada
+        self.assertEqual(resumos.resumir_intervalo(inicio=inicio, fim=fim, id_equipamento='equipamento_2').periodos, 0)
+
+
+@override_settings(RETENCAO_LEITURAS_MESES=0)
+class ReagregacaoTests(TestCase):
+    """reagregar refaz um intervalo das leituras brutas: repetir dá o mesmo resultado, e a marca não se move"""
+
+    def estado(self):
+        return (
+            list(AgregadoMetrica.objects.order_by(*UNICOS).values_list(*UNICOS, *CAMPOS_ACUMULADOS)),
+            list(DadosAgregados.objects.order_by(*UNICOS_LARGOS).values_list(
+                *UNICOS_LARGOS, 'registros_contagem', 'temperatura_media', 'temperatura_max', 'temperatura_ultima'
+            )),
+            list(ResumoDiario.objects.order_by('dia').values_list('dia', 'periodos', *CAMPOS_RESUMO)),
+        )
+
+    def reagregar(self):
+        call_command('reagregar', desde='2026-03-02', ate='2026-03-02', pausa=0, stdout=StringIO())
+
+    def test_reagregar_e_idempotente_e_mantem_a_marca(self):
+        inserir_temperaturas(AgregacaoEmLotesTests.LEITURAS)
+        agregar(periodo='semana')
+        esperado = self.estado()
+        marca = MarcaAgregacao.objects.get(tabela='temperaturas', granularidade='hora').ultimo_id
+
+        # Um agregado corrompido e uma leitura nova, acima da marca
+        AgregadoMetrica.objects.filter(granularidade='hora', periodo_inicio=INICIO).update(contagem=999)
+        nova, = inserir_temperaturas([(30, '50.00')])
+
+        self.reagregar()
+        self.assertEqual(self.estado(), esperado)
+        self.reagregar()
+        self.assertEqual(self.estado(), esperado)
+        self.assertEqual(MarcaAgregacao.objects.get(tabela='temperaturas', granularidade='hora').ultimo_id, marca)
+        self.assertFalse(Temperatura.objects.get(id=nova.id).agregado)
+
+        # A leitura nova fica para a agregação incremental, que a conta uma vez
+        agregar()
+        self.assertEqual(horas_temperatura()[0][2:4], (5, Decimal('135')))
+
+
+class PipelineAsyncTests(TestCase):
+
+    def test_falha_de_gravacao_libera_as_threads_dos_clientes(self):
+        pipeline = PipelineAsync(max_pendentes=2, intervalo=0.01)
+        produtor = threading.Thread(
+            target=lambda: [pipeline.receber('leituras/cliente_1/equipamento_1/temperaturas', b'20.5') for _ in range(20)],
+            daemon=True,
+        )
+
+        with mock.patch.object(PipelineAsync, '_gravar', side_effect=OperationalError(2006, 'MySQL server has gone away')):
+            with self.assertRaises(OperationalError):
+                asyncio.run(pipeline.executar(ao_iniciar=produtor.start))
+
+        # Sem vagas e com o pipeline parado, receber retorna em vez de bloquear a thread
+        produtor.join(timeout=5)
+        self.assertFalse(produtor.is_alive())
+
+
+class SeriesTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        caches['api'].clear()
+        self.client.force_login(User.objects.create_user('operador'))
+        ontem = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(days=1)
+        inserir_temperaturas([(5, '20.00')], id_cliente='cliente_1', inicio=ontem)
+        inserir_temperaturas([(5, '30.00')], id_cliente='cliente_2', inicio=ontem)
+        agregar()
+
+    def test_equipamento_de_dois_clientes_exige_cliente(self):
+        resposta = self.client.get('/api/series/', {'equipamentos': 'equipamento_1', 'metricas': 'temperatura'})
+        self.assertEqual(resposta.status_code, 400)
+        self.assertIn('cliente=', resposta.json()['error'])
+
+        resposta = self.client.get(
+            '/api/series/', {'equipamentos': 'equipamento_1', 'metricas': 'temperatura', 'cliente': 'cliente_2'}
+        )
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['series'][0]['valores'], [30.0])
+
+
+class GraficoTests(TestCase):
+    """Endpoints dos gráficos (/api/chart-data/)"""
+
+    def setUp(self):
+        cache.clear()
+        caches['api'].clear()
+        self.client.force_login(User.objects.create_user('operador'))
+        # Três dias de horas, ora só com temperatura, ora só com corrente: as séries não compartilham pontos
+        agora = timezone.now().replace(minute=0, second=0, microsecond=0)
+        linhas = []
+        for hora in range(72):
+            inicio = agora - timedelta(hours=72 - hora)
+            valor = Decimal((hora * 7) % 23)
+            campos = (
+                {'temperatura_soma': valor, 'temperatura_contagem': 1} if hora % 2
+                else {'corrente_brunidores_soma': valor, 'corrente_brunidores_contagem': 1}
+            )
+            linhas.append(DadosAgregados(
+                id_cliente='cliente_1', id_equipamento='equipamento_1', granularidade='hora',
+                periodo_inicio=inicio, periodo_fim=inicio + timedelta(hours=1), registros_contagem=1, **campos
+            ))
+        DadosAgregados.objects.bulk_create(linhas)
+
+    def test_pontos_limitam_o_grafico_com_varias_series(self):
+        for metodo in ('lttb', 'minmax'):
+            dados = self.client.get('/api/chart-data/', {'range': '7d', 'pontos': 20, 'metodo': metodo}).json()
+            self.assertEqual(dados['periodos'], 72)
+            self.assertLessEqual(len(dados['labels']), 20)
+            self.assertEqual(len(dados['temperatura_media']), len(dados['labels']))
+
+    def test_etag_e_cache_de_respostas(self):
+        parametros = {'range': '7d', 'pontos': 20}
+        primeira = self.client.get('/api/chart-data/', parametros)
+        self.assertEqual(primeira.status_code, 200)
+        etag = primeira['ETag']
+
+        # Mesma versão dos dados: 304 na revalidação, resposta guardada sem ela
+        self.assertEqual(self.client.get('/api/chart-data/', parametros, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        DadosAgregados.objects.update(temperatura_soma=None, temperatura_contagem=None)
+        repetida = self.client.get('/api/chart-data/', parametros)
+        self.assertEqual((repetida.content, repetida['ETag']), (primeira.content, etag))
+
+        # Uma nova gravação em dados_agregados muda a versão e invalida os dois
+        DadosAgregados.objects.update(updated_at=timezone.now() + timedelta(minutes=1))
+        atualizada = self.client.get('/api/chart-data/', parametros, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(atualizada.status_code, 200)
+        self.assertNotEqual(atualizada['ETag'], etag)
+        self.assertEqual(set(atualizada.json()['temperatura_media']), {0})
+
+
+class AcumuladorTests(SimpleTestCase):
+
+    VALORES = [Decimal('20.5'), None, Decimal('18.25'), Decimal('22'), Decimal('19.75')]
+
+    def instantes(self):
+        return [INICIO + timedelta(minutes=minutos) for minutos in range(len(self.VALORES))]
+
+    def test_combinar_parciais_igual_a_adicionar(self):
+        inteiro = Acumulador()
+        parciais = [Acumulador(), Acumulador()]
+        for i, (valor, instante) in enumerate(zip(self.VALORES, self.instantes())):
+            inteiro.adicionar(valor, instante)
+            parciais[i >= 2].adicionar(valor, instante)
+
+        # Lotes mesclados fora de ordem: a última continua sendo a de maior instante
+        combinado = Acumulador()
+        for parcial in reversed(parciais):
+            combinado.combinar(*(getattr(parcial, campo) for campo in CAMPOS_ACUMULADOS))
+
+        for campo in CAMPOS_ACUMULADOS:
+            self.assertEqual(getattr(combinado, campo), getattr(inteiro, campo), campo)
+        self.assertEqual((combinado.contagem, combinado.media), (4, Decimal('20.125')))
+
+    def test_ultima_nula_prevalece(self):
+        acumulador = Acumulador()
+        acumulador.adicionar(Decimal('10'), INICIO)
+        acumulador.combinar(0, 0, None, None, None, INICIO + timedelta(minutes=1))
+        self.assertEqual((acumulador.contagem, acumulador.maximo, acumulador.ultima), (1, Decimal('10'), None))
+
+
+class ResumoTests(SimpleTestCase):
+
+    @staticmethod
+    def hora(fim, registros, media, soma, contagem, maximo):
+        # Temperatura preenchida; corrente_brunidores sem leituras
+        return (fim, registros, media, soma, contagem, maximo, None, None, None, None)
+
+    def test_media_ponderada_pelas_leituras(self):
+        resumo = Resumo()
+        resumo.adicionar_hora(*self.hora(INICIO + timedelta(hours=1), 3, Decimal('10'), Decimal('30'), 3, Decimal('12')))
+        resumo.adicionar_hora(*self.hora(INICIO + timedelta(hours=2), 1, Decimal('30'), Decimal('30'), 1, Decimal('30')))
+        # Hora gravada antes das colunas soma/contagem: pesa por registros_contagem
+        resumo.adicionar_hora(*self.hora(INICIO + timedelta(hours=3), 2, Decimal('15'), None, None, Decimal('16')))
+
+        self.assertEqual(resumo.media('temperatura'), Decimal('15'))
+        self.assertIsNone(resumo.media('corrente_brunidores'))
+        campos = resumo.campos()
+        self.assertEqual(campos['periodos'], 3)
+        self.assertEqual(campos['ultimo_periodo_fim'], INICIO + timedelta(hours=3))
+        self.assertEqual(campos['temperatura_max'], Decimal('30'))
+        self.assertIsNone(campos['corrente_brunidores_contagem'])
+
+    def test_combinar_resumos_de_partes_do_dia(self):
+        horas = [
+            self.hora(INICIO + timedelta(hours=i + 1), 2, None, Decimal(10 * i), 2, Decimal(i)) for i in range(4)
+        ]
+        inteiro = Resumo()
+        partes = [Resumo(), Resumo()]
+        for i, hora in enumerate(horas):
+            inteiro.adicionar_hora(*hora)
+            partes[i % 2].adicionar_hora(*hora)
+
+        combinado = Resumo()
+        for parte in partes:
+            campos = parte.campos()
+            combinado.combinar(campos['periodos'], campos['ultimo_periodo_fim'], *(campos[c] for c in CAMPOS_RESUMO))
+        self.assertEqual(combinado.campos(), inteiro.campos())
+
+
+class MarcaAguaTests(TestCase):
+
+    def marca(self):
+        return MarcaAgregacao.objects.get(tabela='temperaturas', granularidade='hora').ultimo_id
+
+    def test_marca_avanca_por_lote_ate_o_ultimo_id(self):
+        leituras = inserir_temperaturas([(5, '20.00'), (10, '21.00'), (15, '22.00')])
+        agregar(lote=2)
+        self.assertEqual(self.marca(), leituras[-1].id)
+        self.assertFalse(Temperatura.objects.filter(agregado=False).exists())
+
+        novas = inserir_temperaturas([(20, '23.00')])
+        agregar()
+        self.assertEqual(self.marca(), novas[-1].id)
+        self.assertEqual(horas_temperatura()[0][2], 4)
+
+    def test_primeira_execucao_parte_da_primeira_pendente(self):
+        antigas = inserir_temperaturas([(5, '20.00'), (10, '21.00')])
+        Temperatura.objects.filter(id__in=[l.id for l in antigas]).update(agregado=True)
+        inserir_temperaturas([(15, '22.00')])
+        agregar()
+        # As leituras já marcadas como agregadas (antes da marca existir) não são contadas de novo
+        self.assertEqual(horas_temperatura()[0][2:4], (1, Decimal('22')))
+
+
+@skipUnless(numpy_disponivel(), 'requer o pacote numpy')
+class BackendNumpyTests(TestCase):
+    """O backend vetorizado grava exatamente os mesmos agregados que o ORM"""
+
+    def inserir(self):
+        for i in range(60):
+            inserir_temperaturas(
+                [(i * 7, f'{(i * 37) % 50 - 10}.{i % 4 * 25:02d}')],
+                id_cliente=f'cliente_{i % 2}', id_equipamento=f'equipamento_{i % 3}',
+            )
+            leitura = GrandezaEletrica.objects.create(
+                id_cliente='cliente_0', id_equipamento=f'equipamento_{i % 2}',
+                tensao_r=Decimal(f'{220 + i % 5}.1'),
+                corrente_r=None if i % 3 else Decimal(f'{i}.55'),
+                fator_potencia=Decimal(f'0.{9000 + i}'),
+            )
+            GrandezaEletrica.objects.filter(id=leitura.id).update(timestamp=INICIO + timedelta(minutes=i * 11))
+
+    def agregados(self):
+        return (
+            list(AgregadoMetrica.objects.order_by(*UNICOS).values_list(*UNICOS, *CAMPOS_ACUMULADOS)),
+            list(DadosAgregados.objects.order_by(*UNICOS_LARGOS).values_list(
+                *UNICOS_LARGOS, 'registros_contagem', 'temperatura_media', 'temperatura_ultima',
+                'corrente_r_media', 'corrente_r_ultima', 'fator_potencia_max',
+            )),
+        )
+
+    def test_numpy_igual_ao_orm(self):
+        self.inserir()
+        agregar(backend='orm', lote=7, periodo='semana')
+        esperado = self.agregados()
+
+        for modelo in (AgregadoMetrica, DadosAgregados, MarcaAgregacao):
+            modelo.objects.all().delete()
+        for modelo in (Temperatura, GrandezaEletrica):
+            modelo.objects.update(agregado=False)
+        agregar(backend='numpy', lote=7, periodo='semana')
+        self.assertEqual(self.agregados(), esperado)
+
+
+class PlanosConsultaTests(TestCase):
+
+    def test_views_usam_indices(self):
+        saida = StringIO()
+        try:
+            call_command('verificar_consultas', linhas=2000, equipamentos=10, stdout=saida, stderr=saida)
+        except CommandError as erro:
+            self.fail(f'{erro}:\n{saida.getvalue()}')
+        self.assertIn('todas usando índices', saida.getvalue())
+
+    @skipUnless(connection.vendor == 'sqlite', 'planos do SQLite')
+    def test_varredura_do_indice_so_com_limite(self):
+        verificar = VerificarConsultas()
+        _, problemas = verificar._explicar('SELECT DISTINCT granularidade FROM dados_agregados')
+        self.assertEqual(problemas, ['varredura completa do índice'])
+        _, problemas = verificar._explicar(
+            'SELECT granularidade FROM dados_agregados ORDER BY granularidade, periodo_inicio LIMIT 10'
+        )
+        self.assertEqual(problemas, [])
+
+
+class LeituraProjetadaTests(TestCase):
+
+    def setUp(self):
+        # Dois equipamentos por hora: periodos_inicio repetidos, desempatados pelo id
+        for hora in range(4):
+            for equipamento in ('equipamento_1', 'equipamento_2'):
+                DadosAgregados.objects.create(
+                    id_cliente='cliente_1', id_equipamento=equipamento, granularidade='hora',
+                    periodo_inicio=INICIO + timedelta(hours=hora), periodo_fim=INICIO + timedelta(hours=hora + 1),
+                    registros_contagem=60, temperatura_media=Decimal('20.50') + hora, umidade_media=None,
+                )
+        self.ordem = list(DadosAgregados.objects.order_by('-periodo_inicio', '-id').values_list('id', flat=True))
+
+    def test_linhas_e_colunas_em_float(self):
+        linha = DadosAgregados.objects.order_by('periodo_inicio', 'id').linhas(
+            'id_equipamento', 'temperatura_media', 'umidade_media'
+        ).first()
+        self.assertEqual(linha, ('equipamento_1', 20.5, None))
+        self.assertEqual(linha.temperatura_media, 20.5)
+        self.assertIsInstance(linha.temperatura_media, float)
+
+        colunas = DadosAgregados.objects.filter(id_equipamento='equipamento_2').order_by('periodo_inicio').colunas(
+            'periodo_inicio', 'temperatura_media'
+        )
+        self.assertEqual(colunas['temperatura_media'], [20.5, 21.5, 22.5, 23.5])
+        self.assertEqual(colunas['periodo_inicio'][0], INICIO)
+
+    def test_cursor_ida_e_volta(self):
+        instante = INICIO + timedelta(microseconds=123456)
+        self.assertEqual(decodificar_cursor(codificar_cursor(instante, 42)), (instante, 42))
+        with self.assertRaises(ValueError):
+            decodificar_cursor('x_1')
+
+    def test_paginas_para_tras_e_para_frente(self):
+        query = DadosAgregados.objects.linhas('id', 'periodo_inicio')
+        paginas = []
+        linhas, anterior, proxima = paginacao.paginar(query, 3)
+        self.assertIsNone(anterior)
+        while True:
+            paginas.append((linhas, anterior))
+            if proxima is None:
+                break
+            linhas, anterior, proxima = paginacao.paginar(query, 3, antes=decodificar_cursor(proxima))
+
+        # Todas as linhas, uma vez cada, na ordem (periodo_inicio, id) decrescente
+        self.assertEqual([linha.id for linhas, _ in paginas for linha in linhas], self.ordem)
+        self.assertEqual([len(linhas) for linhas, _ in paginas], [3, 3, 2])
+
+        # Voltando da última página chega-se à do meio; da do meio, à primeira (sempre cheia)
+        _, anterior = paginas[-1]
+        linhas, anterior, _ = paginacao.paginar(query, 3, depois=decodificar_cursor(anterior))
+        self.assertEqual(linhas, paginas[1][0])
+        linhas, anterior, _ = paginacao.paginar(query, 3, depois=decodificar_cursor(anterior))
+        self.assertEqual(linhas, paginas[0][0])
+        self.assertIsNone(anterior)
@@ -6,5 +6,6 @@ app_name = 'leituras'
 urlpatterns = [
     path('', views.index, name='index'),
     path('agregar-leituras/', views.agregar, name='agregar'),
+    path('agregar-leituras/status/', views.status_agregacao, name='status_agregacao'),
     path('exportar-leituras/', views.exportar, name='exportar'),
 ]
@@ -1,60 +1,89 @@
 from django.shortcuts import render, redirect
-from django.http import HttpResponse, StreamingHttpResponse
-from django.db.models import Q
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.conf import settings
+from django.db.models import Count
 from django.utils import timezone
 from django.contrib import messages
-from django.core.management import call_command
 from datetime import datetime
 from urllib.parse import urlencode
-import csv
-import io
-from .models import DadosAgregados
+from . import equipamentos, execucoes, paginacao
+from .exportacao import FORMATOS, pyarrow_disponivel
+from .models import DadosAgregados, ExecucaoAgregacao
+
+
+POR_PAGINA_MAXIMO = 500
+
+# Coluna que indica se cada grupo de colunas da tabela tem dados
+COLUNAS_GRUPOS = {
+    'brunidores': 'corrente_brunidores_media',
+    'descascadores': 'corrente_descascadores_media',
+    'polidores': 'corrente_polidores_media',
+    'temperatura': 'temperatura_media',
+    'umidade': 'umidade_media',
+    'grandezas_eletricas': 'tensao_r_media',
+}
+
+# Colunas lidas para a tabela (as médias como float) e para a chave da paginação
+CAMPOS_LISTAGEM = ['id', 'id_cliente', 'id_equipamento', 'periodo_inicio', 'periodo_fim', *COLUNAS_GRUPOS.values()]
 
 
 def index(request):
-    """View principal para listar dados agregados com filtros"""
+    """View principal para listar dados agregados com filtros, paginada por chave"""
     query = DadosAgregados.objects.all()
     
     # Aplica filtros
     query = apply_filters(query, request)
     
-    # Ordena antes de aplicar o slice
-    query = query.order_by('-periodo_inicio')
-    
-    # Conta o total ANTES de aplicar o slice (garante contagem correta)
-    total_leituras = query.count()
-    
-    # Aplica limite apenas se não houver filtro de data
-    if not request.GET.get('data_inicio') and not request.GET.get('data_fim'):
-        leituras = list(query[:24])  # Converte para lista para exibição
-    else:
-        leituras = list(query)  # Converte para lista para exibição
+    # Página: ?antes= (mais antigas) ou ?depois= (mais novas) com a chave da linha de referência
+    try:
+        antes = paginacao.decodificar_cursor(request.GET['antes']) if request.GET.get('antes') else None
+        depois = paginacao.decodificar_cursor(request.GET['depois']) if request.GET.get('depois') else None
+    except ValueError:
+        return HttpResponseBadRequest('Cursor de página inválido')
+    por_pagina = request.GET.get('por_pagina', '')
+    por_pagina = max(1, min(int(por_pagina), POR_PAGINA_MAXIMO)) if por_pagina.isdigit() else settings.LEITURAS_POR_PAGINA
+    leituras, cursor_anterior, cursor_proximo = paginacao.paginar(
+        query.linhas(*CAMPOS_LISTAGEM), por_pagina, antes=antes, depois=depois
+    )
+    
+    # Total e colunas com dados em todo o intervalo filtrado, numa consulta
+    total_leituras, colunas_visiveis = detectar_colunas_visiveis(query)
     
     # Busca dados para preencher os filtros
-    clientes = DadosAgregados.objects.values_list('id_cliente', flat=True).distinct().order_by('id_cliente')
-    equipamentos = DadosAgregados.objects.values_list('id_equipamento', flat=True).distinct().order_by('id_equipamento')
+    clientes = equipamentos.clientes()
+    lista_equipamentos = equipamentos.equipamentos()
     
     # Busca o timestamp da última agregação
-    ultima_atualizacao = DadosAgregados.objects.order_by('-updated_at').first()
-    ultima_atualizacao = ultima_atualizacao.updated_at if ultima_atualizacao else None
-    
-    # Detecta quais colunas têm dados
-    colunas_visiveis = detectar_colunas_visiveis(leituras)
+    ultima_atualizacao = DadosAgregados.objects.ultima_atualizacao()
     
     # Obter nome do equipamento selecionado
     nome_equipamento = None
     if request.GET.get('id_equipamento'):
         nome_equipamento = obter_nome_equipamento(request.GET.get('id_equipamento'))
     
+    # Links de navegação preservam filtros e tamanho da página
+    filtros = request.GET.copy()
+    filtros.pop('antes', None)
+    filtros.pop('depois', None)
+    
+    def url_pagina(**cursor):
+        parametros = filtros.copy()
+        parametros.update(cursor)
+        return f'?{parametros.urlencode()}'
+    
     context = {
         'leituras': leituras,
-        'total_leituras': total_leituras,  # Usa o count feito antes do slice
+        'total_leituras': total_leituras,
         'clientes': clientes,
-        'equipamentos': equipamentos,
+        'equipamentos': lista_equipamentos,
         'filters': request.GET,
         'ultima_atualizacao': ultima_atualizacao,
         'colunas_visiveis': colunas_visiveis,
         'nome_equipamento': nome_equipamento,
+        'url_primeira': url_pagina() if antes or depois else None,
+        'url_anterior': url_pagina(depois=cursor_anterior) if cursor_anterior else None,
+        'url_proxima': url_pagina(antes=cursor_proximo) if cursor_proximo else None,
+        'execucao_agregacao': request.session.get('execucao_agregacao'),
     }
     
     return render(request, 'leituras/index.html', context)
@@ -62,6 +91,12 @@ def index(request):
 
 def apply_filters(query, request):
     """Aplica filtros de busca"""
+    # Granularidade dos períodos (hora por padrão)
+    granularidade = request.GET.get('granularidade')
+    if granularidade not in dict(DadosAgregados.GRANULARIDADES):
+        granularidade = 'hora'
+    query = query.filter(granularidade=granularidade)
+    
     if request.GET.get('id_cliente'):
         query = query.filter(id_cliente=request.GET.get('id_cliente'))
     
@@ -81,32 +116,19 @@ def apply_filters(query, request):
     return query
 
 
-def detectar_colunas_visiveis(leituras):
-    """Detecta quais colunas têm dados para otimizar a exibição"""
-    colunas = {
-        'brunidores': False,
-        'descascadores': False,
-        'polidores': False,
-        'temperatura': False,
-        'umidade': False,
-        'grandezas_eletricas': False,
-    }
-    
-    for leitura in leituras:
-        if leitura.corrente_brunidores_media is not None:
-            colunas['brunidores'] = True
-        if leitura.corrente_descascadores_media is not None:
-            colunas['descascadores'] = True
-        if leitura.corrente_polidores_media is not None:
-            colunas['polidores'] = True
-        if leitura.temperatura_media is not None:
-            colunas['temperatura'] = True
-        if leitura.umidade_media is not None:
-            colunas['umidade'] = True
-        if leitura.tensao_r_media is not None:
-            colunas['grandezas_eletricas'] = True
-    
-    return colunas
+def detectar_colunas_visiveis(query):
+    """
+    Total de linhas da consulta e quais grupos de colunas têm dados, numa única agregação.
+
+    COUNT(coluna) conta só os valores não nulos, então um grupo é visível se
+    alguma linha de todo o intervalo filtrado (não só da página) o preencher.
+    """
+    totais = query.aggregate(
+        total=Count('id'),
+        **{grupo: Count(coluna) for grupo, coluna in COLUNAS_GRUPOS.items()},
+    )
+    total = totais.pop('total')
+    return total, {grupo: bool(quantidade) for grupo, quantidade in totais.items()}
 
 
 def obter_nome_equipamento(id_equipamento):
@@ -122,10 +144,15 @@ def obter_nome_equipamento(id_equipamento):
 
 
 def agregar(request):
-    """Executa o comando de agregação de dados"""
+    """Solicita a agregação ao agregador em segundo plano (ou se junta a uma já solicitada)"""
     if request.method == 'POST':
-        call_command('agregar_leituras', periodo='hora')
-        messages.success(request, 'Dados atualizados com sucesso!')
+        execucao, criada = execucoes.solicitar('hora')
+        # A página acompanha esta execução, e não a agendada que estiver ativa
+        request.session['execucao_agregacao'] = execucao.id
+        if criada:
+            messages.success(request, 'Atualização solicitada: os dados serão atualizados em instantes.')
+        else:
+            messages.info(request, 'Já existe uma atualização em andamento; sua solicitação foi incluída nela.')
         
         # Preserva os filtros que vieram no POST (campos hidden)
         query_params = {}
@@ -148,30 +175,37 @@ def agregar(request):
     return redirect(f"{request.META.get('HTTP_REFERER', '/')}?{query_params.urlencode()}")
 
 
+def status_agregacao(request):
+    """Situação de uma execução da agregação (?id=) ou da mais recente, em JSON"""
+    execucoes_agregacao = ExecucaoAgregacao.objects.order_by('-id')
+    if request.GET.get('id'):
+        if not request.GET['id'].isdigit():
+            return HttpResponseBadRequest('id inválido')
+        execucao = execucoes_agregacao.filter(id=request.GET['id']).first()
+        if execucao is None:
+            raise Http404('Execução não encontrada')
+        if execucao.status not in execucoes.ATIVAS and request.session.get('execucao_agregacao') == execucao.id:
+            del request.session['execucao_agregacao']
+    else:
+        execucao = execucoes_agregacao.first()
+    return JsonResponse({
+        'execucao': execucoes.situacao(execucao) if execucao else None,
+        'pendentes': ExecucaoAgregacao.objects.filter(status='pendente').count(),
+    })
+
+
 def exportar(request):
-    """Exporta dados agregados para CSV"""
+    """Exporta dados agregados em streaming (formato=csv, csv.gz, parquet ou arrow)"""
+    formato = request.GET.get('formato', 'csv')
+    if formato not in FORMATOS:
+        return HttpResponseBadRequest(f'Formato inválido. Use: {", ".join(FORMATOS)}')
+    content_type, extensao, gerar, requer_pyarrow = FORMATOS[formato]
+    if requer_pyarrow and not pyarrow_disponivel():
+        return HttpResponse(f'Formato {formato} requer o pacote pyarrow', status=501)
+    
     query = DadosAgregados.objects.all()
     query = apply_filters(query, request)
-    leituras = query.order_by('periodo_inicio')
-    
-    # Cria o arquivo CSV
-    response = HttpResponse(content_type='text/csv; charset=utf-8')
-    response['Content-Disposition'] = f'attachment; filename="dados_agregados_{datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}.csv"'
-    
-    # Adiciona BOM para UTF-8
-    response.write('\ufeff')
-    
-    writer = csv.writer(response, delimiter=';')
-    
-    # Escreve cabeçalho
-    if leituras.exists():
-        primeira_leitura = leituras.first()
-        campos = [field.name for field in primeira_leitura._meta.fields]
-        writer.writerow(campos)
-        
-        # Escreve dados
-        for leitura in leituras:
-            valores = [getattr(leitura, campo) for campo in campos]
-            writer.writerow(valores)
     
+    response = StreamingHttpResponse(gerar(query), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="dados_agregados_{datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}.{extensao}"'
     return response
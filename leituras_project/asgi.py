@@ -1,5 +1,13 @@
 """
 ASGI config for leituras_project project.
+
+Usado só para os eventos ao vivo do dashboard (/api/eventos/, Server-Sent
+Events), que não funcionam pelo WSGI. As demais rotas seguem no WSGI: no
+Django 4.2 o ASGI lê um StreamingHttpResponse síncrono inteiro antes de
+enviar o primeiro byte, o que desfaria o streaming da exportação. Em
+produção, um serviço à parte atende /api/eventos/ (o proxy encaminha só ela):
+
+    gunicorn leituras_project.asgi:application -k uvicorn.workers.UvicornWorker --bind 0.0.0.0:8001
 """
 
 import os
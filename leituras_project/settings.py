@@ -122,6 +122,51 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# MQTT (ingestão: python manage.py ingerir_mqtt)
+MQTT_HOST = config('MQTT_HOST', default='localhost')
+MQTT_PORT = config('MQTT_PORT', default=1883, cast=int)
+MQTT_USUARIO = config('MQTT_USUARIO', default='')
+MQTT_SENHA = config('MQTT_SENHA', default='')
+MQTT_PREFIXO = config('MQTT_PREFIXO', default='leituras')
+MQTT_CLIENT_ID = config('MQTT_CLIENT_ID', default='leituras-ingestao')
+
+# Retenção das tabelas brutas (python manage.py retencao_leituras): meses completos
+# mantidos além do mês corrente; só leituras já agregadas são removidas. 0 desativa.
+RETENCAO_LEITURAS_MESES = config('RETENCAO_LEITURAS_MESES', default=12, cast=int)
+
+# Linhas por página da listagem de dados agregados (?por_pagina= muda por requisição, até 500)
+LEITURAS_POR_PAGINA = config('LEITURAS_POR_PAGINA', default=50, cast=int)
+
+# Agregador (python manage.py agregador): atende os pedidos do botão "Atualizar Dados"
+# e agrega de forma incremental a cada AGREGACAO_INTERVALO segundos, até AGREGACAO_PERIODO
+AGREGACAO_INTERVALO = config('AGREGACAO_INTERVALO', default=60, cast=float)
+AGREGACAO_PERIODO = config('AGREGACAO_PERIODO', default='semana')
+# Implementação da agregação das tabelas brutas (agregar_leituras --backend):
+# auto (SQL no MySQL, ORM nos demais), sql, orm ou numpy (requer o pacote numpy)
+AGREGACAO_BACKEND = config('AGREGACAO_BACKEND', default='auto')
+# Ids abaixo da marca d'água relidos a cada execução, para leituras cujo commit
+# chegou depois de a marca passar por elas (escritores concorrentes nas tabelas brutas)
+AGREGACAO_VARREDURA_IDS = config('AGREGACAO_VARREDURA_IDS', default=20000, cast=int)
+
+# Cache (listas de clientes/equipamentos dos filtros). Com vários processos,
+# use um backend compartilhado (ex.: django.core.cache.backends.redis.RedisCache)
+# para que a invalidação feita pela ingestão/agregação alcance os servidores web.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='leituras'),
+    },
+    # Respostas da API de gráficos, por filtros e versão dos dados. Para dividir
+    # entre os workers do gunicorn num mesmo servidor, use
+    # django.core.cache.backends.filebased.FileBasedCache com um diretório em LOCATION.
+    'api': {
+        'BACKEND': config('CACHE_API_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_API_LOCATION', default='leituras-api'),
+    },
+}
+CACHE_EQUIPAMENTOS_TIMEOUT = config('CACHE_EQUIPAMENTOS_TIMEOUT', default=300, cast=int)
+CACHE_API_TIMEOUT = config('CACHE_API_TIMEOUT', default=30, cast=int)
+
 # Authentication settings
 LOGIN_REDIRECT_URL = '/dashboard/'
 LOGOUT_REDIRECT_URL = '/accounts/login/'
@@ -5,7 +5,7 @@ Estrutura de URLs:
 - /admin/ - Painel administrativo Django
 - /accounts/ - URLs de autenticação (login, logout, password reset)
 - /dashboard/ - Dashboard principal
-- /api/ - Endpoints de API para dados dos gráficos
+- /api/ - Endpoints de API para dados dos gráficos (chart-data, chart-summary, series, eventos via SSE)
 - / - Redirecionamento para dashboard
 """
 
@@ -14,14 +14,51 @@ from django.urls import path, include
 from django.views.generic import RedirectView
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
-from django.db.models import Avg, Count, Max
-from django.http import JsonResponse
+from django.db.models import Max, Min, Sum
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
+from asgiref.sync import sync_to_async
+from collections import Counter
 from datetime import timedelta
 from django.utils import timezone
+from leituras import amostragem, equipamentos, eventos, resumos
+from leituras.agregacao import GRANULARIDADES, INTERVALOS, METRICAS
+from leituras.cache_respostas import em_cache
+from leituras.consultas import como_float
 from leituras.models import DadosAgregados
 
 
+# Pontos por série devolvidos pela API de gráficos
+PONTOS_PADRAO = 200
+PONTOS_MAXIMO = 2000
+
+# Séries por requisição na API de séries temporais (equipamentos x métricas)
+SERIES_MAXIMO = 64
+SUFIXOS_SERIES = ('media', 'max', 'min', 'ultima')
+
+# Colunas da tabela de últimas leituras do dashboard
+CAMPOS_ULTIMAS = ['id_cliente', 'id_equipamento', 'periodo_fim', 'temperatura_media', 'corrente_brunidores_media']
+
+
+def escolher_granularidade(duracao, pontos):
+    """Granularidade mais grossa com ao menos ``pontos`` períodos em ``duracao`` (hora se nenhuma tiver)"""
+    return next(
+        (g for g in reversed(GRANULARIDADES) if duracao / INTERVALOS[g] >= pontos),
+        GRANULARIDADES[0],
+    )
+
+
+def _lista(request, nome):
+    """Parâmetro de lista: repetido (?m=a&m=b) e/ou separado por vírgulas (?m=a,b)"""
+    return [
+        item.strip()
+        for valor in request.GET.getlist(nome)
+        for item in valor.split(',')
+        if item.strip()
+    ]
+
+
 @login_required
 def dashboard_view(request):
     """
@@ -41,10 +78,11 @@ def dashboard_view(request):
     data_inicio = request.GET.get('data_inicio', '').strip()
     data_fim = request.GET.get('data_fim', '').strip()
     
-    # Query base
-    queryset = DadosAgregados.objects.all()
+    # Query base (períodos de uma hora)
+    queryset = DadosAgregados.objects.filter(granularidade='hora')
     
     # Aplicar filtros
+    data_inicio_dt = data_fim_dt = None
     if id_cliente:
         queryset = queryset.filter(id_cliente=id_cliente)
     if id_equipamento:
@@ -52,41 +90,41 @@ def dashboard_view(request):
     if data_inicio:
         from datetime import datetime
         try:
-            data_inicio_dt = datetime.strptime(data_inicio, '%Y-%m-%d')
+            data_inicio_dt = timezone.make_aware(datetime.strptime(data_inicio, '%Y-%m-%d'))
             queryset = queryset.filter(periodo_inicio__gte=data_inicio_dt)
         except ValueError:
             pass
     if data_fim:
         from datetime import datetime
         try:
-            data_fim_dt = datetime.strptime(data_fim, '%Y-%m-%d')
+            data_fim_dt = timezone.make_aware(datetime.strptime(data_fim, '%Y-%m-%d'))
             # Adiciona 1 dia para incluir todo o dia final
             from datetime import timedelta
             data_fim_dt = data_fim_dt + timedelta(days=1)
-            queryset = queryset.filter(periodo_fim__lt=data_fim_dt)
+            queryset = queryset.filter(periodo_inicio__lt=data_fim_dt)
         except ValueError:
             pass
     
-    # Consultas para os cards de resumo
-    total_leituras = queryset.count()
-    
-    summary = queryset.aggregate(
-        media_temp=Avg('temperatura_media'),
-        max_temp=Max('temperatura_max'),
+    # Cards de resumo: dias inteiros de resumos_diarios, horas das pontas de dados_agregados
+    resumo = resumos.resumir_intervalo(
+        inicio=data_inicio_dt,
+        fim=data_fim_dt,
+        id_cliente=id_cliente,
+        id_equipamento=id_equipamento,
     )
     
-    ultima_leitura = queryset.order_by('-updated_at').first()
-    
-    # Últimas 10 leituras para a tabela
-    leituras = queryset.order_by('-periodo_fim')[:10]
+    # Últimas 10 leituras para a tabela; a mais recente alimenta o card de última leitura
+    # (ordenar por periodo_inicio, o campo filtrado, usa os índices, updated_at exigiria ordenar o filtro inteiro)
+    leituras = list(queryset.order_by('-periodo_inicio').linhas(*CAMPOS_ULTIMAS)[:10])
+    ultima_leitura = leituras[0] if leituras else None
     
-    # Dados para filtros (sempre mostrar todas as opções)
-    clientes_all = DadosAgregados.objects.values_list('id_cliente', flat=True).distinct()
-    equipamentos_all = DadosAgregados.objects.values_list('id_equipamento', flat=True).distinct()
+    # Dados para filtros (sempre mostrar todas as opções, do registro em cache)
+    clientes_all = equipamentos.clientes()
+    equipamentos_all = equipamentos.equipamentos()
 
     context = {
-        'total_leituras': total_leituras,
-        'media_temperatura': summary.get('media_temp'),
+        'total_leituras': resumo.periodos,
+        'media_temperatura': resumo.media('temperatura'),
         'ultima_leitura': ultima_leitura,
         'leituras': leituras,
         'clientes': clientes_all,
@@ -103,20 +141,30 @@ def dashboard_view(request):
 
 @login_required
 @require_http_methods(["GET"])
+@em_cache
 def chart_data_view(request):
     """
     Endpoint de API para fornecer dados dos gráficos.
     
+    O intervalo inteiro é lido na granularidade mais grossa que ainda rende
+    ``pontos`` períodos, com os equipamentos filtrados combinados por período
+    (médias ponderadas pela contagem), e reduzido a no máximo ``pontos``
+    pontos; o custo não cresce com o tamanho do intervalo.
+    
     Query Parameters:
         - range: Período de dados ('7d', '30d', '90d') - padrão: '30d'
         - cliente: ID do cliente para filtrar
         - equipamento: ID do equipamento para filtrar
+        - pontos: Máximo de pontos do gráfico, somadas as séries (3 a 2000) - padrão: 200
+        - metodo: Redução 'lttb' (preserva a forma) ou 'minmax' (preserva picos) - padrão: 'lttb'
     
     Response JSON:
         {
             'labels': [...],              # Labels para o eixo X (datas/horas)
             'temperatura_media': [...],   # Dados de temperatura média
-            'corrente_brunidores': [...] # Dados de corrente brunidores
+            'corrente_brunidores': [...], # Dados de corrente brunidores
+            'granularidade': 'hora',      # Granularidade lida
+            'periodos': número,           # Períodos antes da redução
         }
     """
     try:
@@ -124,6 +172,10 @@ def chart_data_view(request):
         range_param = request.GET.get('range', '30d')
         cliente = request.GET.get('cliente')
         equipamento = request.GET.get('equipamento')
+        pontos = min(max(int(request.GET.get('pontos', PONTOS_PADRAO)), 3), PONTOS_MAXIMO)
+        metodo = request.GET.get('metodo', 'lttb')
+        if metodo not in amostragem.METODOS:
+            raise ValueError(f'Método inválido. Use: {", ".join(amostragem.METODOS)}')
         
         # Calcular data de início baseada no range
         hoje = timezone.now()
@@ -132,12 +184,16 @@ def chart_data_view(request):
             '30d': timedelta(days=30),
             '90d': timedelta(days=90),
         }
-        data_inicio = hoje - range_map.get(range_param, timedelta(days=30))
+        duracao = range_map.get(range_param, timedelta(days=30))
+        data_inicio = hoje - duracao
+        
+        granularidade = escolher_granularidade(duracao, pontos)
         
         # Query base
         queryset = DadosAgregados.objects.filter(
+            granularidade=granularidade,
             periodo_fim__gte=data_inicio
-        ).order_by('periodo_fim')
+        )
         
         # Aplicar filtros se fornecidos
         if cliente:
@@ -145,23 +201,40 @@ def chart_data_view(request):
         if equipamento:
             queryset = queryset.filter(id_equipamento=equipamento)
         
-        # Limitar últimas 50 leituras para performance
-        leituras = list(queryset[:50])
+        # Uma linha por período com soma e contagem de todos os equipamentos filtrados
+        periodos = list(
+            queryset.values('periodo_fim').annotate(
+                temperatura_soma=como_float(Sum('temperatura_soma')),
+                temperatura_contagem=Sum('temperatura_contagem'),
+                corrente_soma=como_float(Sum('corrente_brunidores_soma')),
+                corrente_contagem=Sum('corrente_brunidores_contagem'),
+            ).order_by('periodo_fim').values_list(
+                'periodo_fim', 'temperatura_soma', 'temperatura_contagem', 'corrente_soma', 'corrente_contagem'
+            )
+        )
+        
+        def media(soma, contagem):
+            return soma / contagem if contagem else None
+        
+        instantes = [periodo_fim.timestamp() for periodo_fim, *_ in periodos]
+        temperatura = [media(soma, contagem) for _, soma, contagem, _, _ in periodos]
+        corrente = [media(soma, contagem) for _, _, _, soma, contagem in periodos]
+        indices = amostragem.reduzir(instantes, [temperatura, corrente], pontos, metodo)
         
         # Preparar dados para o gráfico
         labels = [
-            leitura.periodo_fim.strftime("%d/%m %H:%M") 
-            for leitura in leituras
+            periodos[i][0].strftime("%d/%m %H:%M")
+            for i in indices
         ]
         
         temperatura_media = [
-            float(leitura.temperatura_media) if leitura.temperatura_media else 0 
-            for leitura in leituras
+            temperatura[i] if temperatura[i] is not None else 0
+            for i in indices
         ]
         
         corrente_brunidores = [
-            float(leitura.corrente_brunidores_media) if leitura.corrente_brunidores_media else 0 
-            for leitura in leituras
+            corrente[i] if corrente[i] is not None else 0
+            for i in indices
         ]
         
         return JsonResponse({
@@ -169,7 +242,9 @@ def chart_data_view(request):
             'labels': labels,
             'temperatura_media': temperatura_media,
             'corrente_brunidores': corrente_brunidores,
-            'count': len(leituras),
+            'count': len(indices),
+            'granularidade': granularidade,
+            'periodos': len(periodos),
         })
         
     except Exception as e:
@@ -181,6 +256,151 @@ def chart_data_view(request):
 
 @login_required
 @require_http_methods(["GET"])
+@em_cache
+def series_view(request):
+    """
+    Endpoint de API de séries temporais para vários equipamentos e métricas.
+    
+    Uma requisição atende todos os gráficos do dashboard: cada série é uma
+    métrica (prefixo + sufixo, ex.: 'umidade_max') de um equipamento, ou dos
+    equipamentos filtrados combinados por período se ``equipamentos`` não
+    for informado. Só as colunas das métricas pedidas são lidas; granularidade
+    e redução seguem as de chart_data_view.
+    
+    Query Parameters:
+        - metricas: Lista de métricas ('temperatura' equivale a 'temperatura_media') - obrigatório
+        - equipamentos: Lista de IDs de equipamento (uma série por equipamento e métrica)
+        - cliente: ID do cliente para filtrar (obrigatório se um dos equipamentos
+          existir em mais de um cliente)
+        - range: Período de dados ('7d', '30d', '90d') - padrão: '30d'
+        - pontos: Máximo de pontos do gráfico, somadas as séries (3 a 2000) - padrão: 200
+        - metodo: Redução 'lttb' ou 'minmax' - padrão: 'lttb'
+    
+    Response JSON:
+        {
+            'granularidade': 'hora',
+            'periodos': número,             # Períodos antes da redução
+            'timestamps': [...],            # Início dos períodos, em ms desde a época (UTC)
+            'series': [
+                {'equipamento': 'x' | null, 'metrica': 'temperatura_media', 'valores': [...]},
+            ]                               # valores alinhados a timestamps; null onde não há dado
+        }
+    """
+    try:
+        range_param = request.GET.get('range', '30d')
+        cliente = request.GET.get('cliente')
+        lista_equipamentos = _lista(request, 'equipamentos')
+        pontos = min(max(int(request.GET.get('pontos', PONTOS_PADRAO)), 3), PONTOS_MAXIMO)
+        metodo = request.GET.get('metodo', 'lttb')
+        if metodo not in amostragem.METODOS:
+            raise ValueError(f'Método inválido. Use: {", ".join(amostragem.METODOS)}')
+        
+        # Métricas pedidas como (prefixo, sufixo)
+        metricas = []
+        for nome in _lista(request, 'metricas'):
+            prefixo, sufixo = nome, 'media'
+            if nome not in METRICAS:
+                prefixo, _, sufixo = nome.rpartition('_')
+            if prefixo not in METRICAS or sufixo not in SUFIXOS_SERIES:
+                raise ValueError(f'Métrica inválida: {nome}')
+            if (prefixo, sufixo) not in metricas:
+                metricas.append((prefixo, sufixo))
+        if not metricas:
+            raise ValueError('Informe ao menos uma métrica em metricas=')
+        if len(metricas) * max(1, len(lista_equipamentos)) > SERIES_MAXIMO:
+            raise ValueError(f'Máximo de {SERIES_MAXIMO} séries por requisição')
+        if not lista_equipamentos and any(sufixo == 'ultima' for _, sufixo in metricas):
+            raise ValueError('A última leitura só pode ser pedida por equipamento (equipamentos=)')
+        if lista_equipamentos and not cliente:
+            # id_equipamento só é único dentro do cliente: a série misturaria os dois
+            donos = Counter(id_equipamento for _, id_equipamento in equipamentos.listar())
+            ambiguos = [equipamento for equipamento in lista_equipamentos if donos[equipamento] > 1]
+            if ambiguos:
+                raise ValueError(f'Equipamento(s) em mais de um cliente: {", ".join(ambiguos)}. Informe cliente=')
+        
+        hoje = timezone.now()
+        range_map = {
+            '7d': timedelta(days=7),
+            '30d': timedelta(days=30),
+            '90d': timedelta(days=90),
+        }
+        duracao = range_map.get(range_param, timedelta(days=30))
+        granularidade = escolher_granularidade(duracao, pontos)
+        
+        queryset = DadosAgregados.objects.filter(
+            granularidade=granularidade,
+            periodo_fim__gte=hoje - duracao
+        )
+        if cliente:
+            queryset = queryset.filter(id_cliente=cliente)
+        
+        # Linhas (equipamento, periodo_inicio, valor por métrica), só com as colunas necessárias
+        if lista_equipamentos:
+            linhas = queryset.filter(id_equipamento__in=lista_equipamentos).order_by().linhas(
+                'id_equipamento', 'periodo_inicio', *[f'{p}_{s}' for p, s in metricas]
+            )
+        else:
+            # Equipamentos combinados: média ponderada pela contagem, extremos dos extremos
+            combinadas = {}
+            for prefixo, sufixo in metricas:
+                if sufixo == 'media':
+                    combinadas[f'{prefixo}_soma_total'] = como_float(Sum(f'{prefixo}_soma'))
+                    combinadas[f'{prefixo}_contagem_total'] = Sum(f'{prefixo}_contagem')
+                else:
+                    combinadas[f'{prefixo}_{sufixo}_total'] = como_float(
+                        (Max if sufixo == 'max' else Min)(f'{prefixo}_{sufixo}')
+                    )
+            linhas = []
+            for totais in queryset.values('periodo_inicio').annotate(**combinadas).order_by():
+                dados = []
+                for prefixo, sufixo in metricas:
+                    if sufixo == 'media':
+                        contagem = totais[f'{prefixo}_contagem_total']
+                        dados.append(totais[f'{prefixo}_soma_total'] / contagem if contagem else None)
+                    else:
+                        dados.append(totais[f'{prefixo}_{sufixo}_total'])
+                linhas.append((None, totais['periodo_inicio'], *dados))
+        
+        # Eixo comum: todos os períodos presentes em alguma série, em ordem
+        chaves = [
+            (equipamento, f'{prefixo}_{sufixo}')
+            for equipamento in (lista_equipamentos or [None])
+            for prefixo, sufixo in metricas
+        ]
+        periodos = {}
+        valores = {chave: {} for chave in chaves}
+        for equipamento, periodo_inicio, *dados in linhas:
+            periodos[periodo_inicio] = None
+            for (prefixo, sufixo), valor in zip(metricas, dados):
+                if valor is not None:
+                    valores[(equipamento, f'{prefixo}_{sufixo}')][periodo_inicio] = valor
+        eixo = sorted(periodos)
+        series = [[valores[chave].get(periodo) for periodo in eixo] for chave in chaves]
+        
+        instantes = [periodo.timestamp() for periodo in eixo]
+        indices = amostragem.reduzir(instantes, series, pontos, metodo)
+        
+        return JsonResponse({
+            'success': True,
+            'granularidade': granularidade,
+            'periodos': len(eixo),
+            'timestamps': [int(instantes[i] * 1000) for i in indices],
+            'series': [
+                {'equipamento': equipamento, 'metrica': metrica, 'valores': [serie[i] for i in indices]}
+                for (equipamento, metrica), serie in zip(chaves, series)
+            ],
+        })
+        
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e),
+        }, status=400)
+
+
+@login_required
+@require_http_methods(["GET"])
+@em_cache
 def chart_data_summary_view(request):
     """
     Endpoint de API para dados resumidos (totais, médias, máximos).
@@ -209,27 +429,16 @@ def chart_data_summary_view(request):
         }
         data_inicio = hoje - range_map.get(range_param, timedelta(days=30))
         
-        # Query com aggregação
-        queryset = DadosAgregados.objects.filter(
-            periodo_fim__gte=data_inicio
-        )
-        
-        summary = queryset.aggregate(
-            total=Count('id'),
-            temp_media=Avg('temperatura_media'),
-            temp_max=Max('temperatura_max'),
-            corrente_brunidores_media=Avg('corrente_brunidores_media'),
-        )
-        
-        ultima = queryset.order_by('-periodo_fim').first()
+        # Horas com periodo_fim >= data_inicio, dos resumos diários mais as horas das pontas
+        resumo = resumos.resumir_intervalo(inicio=data_inicio - INTERVALOS['hora'])
         
         return JsonResponse({
             'success': True,
-            'total_registros': summary['total'] or 0,
-            'temperatura_media': round(float(summary['temp_media'] or 0), 2),
-            'temperatura_maxima': float(summary['temp_max'] or 0),
-            'corrente_brunidores_media': round(float(summary['corrente_brunidores_media'] or 0), 2),
-            'data_atualizacao': ultima.periodo_fim.isoformat() if ultima else None,
+            'total_registros': resumo.periodos,
+            'temperatura_media': round(float(resumo.media('temperatura') or 0), 2),
+            'temperatura_maxima': float(resumo.maximos['temperatura'] or 0),
+            'corrente_brunidores_media': round(float(resumo.media('corrente_brunidores') or 0), 2),
+            'data_atualizacao': resumo.ultimo_periodo_fim.isoformat() if resumo.ultimo_periodo_fim else None,
         })
         
     except Exception as e:
@@ -239,6 +448,49 @@ def chart_data_summary_view(request):
         }, status=400)
 
 
+async def eventos_view(request):
+    """
+    Endpoint SSE (text/event-stream) com os períodos gravados em dados_agregados.
+    
+    Servido pelo ASGI (leituras_project/asgi.py); todas as conexões do processo
+    são alimentadas por uma única leitura periódica do banco (leituras.eventos.hub).
+    
+    Query Parameters:
+        - cliente: ID do cliente para filtrar
+        - equipamento: ID do equipamento para filtrar
+        - granularidade: 'hora', 'dia' ou 'semana' - padrão: 'hora'
+    
+    Eventos:
+        - agregados: lista de períodos novos ou atualizados (periodo_inicio em ms,
+          registros_contagem e as médias de cada métrica)
+        - recarregar: muitas alterações de uma vez; a página deve reler a API
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({
+            'success': False,
+            'error': 'Eventos exigem o servidor ASGI (leituras_project.asgi)',
+        }, status=501)
+    if not await sync_to_async(lambda: request.user.is_authenticated)():
+        return JsonResponse({'success': False, 'error': 'Autenticação necessária'}, status=403)
+    
+    granularidade = request.GET.get('granularidade', 'hora')
+    if granularidade not in GRANULARIDADES:
+        return JsonResponse({'success': False, 'error': 'Granularidade inválida'}, status=400)
+    
+    inscricao = eventos.Inscricao(
+        cliente=request.GET.get('cliente') or None,
+        equipamento=request.GET.get('equipamento') or None,
+        granularidade=granularidade,
+    )
+    response = StreamingHttpResponse(eventos.transmitir(inscricao), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Nginx não deve acumular a resposta
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 # URL Patterns
 urlpatterns = [
     # Admin Django
@@ -256,6 +508,8 @@ urlpatterns = [
     # API Endpoints
     path('api/chart-data/', chart_data_view, name='chart-data'),
     path('api/chart-summary/', chart_data_summary_view, name='chart-summary'),
+    path('api/series/', series_view, name='series'),
+    path('api/eventos/', eventos_view, name='eventos'),
     
     # Redirecionamento da raiz para dashboard
     path('', RedirectView.as_view(url='/dashboard/', permanent=True)),
@@ -56,126 +56,182 @@ class ChartManager {
     }
 
     /**
-     * Inicializa gráficos na página
+     * Inicializa gráficos na página (uma única requisição para todos)
      */
     initCharts() {
-        const temperatureChartCanvas = document.getElementById('temperatureChart');
-        const currentDataChartCanvas = document.getElementById('currentChart');
+        this.temperatureChartCanvas = document.getElementById('temperatureChart');
+        this.currentChartCanvas = document.getElementById('currentChart');
 
-        if (temperatureChartCanvas) {
-            this.createTemperatureChart(temperatureChartCanvas);
+        if (this.temperatureChartCanvas || this.currentChartCanvas) {
+            this.loadSeries('30d');
         }
+    }
+
+    /**
+     * Busca as séries do intervalo e cria ou atualiza os gráficos
+     */
+    loadSeries(range) {
+        this.range = range;
+        const params = new URLSearchParams({
+            metricas: 'temperatura_media,corrente_brunidores_media',
+            range: range,
+        });
+        this.fetchChartData(`/api/series/?${params.toString()}`, (payload) => {
+            const data = this.toChartData(payload);
+            this.subscribe(payload.granularidade);
+            if (this.charts.temperature || this.charts.current) {
+                this.updateCharts(data);
+                return;
+            }
+            if (this.temperatureChartCanvas) {
+                this.createTemperatureChart(this.temperatureChartCanvas, data);
+            }
+            if (this.currentChartCanvas) {
+                this.createCurrentChart(this.currentChartCanvas, data);
+            }
+        });
+    }
 
-        if (currentDataChartCanvas) {
-            this.createCurrentChart(currentDataChartCanvas);
+    /**
+     * Assina os períodos gravados (SSE) na granularidade exibida e recarrega as séries quando mudam
+     */
+    subscribe(granularidade) {
+        if (!window.EventSource || this.granularidade === granularidade) {
+            return;
+        }
+        if (this.eventSource) {
+            this.eventSource.close();
         }
+        this.granularidade = granularidade;
+        this.eventSource = new EventSource(`/api/eventos/?granularidade=${granularidade}`);
+
+        // Agrupa eventos próximos em uma única recarga
+        const reload = () => {
+            clearTimeout(this.reloadTimer);
+            this.reloadTimer = setTimeout(() => this.loadSeries(this.range), 1000);
+        };
+        this.eventSource.addEventListener('agregados', reload);
+        this.eventSource.addEventListener('recarregar', reload);
+    }
+
+    /**
+     * Converte a resposta colunar (timestamps em ms + séries) em labels e dados do Chart.js
+     */
+    toChartData(payload) {
+        const serie = (metrica) => {
+            const encontrada = payload.series.find(s => s.metrica === metrica);
+            return encontrada ? encontrada.valores : [];
+        };
+        return {
+            labels: payload.timestamps.map(ms => new Date(ms).toLocaleString('pt-BR', {
+                day: '2-digit', month: '2-digit', hour: '2-digit', minute: '2-digit',
+            })),
+            temperatura: serie('temperatura_media'),
+            corrente: serie('corrente_brunidores_media'),
+        };
     }
 
     /**
      * Cria gráfico de temperatura
      */
-    createTemperatureChart(canvas) {
-        this.fetchChartData('/api/chart-data/', (data) => {
-            const ctx = canvas.getContext('2d');
-            
-            this.charts.temperature = new Chart(ctx, {
-                type: 'line',
-                data: {
-                    labels: data.labels,
-                    datasets: [{
-                        label: 'Temperatura (°C)',
-                        data: data.temperatura,
-                        borderColor: '#0d6efd',
-                        backgroundColor: 'rgba(13, 110, 253, 0.1)',
-                        borderWidth: 2,
-                        fill: true,
-                        tension: 0.3,
-                        pointRadius: 3,
-                        pointHoverRadius: 5,
-                        pointBackgroundColor: '#0d6efd',
-                        pointBorderColor: '#fff',
-                        pointBorderWidth: 2,
-                    }]
-                },
-                options: {
-                    responsive: true,
-                    maintainAspectRatio: false,
-                    plugins: {
-                        legend: {
-                            display: true,
-                            labels: {
-                                font: { size: 12, weight: 'bold' },
-                                padding: 15,
-                            }
-                        },
-                        title: {
-                            display: true,
-                            text: 'Histórico de Temperatura'
+    createTemperatureChart(canvas, data) {
+        const ctx = canvas.getContext('2d');
+        
+        this.charts.temperature = new Chart(ctx, {
+            type: 'line',
+            data: {
+                labels: data.labels,
+                datasets: [{
+                    label: 'Temperatura (°C)',
+                    data: data.temperatura,
+                    borderColor: '#0d6efd',
+                    backgroundColor: 'rgba(13, 110, 253, 0.1)',
+                    borderWidth: 2,
+                    fill: true,
+                    tension: 0.3,
+                    pointRadius: 3,
+                    pointHoverRadius: 5,
+                    pointBackgroundColor: '#0d6efd',
+                    pointBorderColor: '#fff',
+                    pointBorderWidth: 2,
+                }]
+            },
+            options: {
+                responsive: true,
+                maintainAspectRatio: false,
+                plugins: {
+                    legend: {
+                        display: true,
+                        labels: {
+                            font: { size: 12, weight: 'bold' },
+                            padding: 15,
                         }
                     },
-                    scales: {
-                        y: {
-                            beginAtZero: false,
-                            ticks: {
-                                callback: function(value) {
-                                    return value + ' °C';
-                                }
+                    title: {
+                        display: true,
+                        text: 'Histórico de Temperatura'
+                    }
+                },
+                scales: {
+                    y: {
+                        beginAtZero: false,
+                        ticks: {
+                            callback: function(value) {
+                                return value + ' °C';
                             }
                         }
                     }
                 }
-            });
+            }
         });
     }
 
     /**
      * Cria gráfico de corrente
      */
-    createCurrentChart(canvas) {
-        this.fetchChartData('/api/chart-data/', (data) => {
-            const ctx = canvas.getContext('2d');
-            
-            this.charts.current = new Chart(ctx, {
-                type: 'bar',
-                data: {
-                    labels: data.labels,
-                    datasets: [{
-                        label: 'Corrente (A)',
-                        data: data.corrente,
-                        backgroundColor: [
-                            'rgba(25, 135, 84, 0.7)',
-                            'rgba(13, 110, 253, 0.7)',
-                            'rgba(255, 193, 7, 0.7)',
-                        ],
-                        borderColor: [
-                            '#198754',
-                            '#0d6efd',
-                            '#ffc107',
-                        ],
-                        borderWidth: 2,
-                    }]
+    createCurrentChart(canvas, data) {
+        const ctx = canvas.getContext('2d');
+        
+        this.charts.current = new Chart(ctx, {
+            type: 'bar',
+            data: {
+                labels: data.labels,
+                datasets: [{
+                    label: 'Corrente (A)',
+                    data: data.corrente,
+                    backgroundColor: [
+                        'rgba(25, 135, 84, 0.7)',
+                        'rgba(13, 110, 253, 0.7)',
+                        'rgba(255, 193, 7, 0.7)',
+                    ],
+                    borderColor: [
+                        '#198754',
+                        '#0d6efd',
+                        '#ffc107',
+                    ],
+                    borderWidth: 2,
+                }]
+            },
+            options: {
+                responsive: true,
+                maintainAspectRatio: false,
+                plugins: {
+                    legend: {
+                        display: true,
+                        labels: { font: { size: 12, weight: 'bold' } }
+                    }
                 },
-                options: {
-                    responsive: true,
-                    maintainAspectRatio: false,
-                    plugins: {
-                        legend: {
-                            display: true,
-                            labels: { font: { size: 12, weight: 'bold' } }
-                        }
-                    },
-                    scales: {
-                        y: {
-                            beginAtZero: true,
-                            ticks: {
-                                callback: function(value) {
-                                    return value + ' A';
-                                }
+                scales: {
+                    y: {
+                        beginAtZero: true,
+                        ticks: {
+                            callback: function(value) {
+                                return value + ' A';
                             }
                         }
                     }
                 }
-            });
+            }
         });
     }
 
@@ -323,7 +379,7 @@ document.addEventListener('DOMContentLoaded', function() {
     new ThemeManager();
 
     // Inicializa gráficos
-    new ChartManager();
+    window.Dashboard.chartManager = new ChartManager();
 
     // Inicializa filtros
     new FilterManager();